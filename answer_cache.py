@@ -0,0 +1,165 @@
+"""
+Caché semántico de respuestas de GERARD
+
+Dos niveles:
+    1. Coincidencia exacta de la consulta normalizada
+    2. Vecino más cercano por embedding de la consulta (similitud coseno >= umbral)
+
+Las entradas expiran por TTL, se desalojan por LRU al superar el máximo y se
+invalidan por completo cuando cambia la versión del índice.
+"""
+import re
+import threading
+import time
+import unicodedata
+import numpy as np
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+
+def normalize_query(query: str) -> str:
+    """Normaliza la consulta: unicode NFKC, minúsculas, sin signos de puntuación ni espacios extra"""
+    text = unicodedata.normalize('NFKC', query).lower()
+    text = re.sub(r'[^\w\sáéíóúñü]', ' ', text)
+    return " ".join(text.split())
+
+
+class AnswerCache:
+    """
+    Caché de respuestas compartido por todas las sesiones (thread-safe).
+    Cada entrada guarda el resultado completo (respuesta y documentos) tal como
+    lo consume display_analysis_result.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 500,
+        ttl_seconds: float = 6 * 3600,
+        similarity_threshold: float = 0.97
+    ):
+        """
+        Args:
+            max_entries: Número máximo de respuestas guardadas (LRU)
+            ttl_seconds: Tiempo de vida de cada entrada
+            similarity_threshold: Similitud coseno mínima para el nivel semántico
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, str], Dict[str, Any]]" = OrderedDict()
+        self._index_version: Optional[str] = None
+        self.stats = {'exact_hits': 0, 'semantic_hits': 0, 'misses': 0}
+
+    def _check_version(self, index_version: Optional[str]) -> None:
+        if index_version != self._index_version:
+            self._entries.clear()
+            self._index_version = index_version
+
+    def _expire(self, now: float) -> None:
+        expired = [key for key, entry in self._entries.items() if now - entry['created'] > self.ttl_seconds]
+        for key in expired:
+            del self._entries[key]
+
+    @staticmethod
+    def _unit(embedding: Sequence[float]) -> Optional[np.ndarray]:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else None
+
+    def get_exact(self, query: str, mode: str = "normal", index_version: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Nivel 1: coincidencia exacta de la consulta normalizada"""
+        key = (mode, normalize_query(query))
+        with self._lock:
+            self._check_version(index_version)
+            self._expire(time.time())
+
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            self.stats['exact_hits'] += 1
+            return dict(entry['result'], cache_level='exact')
+
+    def get_similar(
+        self,
+        embedding: Sequence[float],
+        mode: str = "normal",
+        index_version: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Nivel 2: consulta guardada más cercana por similitud coseno, si supera el umbral"""
+        unit = self._unit(embedding)
+        if unit is None:
+            return None
+        with self._lock:
+            self._check_version(index_version)
+            self._expire(time.time())
+
+            candidates = [
+                (key, entry) for key, entry in self._entries.items()
+                if key[0] == mode and entry['embedding'] is not None and entry['embedding'].shape == unit.shape
+            ]
+            if not candidates:
+                return None
+            similarities = np.stack([entry['embedding'] for _, entry in candidates]) @ unit
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.similarity_threshold:
+                return None
+            best_key, best_entry = candidates[best]
+            self._entries.move_to_end(best_key)
+            self.stats['semantic_hits'] += 1
+            return dict(best_entry['result'], cache_level='semantic', similarity=float(similarities[best]))
+
+    def lookup(
+        self,
+        query: str,
+        mode: str = "normal",
+        index_version: Optional[str] = None,
+        embedding: Optional[Sequence[float]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Busca una respuesta guardada (nivel exacto y, si hay embedding, nivel semántico).
+
+        Args:
+            query: Consulta del usuario
+            mode: Modo de búsqueda (las respuestas de modos distintos no se mezclan)
+            index_version: Versión actual del índice
+            embedding: Embedding de la consulta (habilita el nivel semántico)
+
+        Returns:
+            El resultado guardado (con 'cache_level' = 'exact' o 'semantic') o None
+        """
+        result = self.get_exact(query, mode, index_version)
+        if result is None and embedding is not None:
+            result = self.get_similar(embedding, mode, index_version)
+        if result is None:
+            self.stats['misses'] += 1
+        return result
+
+    def store(
+        self,
+        query: str,
+        result: Dict[str, Any],
+        mode: str = "normal",
+        index_version: Optional[str] = None,
+        embedding: Optional[Sequence[float]] = None
+    ) -> None:
+        """Guarda el resultado de una consulta"""
+        key = (mode, normalize_query(query))
+        with self._lock:
+            self._check_version(index_version)
+            self._entries[key] = {
+                'result': dict(result),
+                'embedding': self._unit(embedding) if embedding is not None else None,
+                'created': time.time()
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -25,6 +25,12 @@ import streamlit.components.v1 as components
 from geo_utils import GeoLocator
 from google_sheets_logger import create_sheets_logger
 from document_title_filter import hybrid_search_with_title, detect_title_in_query
+from streaming_render import stream_response
+from context_packer import pack_context
+from chunk_dedup import format_aliases
+from fusion import FusionConfig
+from query_intent import QueryIntent, analyze_query
+from incremental_ingest import active_index_paths
 
 # Importar streamlit_js_eval para comunicación JavaScript <-> Python (micrófono)
 try:
@@ -54,6 +60,55 @@ except ImportError:
 # Habilita/deshabilita el formulario de ingreso manual
 ENABLE_MANUAL_LOGIN = False  # Cambia a False para reactivar el ingreso manual
 
+# ===== CACHÉ DE RESPUESTAS =====
+# Reutiliza respuestas de preguntas idénticas o casi idénticas (mismo índice y modo)
+ANSWER_CACHE_ENABLED = True
+ANSWER_CACHE_SIMILARITY = 0.97  # Similitud coseno mínima entre embeddings de las preguntas
+ANSWER_CACHE_TTL_SECONDS = 6 * 3600
+ANSWER_CACHE_MAX_ENTRIES = 500
+
+# ===== CACHÉ DE EMBEDDINGS =====
+# Embeddings de consultas persistidos en disco (sobreviven reinicios)
+EMBEDDING_CACHE_ENABLED = True
+EMBEDDING_CACHE_PATH = "cache/embeddings.sqlite3"
+EMBEDDING_CACHE_MAX_ENTRIES = 100_000
+
+# ===== RESPUESTAS EN STREAMING =====
+# Muestra el informe a medida que el LLM lo genera (en lugar de esperar la respuesta completa)
+STREAMING_ENABLED = True
+STREAMING_UPDATE_INTERVAL = 0.1  # Segundos mínimos entre actualizaciones de la UI
+
+# ===== EMPAQUETADO DEL CONTEXTO =====
+# Elimina el solapamiento entre chunks, fusiona fragmentos contiguos y limita el contexto
+CONTEXT_PACKING_ENABLED = True
+CONTEXT_TOKEN_BUDGET = 40_000  # Tokens estimados (~4 caracteres por token)
+
+# ===== BÚSQUEDA HÍBRIDA EN PARALELO =====
+# FAISS (embedding remoto) corre en paralelo con BM25; si no responde a tiempo se usa solo BM25
+HYBRID_PARALLEL = True
+FAISS_LATENCY_BUDGET = 8.0  # Segundos (None = esperar siempre a FAISS)
+
+# ===== FUSIÓN DE RESULTADOS HÍBRIDOS =====
+# Estrategia para combinar FAISS y BM25 (ver fusion.py): "rrf", "combsum", "combmnz" o "convex".
+# Las estrategias por score normalizan cada rama con "minmax", "zscore" o "rank"
+HYBRID_FUSION = FusionConfig(method="rrf", rrf_k=60)
+HYBRID_FUSION_SURGICAL = FusionConfig(method="rrf", rrf_k=60)  # Modo exhaustivo (quirúrgico)
+
+# ===== VARIANTE DEL ÍNDICE FAISS =====
+# "flat" = índice exacto original; "sq8", "hnsw", "hnsw_sq8" o "ivfpq" = variantes
+# construidas con `python faiss_variants.py` (ver recall@k en faiss_variants/<variante>/manifest.json)
+FAISS_INDEX_VARIANT = "flat"
+FAISS_NPROBE = None     # None = valor guardado en el manifest de la variante
+FAISS_EF_SEARCH = None  # None = valor guardado en el manifest de la variante
+# Índice mapeado en memoria y docstore binario leído bajo demanda (arranque casi
+# instantáneo; los vectores se comparten entre procesos vía page cache)
+FAISS_MMAP = True
+
+# ===== GENERACIÓN DE ÍNDICES =====
+# Índices de la generación activa creada por `python incremental_ingest.py` (index_generations/CURRENT);
+# si no hay generaciones se usan faiss_index/ y bm25_index/ (o bm25_index.pkl)
+FAISS_INDEX_DIR, BM25_INDEX_DIR = active_index_paths()
+
 # ===== FUNCIONES DE GENERACIÓN DE PDF (CON WEASYPRINT) =====
 # Verificar disponibilidad de weasyprint (prioridad) y reportlab (fallback)
 WEASYPRINT_AVAILABLE = False
@@ -305,8 +360,8 @@ except Exception:
     print("[INFO] Google Sheets logging no disponible")
 
 # Auto-generar índice BM25 si no existe (para Streamlit Cloud)
-if not os.path.exists("bm25_index.pkl"):
-    print("[INFO] Detectado entorno cloud sin bm25_index.pkl, generando...")
+if not os.path.exists(BM25_INDEX_DIR):
+    print("[INFO] Detectado entorno cloud sin índice BM25, generando...")
     try:
         from init_bm25 import init_bm25_index
         init_bm25_index()
@@ -317,6 +372,7 @@ if not os.path.exists("bm25_index.pkl"):
 try:
     from hybrid_retriever import HybridRetriever
     from bm25_retriever import BM25Retriever
+    from retriever_registry import index_version
     RETRIEVERS_AVAILABLE = True
 except Exception as e:
     RETRIEVERS_AVAILABLE = False
@@ -1171,13 +1227,14 @@ def generate_download_filename(conversation_history: list, user_name: str) -> st
     # Formato final: CONSULTA_DE_NOMBREUSUARIO_pregunta1?_pregunta2?_pregunta3_20251117_1530.pdf
     return f"CONSULTA_DE_{user_name_upper}_{full_questions}_{date_str}_{time_str}.pdf"
 
-def get_optimal_k(query: str, force_exhaustive: bool = False) -> dict:
+def get_optimal_k(query: str, force_exhaustive: bool = False, intent: QueryIntent = None) -> dict:
     """
     Determina el número óptimo de documentos (K) a recuperar basándose en la complejidad de la pregunta.
     
     Args:
         query: Pregunta del usuario
         force_exhaustive: Si True, fuerza búsqueda exhaustiva (K=200)
+        intent: Análisis de la consulta ya hecho (analyze_query); si falta se calcula
     
     Returns:
         dict con:
@@ -1196,52 +1253,10 @@ def get_optimal_k(query: str, force_exhaustive: bool = False) -> dict:
             'indicators': {'manual_override': True}
         }
     
-    # Análisis de complejidad
-    words = query.split()
-    word_count = len(words)
-    
-    # Indicadores de complejidad
-    indicators = {
-        'word_count': word_count,
-        'multiple_questions': query.count('?') > 1,
-        'has_conjunctions': any(conj in query.lower() for conj in [
-            ' y ', ' o ', ' además', ' también', ' asimismo', ' igualmente',
-            ' por otro lado', ' en relación', ' respecto a'
-        ]),
-        'has_complex_keywords': any(kw in query.lower() for kw in [
-            'compara', 'contrasta', 'analiza', 'profundiza', 'explica detalladamente',
-            'todos los', 'todas las', 'exhaustivamente', 'completamente',
-            'en profundidad', 'detallado', 'extenso', 'amplio'
-        ]),
-        'has_multiple_subjects': query.count(',') >= 2,
-        'asks_for_listing': any(pattern in query.lower() for pattern in [
-            'lista', 'enumera', 'cuáles son', 'qué son', 'menciona todos',
-            'dame todos', 'dame todas', 'todos los nombres', 'todas las'
-        ])
-    }
-    
-    # Lógica de decisión basada en indicadores
-    complexity_score = 0
-    
-    # Peso por longitud de pregunta
-    if word_count > 40:
-        complexity_score += 3
-    elif word_count > 25:
-        complexity_score += 2
-    elif word_count > 15:
-        complexity_score += 1
-    
-    # Peso por otros indicadores
-    if indicators['multiple_questions']:
-        complexity_score += 2
-    if indicators['has_conjunctions']:
-        complexity_score += 1
-    if indicators['has_complex_keywords']:
-        complexity_score += 2
-    if indicators['has_multiple_subjects']:
-        complexity_score += 1
-    if indicators['asks_for_listing']:
-        complexity_score += 2
+    # Análisis de complejidad (indicadores y puntaje calculados en una sola pasada)
+    intent = intent or analyze_query(query)
+    indicators = intent.indicators
+    complexity_score = intent.complexity_score
     
     # Determinar K basado en score de complejidad
     if complexity_score >= 5:
@@ -1304,7 +1319,7 @@ def load_resources():
     import os
     from pathlib import Path
     
-    faiss_path = Path("faiss_index/index.faiss")
+    faiss_path = Path(FAISS_INDEX_DIR) / "index.faiss"
     if not faiss_path.exists():
         # Setup sin mensajes de Streamlit (los muestra setup_faiss_cloud.py en consola)
         try:
@@ -1378,15 +1393,61 @@ def load_resources():
         os.environ["GERARD_LLM_BACKEND"] = "Vertex AI (Cuenta de Servicio)"
         print("[INFO] Usando Vertex AI (Cuenta de Servicio)")
     
-    # FAISS Vector Store
-    faiss_vs = FAISS.load_local(
-        folder_path="faiss_index",  # Volver al índice viejo que SÍ funciona para consultas
-        embeddings=embeddings,
-        allow_dangerous_deserialization=True
+    # Caché persistente de embeddings: una misma consulta no se envía dos veces a la API
+    # (lo comparten FAISS, el caché de respuestas y cualquier otro llamador)
+    if EMBEDDING_CACHE_ENABLED:
+        from embedding_cache import CachedEmbeddings
+        embeddings = CachedEmbeddings(
+            embeddings,
+            model_name=getattr(embeddings, "model", None) or getattr(embeddings, "model_name", "embeddings"),
+            path=EMBEDDING_CACHE_PATH,
+            max_disk_entries=EMBEDDING_CACHE_MAX_ENTRIES
+        )
+    
+    # FAISS Vector Store (índice exacto o variante comprimida según configuración)
+    from faiss_variants import load_faiss_variant
+    faiss_vs = load_faiss_variant(
+        embeddings,
+        variant=FAISS_INDEX_VARIANT,
+        base_dir=FAISS_INDEX_DIR,  # Volver al índice viejo que SÍ funciona para consultas
+        nprobe=FAISS_NPROBE,
+        ef_search=FAISS_EF_SEARCH,
+        mmap=FAISS_MMAP
     )
     
     return llm, faiss_vs
 
+@st.cache_resource(show_spinner=False)
+def load_document_store(_faiss_vs):
+    """
+    Almacén único de documentos para todo el proceso (compartido entre sesiones).
+    Reemplaza el docstore de FAISS por una vista sobre el almacén: FAISS, BM25 y el
+    filtro por título usan la misma copia del corpus.
+    """
+    from document_store import DocumentStore
+    store = DocumentStore.from_faiss(_faiss_vs, bm25_path=BM25_INDEX_DIR)
+    print(f"[INFO] Almacén de documentos compartido: {len(store)} documentos")
+    return store
+
+@st.cache_resource(show_spinner=False)
+def get_retriever_registry():
+    """
+    Registro de retrievers compartido por todas las sesiones y reruns.
+    El índice BM25 y los retrievers híbridos se construyen una sola vez por proceso.
+    """
+    from retriever_registry import RetrieverRegistry
+    return RetrieverRegistry(bm25_path=BM25_INDEX_DIR)
+
+@st.cache_resource(show_spinner=False)
+def get_answer_cache():
+    """Caché de respuestas compartido por todas las sesiones"""
+    from answer_cache import AnswerCache
+    return AnswerCache(
+        max_entries=ANSWER_CACHE_MAX_ENTRIES,
+        ttl_seconds=ANSWER_CACHE_TTL_SECONDS,
+        similarity_threshold=ANSWER_CACHE_SIMILARITY
+    )
+
 # Prompt de GERARD - Agente Analítico Forense
 GERARD_PROMPT = ChatPromptTemplate.from_template(r"""
 # IDENTIDAD Y PROPÓSITO DEL SISTEMA
@@ -1516,6 +1577,15 @@ Y el contexto contiene fragmentos de ese audio, responde:
 
 def format_docs(docs):
     """Formatea documentos para el contexto con timestamp extraído de metadatos"""
+    if CONTEXT_PACKING_ENABLED:
+        # Quitar solapamientos, fusionar chunks contiguos y respetar el presupuesto de tokens
+        docs, pack_report = pack_context(docs, max_tokens=CONTEXT_TOKEN_BUDGET)
+        print(
+            f"[INFO] 📦 Contexto: {pack_report['kept_chunks']}/{pack_report['input_chunks']} chunks "
+            f"en {pack_report['packed_documents']} fragmentos (~{pack_report['estimated_tokens']} tokens), "
+            f"{pack_report['duplicate_chunks']} repetidos, {pack_report['dropped_chunks']} descartados por presupuesto"
+        )
+
     formatted_docs = []
     for doc in docs:
         # Obtener el nombre completo del archivo sin usar basename
@@ -1552,6 +1622,11 @@ def format_docs(docs):
             timestamp_header = f"[{start_clean} --> {end_clean}]\n"
             content = timestamp_header + content
         
+        # El mismo fragmento aparece en otros archivos (duplicados colapsados al indexar)
+        aliases_line = format_aliases(doc.metadata)
+        if aliases_line:
+            content = f"{content}\n{aliases_line}"
+        
         # Formatear con el título del documento y el contenido (ahora con timestamps)
         formatted_docs.append(f"VIDEO / AUDIO: {doc_title}\n{content}")
     
@@ -2170,16 +2245,12 @@ with st.spinner("🚀 Iniciando sistemas neuronales..."):
     try:
         llm, faiss_vs = load_resources()
         
-        # EXTRAER DOCUMENTOS PARA BM25 EN MEMORIA (Fuera del caché para que persista en session_state)
-        if 'all_docs' not in st.session_state or not st.session_state.all_docs:
-            try:
-                # Acceder al docstore de FAISS
-                all_docs = list(faiss_vs.docstore._dict.values())
-                st.session_state.all_docs = all_docs
-                print(f"[INFO] Documentos extraídos de FAISS para BM25: {len(all_docs)}")
-            except Exception as e:
-                print(f"[WARNING] No se pudieron extraer documentos de FAISS: {e}")
-                st.session_state.all_docs = []
+        # ALMACÉN DE DOCUMENTOS COMPARTIDO (una sola copia por proceso, nada por sesión)
+        try:
+            doc_store = load_document_store(faiss_vs)
+        except Exception as e:
+            print(f"[WARNING] No se pudo crear el almacén de documentos: {e}")
+            doc_store = None
         doc_count = faiss_vs.index.ntotal if hasattr(faiss_vs, 'index') else 0
         
         # Detectar si es un índice placeholder vacío
@@ -3760,168 +3831,219 @@ if user_name:
         search_start_time = datetime.now()
         
         try:
-            # 1. Búsqueda de documentos
-            with st.spinner("🔍 Buscando información relevante..."):
-                # NUEVO: Detectar si la pregunta menciona un título específico
-                title_info = detect_title_in_query(query_to_process)
+            # 0. Caché de respuestas: consulta idéntica o semánticamente equivalente
+            answer_cache = get_answer_cache()
+            cache_mode = 'exhaustiva' if exhaustive_search else 'normal'
+            cache_version = index_version(faiss_vs, BM25_INDEX_DIR)
+            query_embedding = None
+            cached_result = None
+            if ANSWER_CACHE_ENABLED:
+                # Nivel 1 (exacto) no requiere embedding; nivel 2 (semántico) sí
+                cached_result = answer_cache.get_exact(query_to_process, mode=cache_mode, index_version=cache_version)
+                if cached_result is None:
+                    try:
+                        query_embedding = faiss_vs.embeddings.embed_query(query_to_process)
+                        cached_result = answer_cache.get_similar(
+                            query_embedding, mode=cache_mode, index_version=cache_version
+                        )
+                    except Exception as e_emb:
+                        print(f"[WARNING] No se pudo calcular el embedding para el caché: {e_emb}")
+            
+            if cached_result is not None:
+                print(f"[INFO] ♻️ Respuesta servida desde caché (nivel: {cached_result['cache_level']})")
+                docs = cached_result['docs']
+                relevant_docs = docs
+                response = cached_result['response']
+                search_method = cached_result['search_method']
+                search_time = (datetime.now() - search_start_time).total_seconds()
+                query_start_time = datetime.now()
+            else:
+                # 1. Búsqueda de documentos
+                with st.spinner("🔍 Buscando información relevante..."):
+                    # Análisis único de la consulta: nombres, título, complejidad (lo usan k y el retriever)
+                    intent = analyze_query(query_to_process, title_detector=detect_title_in_query)
+                    title_info = intent.title
                 
-                if title_info['has_title']:
-                    # Búsqueda con filtro por título
-                    print(f"[INFO] 🎯 Búsqueda híbrida con filtro de título activada")
-                    print(f"[INFO] Keywords detectadas: {title_info['keywords']}")
-                    print(f"[INFO] Patrón detectado: {title_info['pattern_matched']}")
+                    leg_timings = None
+                    if title_info['has_title']:
+                        # Búsqueda con filtro por título
+                        print(f"[INFO] 🎯 Búsqueda híbrida con filtro de título activada")
+                        print(f"[INFO] Keywords detectadas: {title_info['keywords']}")
+                        print(f"[INFO] Patrón detectado: {title_info['pattern_matched']}")
                     
-                    # Determinar K según complejidad de la pregunta
-                    k_optimal = get_optimal_k(query_to_process, force_exhaustive=exhaustive_search)
+                        # Determinar K según complejidad de la pregunta
+                        k_optimal = get_optimal_k(query_to_process, force_exhaustive=exhaustive_search, intent=intent)
                     
-                    # Usar búsqueda híbrida con filtro por título
-                    docs = hybrid_search_with_title(
-                        faiss_vs=faiss_vs,
-                        query=query_to_process,
-                        all_docs=st.session_state.all_docs if 'all_docs' in st.session_state else [],
-                        k=k_optimal['k'],
-                        title_keywords=title_info['keywords']
-                    )
+                        # Usar búsqueda híbrida con filtro por título
+                        docs = hybrid_search_with_title(
+                            faiss_vs=faiss_vs,
+                            query=query_to_process,
+                            all_docs=doc_store if doc_store is not None else [],
+                            k=k_optimal['k'],
+                            title_keywords=title_info['keywords']
+                        )
                     
-                    search_method = 'hybrid_title_filter'
+                        search_method = 'hybrid_title_filter'
                     
-                    # Mostrar información de debug en consola
-                    print(f"[INFO] Documentos recuperados con filtro: {len(docs)}")
-                    if len(docs) > 0:
-                        print(f"[INFO] Primer documento source: {docs[0].metadata.get('source', 'N/A')[:100]}")
+                        # Mostrar información de debug en consola
+                        print(f"[INFO] Documentos recuperados con filtro: {len(docs)}")
+                        if len(docs) > 0:
+                            print(f"[INFO] Primer documento source: {docs[0].metadata.get('source', 'N/A')[:100]}")
                     
-                else:
-                    # Búsqueda normal sin filtro de título
-                    print(f"[INFO] 📊 Búsqueda híbrida estándar (sin filtro de título)")
+                    else:
+                        # Búsqueda normal sin filtro de título
+                        print(f"[INFO] 📊 Búsqueda híbrida estándar (sin filtro de título)")
                     
-                    # Determinar método de búsqueda
-                    search_method = 'hybrid'
+                        # Determinar método de búsqueda
+                        search_method = 'hybrid'
                     
-                    # Obtener retriever
-                    if exhaustive_search:
-                        # Modo exhaustivo: Híbrido con más documentos (Quirúrgico)
-                        # Usa HybridRetriever.build para crear la instancia de forma segura
-                        retriever = HybridRetriever.build(
-                            faiss_retriever=faiss_vs.as_retriever(search_kwargs={"k": 400}),  # Aumentado a 400 para capturar docs cortos
-                            documents=st.session_state.all_docs if 'all_docs' in st.session_state else None,
-                            k=400,  # Aumentado a 400 para encontrar chunks únicos en docs pequeños
-                            alpha=0.6 
-                        )
-                        search_method = 'hybrid_surgical'
-                    else:
-                        # Modo normal: Híbrido estándar
-                        retriever = HybridRetriever.build(
-                            faiss_retriever=faiss_vs.as_retriever(search_kwargs={"k": 300}),  # Aumentado a 300 para capturar docs cortos
-                            documents=st.session_state.all_docs if 'all_docs' in st.session_state else None,
-                            k=300  # Aumentado a 300 para encontrar chunks únicos como 'cuerpo crístico ya se formó'
-                        )
+                        # Obtener retriever (compartido por proceso: se construye una sola vez)
+                        registry = get_retriever_registry()
+                        if exhaustive_search:
+                            # Modo exhaustivo: Híbrido con más documentos (Quirúrgico)
+                            retriever = registry.get_hybrid(
+                                faiss_vs,
+                                documents=doc_store,
+                                faiss_k=400,  # Aumentado a 400 para capturar docs cortos
+                                k=400,  # Aumentado a 400 para encontrar chunks únicos en docs pequeños
+                                alpha=0.6,
+                                exhaustive=True,
+                                parallel=HYBRID_PARALLEL,
+                                faiss_timeout=FAISS_LATENCY_BUDGET,
+                                fusion=HYBRID_FUSION_SURGICAL
+                            )
+                            search_method = 'hybrid_surgical'
+                        else:
+                            # Modo normal: Híbrido estándar
+                            retriever = registry.get_hybrid(
+                                faiss_vs,
+                                documents=doc_store,
+                                faiss_k=300,  # Aumentado a 300 para capturar docs cortos
+                                k=300,  # Aumentado a 300 para encontrar chunks únicos como 'cuerpo crístico ya se formó'
+                                parallel=HYBRID_PARALLEL,
+                                faiss_timeout=FAISS_LATENCY_BUDGET,
+                                fusion=HYBRID_FUSION
+                            )
                     
-                    # Ejecutar búsqueda
-                    docs = retriever.invoke(query_to_process)
+                        # Ejecutar búsqueda
+                        docs = retriever.invoke(query_to_process, intent=intent)
+                        leg_timings = retriever.last_timings
                 
-                # Filtrar por umbral de relevancia (simulado)
-                relevant_docs = docs 
+                    # Filtrar por umbral de relevancia (simulado)
+                    relevant_docs = docs 
                 
-                search_end_time = datetime.now()
-                search_time = (search_end_time - search_start_time).total_seconds()
-            
-            # Badge de método según el utilizado
-            method_badges = {
-                'hybrid': '🎯 Híbrido',
-                'hybrid_surgical': '🧬 Híbrida Quirúrgica',
-                'hybrid_title_filter': '📑 Híbrida con Filtro de Título',
-                'faiss': '🔍 FAISS',
-                'faiss_exhaustive': '🚀 FAISS (Exhaustivo)',
-                'bm25': '📝 BM25'
-            }
-            method_badge = method_badges.get(search_method, '❓ Desconocido')
+                    search_end_time = datetime.now()
+                    search_time = (search_end_time - search_start_time).total_seconds()
             
-            # Mostrar métricas de búsqueda
-            st.markdown(
-                f'<div style="background: rgba(152, 195, 121, 0.1); border-left: 4px solid #98C379; padding: 12px; border-radius: 6px; margin: 10px 0;">'
-                f'<span style="color: #98C379; font-weight: bold;">✅ BÚSQUEDA COMPLETADA</span><br/>'
-                f'<span style="color: #E5C07B;">📊 Recuperados: {len(docs)} docs</span> • '
-                f'<span style="color: #61AFEF;">⚡ Relevantes: {len(relevant_docs)} docs</span> • '
-                f'<span style="color: #C678DD;">⏱️ Tiempo: {search_time:.2f}s</span> • '
-                f'<span style="color: #56B6C2;">{method_badge}</span>'
-                f'</div>',
-                unsafe_allow_html=True
-            )
+                # Badge de método según el utilizado
+                method_badges = {
+                    'hybrid': '🎯 Híbrido',
+                    'hybrid_surgical': '🧬 Híbrida Quirúrgica',
+                    'hybrid_title_filter': '📑 Híbrida con Filtro de Título',
+                    'faiss': '🔍 FAISS',
+                    'faiss_exhaustive': '🚀 FAISS (Exhaustivo)',
+                    'bm25': '📝 BM25'
+                }
+                method_badge = method_badges.get(search_method, '❓ Desconocido')
+            
+                # Tiempos por rama de la búsqueda híbrida (BM25 / FAISS)
+                legs_html = ''
+                if leg_timings:
+                    faiss_labels = {'ok': None, 'timeout': 'sin respuesta a tiempo', 'error': 'error', 'skipped': 'no usado'}
+                    faiss_label = faiss_labels.get(leg_timings['faiss_status'])
+                    faiss_text = f"{leg_timings['faiss']:.2f}s" if faiss_label is None else faiss_label
+                    bm25_text = f"{leg_timings['bm25']:.2f}s" if leg_timings['bm25'] is not None else '-'
+                    legs_html = (
+                        f'<br/><span style="color: #ABB2BF;">📝 BM25: {bm25_text}</span> • '
+                        f'<span style="color: #ABB2BF;">🔍 FAISS: {faiss_text}</span>'
+                    )
+            
+                # Mostrar métricas de búsqueda
+                st.markdown(
+                    f'<div style="background: rgba(152, 195, 121, 0.1); border-left: 4px solid #98C379; padding: 12px; border-radius: 6px; margin: 10px 0;">'
+                    f'<span style="color: #98C379; font-weight: bold;">✅ BÚSQUEDA COMPLETADA</span><br/>'
+                    f'<span style="color: #E5C07B;">📊 Recuperados: {len(docs)} docs</span> • '
+                    f'<span style="color: #61AFEF;">⚡ Relevantes: {len(relevant_docs)} docs</span> • '
+                    f'<span style="color: #C678DD;">⏱️ Tiempo: {search_time:.2f}s</span> • '
+                    f'<span style="color: #56B6C2;">{method_badge}</span>'
+                    f'{legs_html}'
+                    f'</div>',
+                    unsafe_allow_html=True
+                )
 
-            # [NUEVO] Visualización de Scores de Relevancia (Forensic Score Board)
-            with st.expander(f"🔍 Analizar Scores de Relevancia (Evidencia Forense)", expanded=False):
-                st.markdown("*Los scores indican la probabilidad de que el fragmento responda la pregunta (0.0 - 1.0)*")
-                for i, doc in enumerate(docs):
-                    # Obtener score (default 0 si no existe)
-                    score = doc.metadata.get('relevance_score', 0.0)
+                # [NUEVO] Visualización de Scores de Relevancia (Forensic Score Board)
+                with st.expander(f"🔍 Analizar Scores de Relevancia (Evidencia Forense)", expanded=False):
+                    st.markdown("*Los scores indican la probabilidad de que el fragmento responda la pregunta (0.0 - 1.0)*")
+                    for i, doc in enumerate(docs):
+                        # Obtener score (default 0 si no existe)
+                        score = doc.metadata.get('relevance_score', 0.0)
                     
-                    # Lógica de color semáforo
-                    if score >= 0.95:
-                        color = "#00ff41" # Verde neón (Perfecto)
-                        label = "🟢 EXACTO"
-                    elif score >= 0.85:
-                        color = "#FFFF00" # Amarillo (Muy alto)
-                        label = "🟡 MUY RELEVANTE"
-                    elif score >= 0.70:
-                        color = "#cccccc" # Gris/Blanco (Relevante)
-                        label = "⚪ RELEVANTE"
-                    else:
-                        color = "#ff4b4b" # Rojo (Bajo)
-                        label = "🔴 BAJA RELEVANCIA"
+                        # Lógica de color semáforo
+                        if score >= 0.95:
+                            color = "#00ff41" # Verde neón (Perfecto)
+                            label = "🟢 EXACTO"
+                        elif score >= 0.85:
+                            color = "#FFFF00" # Amarillo (Muy alto)
+                            label = "🟡 MUY RELEVANTE"
+                        elif score >= 0.70:
+                            color = "#cccccc" # Gris/Blanco (Relevante)
+                            label = "⚪ RELEVANTE"
+                        else:
+                            color = "#ff4b4b" # Rojo (Bajo)
+                            label = "🔴 BAJA RELEVANCIA"
                     
-                    source = doc.metadata.get('source', 'Desconocido')
-                    # Limpiar source para mostrar solo nombre archivo
-                    source_name = os.path.basename(source)
-                    content_preview = doc.page_content[:200].replace("\n", " ") + "..."
+                        source = doc.metadata.get('source', 'Desconocido')
+                        # Limpiar source para mostrar solo nombre archivo
+                        source_name = os.path.basename(source)
+                        content_preview = doc.page_content[:200].replace("\n", " ") + "..."
                     
-                    st.markdown(
-                        f"""
-                        <div style="background: rgba(255,255,255,0.05); padding: 10px; border-radius: 5px; margin-bottom: 8px; border-left: 3px solid {color};">
-                            <div style="display: flex; justify-content: space-between; align-items: center;">
-                                <span style="font-weight: bold; color: {color}; font-family: monospace; font-size: 1.1em;">{label} ({score:.2f})</span>
-                                <span style="font-size: 0.8em; color: #888;">Rank #{i+1}</span>
+                        st.markdown(
+                            f"""
+                            <div style="background: rgba(255,255,255,0.05); padding: 10px; border-radius: 5px; margin-bottom: 8px; border-left: 3px solid {color};">
+                                <div style="display: flex; justify-content: space-between; align-items: center;">
+                                    <span style="font-weight: bold; color: {color}; font-family: monospace; font-size: 1.1em;">{label} ({score:.2f})</span>
+                                    <span style="font-size: 0.8em; color: #888;">Rank #{i+1}</span>
+                                </div>
+                                <div style="font-size: 0.9em; color: #aaa; margin-top: 4px; font-weight: bold;">📄 {source_name}</div>
+                                <div style="font-size: 0.85em; color: #ccc; margin-top: 4px; font-style: italic;">"{content_preview}"</div>
                             </div>
-                            <div style="font-size: 0.9em; color: #aaa; margin-top: 4px; font-weight: bold;">📄 {source_name}</div>
-                            <div style="font-size: 0.85em; color: #ccc; margin-top: 4px; font-style: italic;">"{content_preview}"</div>
-                        </div>
-                        """,
+                            """,
+                            unsafe_allow_html=True
+                        )
+            
+                # Mostrar GIF de procesamiento animado
+                if os.path.exists("assets/pregunta.gif"):
+                    st.markdown(
+                        '''<div class="gif-container" style="text-align: center;">
+                            <img src="data:image/gif;base64,{}" width="300">
+                        </div>'''.format(
+                            base64.b64encode(open("assets/pregunta.gif", "rb").read()).decode()
+                        ),
                         unsafe_allow_html=True
                     )
             
-            # Mostrar GIF de procesamiento animado
-            if os.path.exists("assets/pregunta.gif"):
-                st.markdown(
-                    '''<div class="gif-container" style="text-align: center;">
-                        <img src="data:image/gif;base64,{}" width="300">
-                    </div>'''.format(
-                        base64.b64encode(open("assets/pregunta.gif", "rb").read()).decode()
-                    ),
+                # Construir cadena RAG
+                query_start_time = datetime.now()
+
+                # Crear banderas para saber si estamos en Streamlit Cloud
+                if "running_in_cloud" not in st.session_state:
+                    st.session_state.running_in_cloud = bool(os.getenv("STREAMLIT_RUNTIME", "")) or bool(os.getenv("STREAMLIT_CLOUD", ""))
+
+                # Mensaje de búsqueda grande en verde neón
+                status_placeholder = st.empty()
+                status_placeholder.markdown(
+                    '<div style="text-align: center; font-size: 3em; color: #00ff41; font-weight: bold; margin: 30px 0; animation: pulse 1.5s ease-in-out infinite;">'
+                    '🧠 GERARD V3.69 está buscando la Respuesta...'
+                    '</div>'
+                    '<style>'
+                    '@keyframes pulse {'
+                    '  0%, 100% { opacity: 1; }'
+                    '  50% { opacity: 0.6; }'
+                    '}'
+                    '</style>',
                     unsafe_allow_html=True
                 )
             
-            # Construir cadena RAG
-            query_start_time = datetime.now()
-
-            # Crear banderas para saber si estamos en Streamlit Cloud
-            if "running_in_cloud" not in st.session_state:
-                st.session_state.running_in_cloud = bool(os.getenv("STREAMLIT_RUNTIME", "")) or bool(os.getenv("STREAMLIT_CLOUD", ""))
-
-            # Mensaje de búsqueda grande en verde neón
-            status_placeholder = st.empty()
-            status_placeholder.markdown(
-                '<div style="text-align: center; font-size: 3em; color: #00ff41; font-weight: bold; margin: 30px 0; animation: pulse 1.5s ease-in-out infinite;">'
-                '🧠 GERARD V3.69 está buscando la Respuesta...'
-                '</div>'
-                '<style>'
-                '@keyframes pulse {'
-                '  0%, 100% { opacity: 1; }'
-                '  50% { opacity: 0.6; }'
-                '}'
-                '</style>',
-                unsafe_allow_html=True
-            )
-            
-            with st.spinner(""):
                 chain = (
                     {
                         "context": lambda x: format_docs(docs),
@@ -3931,12 +4053,45 @@ if user_name:
                     | llm
                     | StrOutputParser()
                 )
-                
-                # Ejecutar
-                response = chain.invoke({"input": query_to_process})
+
+                if STREAMING_ENABLED:
+                    # Ejecutar en streaming: el informe aparece a medida que se genera
+                    stream_placeholder = st.empty()
+
+                    def _on_first_token():
+                        # El mensaje de estado se retira con el primer token
+                        status_placeholder.empty()
+                        ttft = (datetime.now() - query_start_time).total_seconds()
+                        print(f"[INFO] ⚡ Primer token en {ttft:.2f}s")
+
+                    response = stream_response(
+                        chain.stream({"input": query_to_process}),
+                        colorize=colorize_citations,
+                        render=lambda html: stream_placeholder.html(
+                            f'<div class="response-container" id="respuesta-gerard">{html}</div>'
+                        ),
+                        on_first_token=_on_first_token,
+                        min_interval=STREAMING_UPDATE_INTERVAL
+                    )
+                    # El resultado final se muestra con display_analysis_result tras el rerun
+                    stream_placeholder.empty()
+                else:
+                    with st.spinner(""):
+                        # Ejecutar
+                        response = chain.invoke({"input": query_to_process})
             
-            # Limpiar mensaje de estado
-            status_placeholder.empty()
+                # Limpiar mensaje de estado
+                status_placeholder.empty()
+                
+                # Guardar en caché para consultas repetidas o casi idénticas
+                if ANSWER_CACHE_ENABLED:
+                    answer_cache.store(
+                        query_to_process,
+                        {'response': response, 'docs': docs, 'search_method': search_method},
+                        mode=cache_mode,
+                        index_version=cache_version,
+                        embedding=query_embedding
+                    )
             
             # ═══════════════════════════════════════════════════════════════
             # PROCESAMIENTO FINAL Y PERSISTENCIA
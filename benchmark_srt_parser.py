@@ -0,0 +1,120 @@
+"""
+Benchmark del parser de .srt: regex con lookahead (anterior) vs parser de una pasada
+
+Lee todos los .srt del directorio en memoria (la E/S no entra en la medición),
+parsea cada archivo con ambas implementaciones y reporta el throughput en MB/s
+y los archivos en los que los bloques extraídos difieren.
+
+Uso:
+    python benchmark_srt_parser.py [documentos_srt/] [--repeat 3]
+"""
+import re
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+from srt_parser_timestamps import SRTParser, SubtitleBlock, SubtitleBlockArray
+
+# Implementación anterior de SRTParser.parse_srt_file (referencia)
+_REGEX_PATTERN = re.compile(
+    r'(\d+)\n(\d{2}:\d{2}:\d{2},\d{3}) --> (\d{2}:\d{2}:\d{2},\d{3})\n((?:.*\n)*?)(?=\n\d+\n|\Z)'
+)
+
+
+def regex_parse(raw: bytes) -> List[SubtitleBlock]:
+    """Parser anterior: decodificación UTF-8/latin-1 con saltos universales + regex"""
+    try:
+        content = raw.decode('utf-8')
+    except UnicodeDecodeError:
+        content = raw.decode('latin-1')
+    content = content.replace('\r\n', '\n').replace('\r', '\n')
+
+    blocks = []
+    for match in _REGEX_PATTERN.finditer(content):
+        start_time = match.group(2)
+        end_time = match.group(3)
+        blocks.append(SubtitleBlock(
+            index=int(match.group(1)),
+            start_time=start_time,
+            end_time=end_time,
+            text=match.group(4).strip(),
+            start_seconds=SRTParser.timestamp_to_seconds(start_time),
+            end_seconds=SRTParser.timestamp_to_seconds(end_time)
+        ))
+    return blocks
+
+
+def state_machine_parse(raw: bytes) -> List[SubtitleBlock]:
+    """Parser actual (SRTParser.iter_srt_blocks sin la lectura del archivo)"""
+    return list(SRTParser.iter_srt_text_blocks(SRTParser.decode_srt_bytes(raw)))
+
+
+def columnar_parse(raw: bytes) -> SubtitleBlockArray:
+    """Parser actual a columnas (SRTParser.parse_srt_columns sin la lectura del archivo)"""
+    return SRTParser.parse_srt_text_columns(SRTParser.decode_srt_bytes(raw))
+
+
+def _throughput(parse, contents: List[bytes], repeat: int) -> float:
+    """Mejor MB/s de repeat pasadas sobre todo el corpus"""
+    total_mb = sum(len(raw) for raw in contents) / (1024 * 1024)
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for raw in contents:
+            parse(raw)
+        best = min(best, time.perf_counter() - start)
+    return total_mb / best
+
+
+def run_benchmark(data_path: str = "documentos_srt/", repeat: int = 3) -> dict:
+    files = sorted(Path(data_path).glob("*.srt"))
+    contents = [path.read_bytes() for path in files]
+    total_mb = sum(len(raw) for raw in contents) / (1024 * 1024)
+    print(f"📂 {len(files)} archivos .srt ({total_mb:.2f} MB) en {data_path}")
+
+    different = []
+    regex_blocks = 0
+    new_blocks = 0
+    for path, raw in zip(files, contents):
+        old = regex_parse(raw)
+        new = state_machine_parse(raw)
+        regex_blocks += len(old)
+        new_blocks += len(new)
+        if old != new:
+            different.append((path.name, len(old), len(new)))
+
+    regex_mbps = _throughput(regex_parse, contents, repeat)
+    new_mbps = _throughput(state_machine_parse, contents, repeat)
+    columnar_mbps = _throughput(columnar_parse, contents, repeat)
+
+    print(f"\n⏱️  Regex con lookahead:   {regex_mbps:8.2f} MB/s ({regex_blocks:,} bloques)")
+    print(f"⏱️  Parser de una pasada:  {new_mbps:8.2f} MB/s ({new_blocks:,} bloques)")
+    print(f"⏱️  Parser a columnas:     {columnar_mbps:8.2f} MB/s")
+    print(f"🚀 Aceleración: {new_mbps / regex_mbps:.2f}x (columnas: {columnar_mbps / regex_mbps:.2f}x)")
+
+    if different:
+        print(f"\n⚠️  {len(different)} archivos con bloques distintos (bloques regex → nuevo):")
+        for name, old_count, new_count in different[:20]:
+            print(f"   • {name}: {old_count} → {new_count}")
+    else:
+        print("\n✅ Ambos parsers extraen exactamente los mismos bloques")
+
+    return {
+        'files': len(files),
+        'size_mb': total_mb,
+        'regex_mbps': regex_mbps,
+        'state_machine_mbps': new_mbps,
+        'columnar_mbps': columnar_mbps,
+        'different_files': different
+    }
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    repeat = 3
+    if '--repeat' in args:
+        position = args.index('--repeat')
+        repeat = int(args[position + 1])
+        del args[position:position + 2]
+    run_benchmark(args[0] if args else "documentos_srt/", repeat=repeat)
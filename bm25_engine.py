@@ -0,0 +1,423 @@
+"""
+Motor BM25 nativo con índice invertido
+Reemplaza los barridos completos de rank_bm25.get_scores por listas de postings
+con IDF y normas de longitud precalculadas, y poda top-k estilo MaxScore.
+
+Produce exactamente los mismos scores que BM25Okapi (misma fórmula y mismo orden
+de operaciones en punto flotante), pero solo toca los documentos que contienen
+los términos de la consulta.
+"""
+import math
+import numpy as np
+from typing import Dict, List, Optional, Sequence, Tuple
+from topk_utils import kth_largest, select_top_k
+
+
+class InvertedBM25Index:
+    """
+    Índice invertido BM25 (variante Okapi/ATIRE de rank_bm25)
+
+    Estructura CSR por término:
+        - indptr[t]:indptr[t+1] delimita los postings del término t
+        - postings_docs: ids de documento (ordenados de forma ascendente por término)
+        - postings_tfs: frecuencia del término en cada documento
+    Además guarda:
+        - idf por término (mismos valores que BM25Okapi, incluido el piso epsilon)
+        - norma de longitud por documento: k1 * (1 - b + b * len / avgdl)
+        - peso máximo por término (cota superior para la poda MaxScore)
+    """
+
+    def __init__(
+        self,
+        vocab: Dict[str, int],
+        idf: np.ndarray,
+        indptr: np.ndarray,
+        postings_docs: np.ndarray,
+        postings_tfs: np.ndarray,
+        doc_len: np.ndarray,
+        k1: float = 1.5,
+        b: float = 0.75,
+        avgdl: float = 0.0,
+        doc_norm: Optional[np.ndarray] = None,
+        max_weight: Optional[np.ndarray] = None
+    ):
+        """
+        doc_norm y max_weight se pueden pasar precalculados (p. ej. desde el índice
+        en disco mapeado en memoria) para no recorrer todos los postings al abrir.
+        """
+        self.vocab = vocab
+        self.idf = idf
+        self.indptr = indptr
+        self.postings_docs = postings_docs
+        self.postings_tfs = postings_tfs
+        self.doc_len = doc_len
+        self.k1 = k1
+        self.b = b
+        self.avgdl = avgdl
+        self.corpus_size = len(doc_len)
+
+        # Norma de longitud por documento (misma expresión que BM25Okapi.get_scores)
+        if doc_norm is None:
+            doc_norm = self.k1 * (1 - self.b + self.b * self.doc_len / self.avgdl)
+        self.doc_norm = doc_norm
+
+        # Peso máximo de cada término sobre sus postings (cota superior sin idf)
+        if max_weight is None:
+            max_weight = np.zeros(len(self.idf))
+            non_empty = np.flatnonzero(np.diff(self.indptr) > 0)
+            if len(non_empty):
+                weights = self._weights(self.postings_tfs, self.postings_docs)
+                max_weight[non_empty] = np.maximum.reduceat(weights, self.indptr[non_empty])
+        self.max_weight = max_weight
+
+    # ------------------------------------------------------------------
+    # Construcción
+    # ------------------------------------------------------------------
+    @classmethod
+    def from_bm25okapi(cls, bm25) -> "InvertedBM25Index":
+        """Convierte un BM25Okapi de rank_bm25 (el pickle actual) a índice invertido"""
+        return cls._from_doc_freqs(
+            doc_freqs=bm25.doc_freqs,
+            doc_len=bm25.doc_len,
+            idf=bm25.idf,
+            k1=bm25.k1,
+            b=bm25.b,
+            avgdl=bm25.avgdl
+        )
+
+    @classmethod
+    def from_tokenized(
+        cls,
+        tokenized_docs: Sequence[List[str]],
+        k1: float = 1.5,
+        b: float = 0.75,
+        epsilon: float = 0.25
+    ) -> "InvertedBM25Index":
+        """
+        Construye el índice desde documentos tokenizados.
+        Replica el cálculo de IDF de BM25Okapi (incluido el piso eps * idf promedio).
+        """
+        doc_freqs = []
+        doc_len = []
+        nd = {}  # término -> número de documentos que lo contienen
+        num_doc = 0
+        for document in tokenized_docs:
+            doc_len.append(len(document))
+            num_doc += len(document)
+
+            frequencies = {}
+            for word in document:
+                if word not in frequencies:
+                    frequencies[word] = 0
+                frequencies[word] += 1
+            doc_freqs.append(frequencies)
+
+            for word in frequencies:
+                nd[word] = nd.get(word, 0) + 1
+
+        corpus_size = len(doc_freqs)
+        avgdl = num_doc / corpus_size
+
+        idf = {}
+        idf_sum = 0
+        negative_idfs = []
+        for word, freq in nd.items():
+            value = math.log(corpus_size - freq + 0.5) - math.log(freq + 0.5)
+            idf[word] = value
+            idf_sum += value
+            if value < 0:
+                negative_idfs.append(word)
+        eps = epsilon * (idf_sum / len(idf))
+        for word in negative_idfs:
+            idf[word] = eps
+
+        return cls._from_doc_freqs(doc_freqs, doc_len, idf, k1, b, avgdl)
+
+    def updated(
+        self,
+        removed_docs: Sequence[int],
+        added_tokenized: Sequence[List[str]],
+        epsilon: float = 0.25
+    ) -> "InvertedBM25Index":
+        """
+        Nuevo índice sin los documentos removed_docs y con added_tokenized al final,
+        sin re-tokenizar el corpus: se reutilizan los postings existentes.
+
+        Los documentos conservados mantienen su orden relativo (sus ids se corren
+        hacia abajo) y los nuevos reciben ids a continuación. IDF, avgdl y normas se
+        recalculan con las mismas fórmulas que from_tokenized.
+        """
+        keep = np.ones(self.corpus_size, dtype=bool)
+        keep[np.asarray(removed_docs, dtype=np.int64)] = False
+        new_ids = np.cumsum(keep) - 1
+        n_kept = int(keep.sum())
+
+        postings_docs = np.asarray(self.postings_docs)
+        mask = keep[postings_docs]
+        terms = np.repeat(np.arange(len(self.idf), dtype=np.int64), np.diff(self.indptr))[mask]
+        docs = new_ids[postings_docs[mask]]
+        tfs = np.asarray(self.postings_tfs)[mask]
+
+        # Postings de los documentos nuevos (términos nuevos al final del vocabulario)
+        words = sorted(self.vocab, key=self.vocab.get)
+        vocab = dict(self.vocab)
+        doc_len = np.asarray(self.doc_len)[keep].tolist()
+        add_terms, add_docs, add_tfs = [], [], []
+        for j, document in enumerate(added_tokenized):
+            doc_len.append(len(document))
+            frequencies = {}
+            for word in document:
+                frequencies[word] = frequencies.get(word, 0) + 1
+            for word, tf in frequencies.items():
+                if word not in vocab:
+                    vocab[word] = len(vocab)
+                    words.append(word)
+                add_terms.append(vocab[word])
+                add_docs.append(n_kept + j)
+                add_tfs.append(tf)
+        terms = np.concatenate([terms, np.asarray(add_terms, dtype=np.int64)])
+        docs = np.concatenate([docs, np.asarray(add_docs, dtype=np.int64)])
+        tfs = np.concatenate([tfs, np.asarray(add_tfs, dtype=tfs.dtype)])
+
+        # Compactar el vocabulario: quitar términos que solo aparecían en documentos borrados
+        nd = np.bincount(terms, minlength=len(words))
+        alive = nd > 0
+        term_map = np.cumsum(alive) - 1
+        terms = term_map[terms]
+        words = [word for word, is_alive in zip(words, alive) if is_alive]
+        nd = nd[alive]
+
+        corpus_size = len(doc_len)
+        avgdl = sum(doc_len) / corpus_size
+
+        # IDF con el mismo orden de operaciones que from_tokenized (piso eps * idf promedio)
+        idf = np.empty(len(words), dtype=np.float64)
+        idf_sum = 0
+        for t, freq in enumerate(nd.tolist()):
+            value = math.log(corpus_size - freq + 0.5) - math.log(freq + 0.5)
+            idf[t] = value
+            idf_sum += value
+        if len(idf):
+            idf[idf < 0] = epsilon * (idf_sum / len(idf))
+
+        order = np.lexsort((docs, terms))
+        indptr = np.zeros(len(words) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(terms, minlength=len(words)), out=indptr[1:])
+
+        return type(self)(
+            vocab={word: i for i, word in enumerate(words)},
+            idf=idf,
+            indptr=indptr,
+            postings_docs=docs[order].astype(np.int32),
+            postings_tfs=tfs[order].astype(np.int32),
+            doc_len=np.array(doc_len),
+            k1=self.k1,
+            b=self.b,
+            avgdl=avgdl
+        )
+
+    @classmethod
+    def _from_doc_freqs(cls, doc_freqs, doc_len, idf, k1, b, avgdl) -> "InvertedBM25Index":
+        """Arma las listas de postings CSR a partir de diccionarios término -> frecuencia"""
+        vocab = {word: i for i, word in enumerate(idf)}
+        idf_array = np.array([idf[word] for word in vocab], dtype=np.float64)
+
+        total = sum(len(freqs) for freqs in doc_freqs)
+        term_ids = np.empty(total, dtype=np.int32)
+        docs = np.empty(total, dtype=np.int32)
+        tfs = np.empty(total, dtype=np.int32)
+
+        pos = 0
+        for doc_id, freqs in enumerate(doc_freqs):
+            n = len(freqs)
+            term_ids[pos:pos + n] = [vocab[word] for word in freqs]
+            tfs[pos:pos + n] = list(freqs.values())
+            docs[pos:pos + n] = doc_id
+            pos += n
+
+        # Orden estable por término: los docs quedan ascendentes dentro de cada lista
+        order = np.argsort(term_ids, kind='stable')
+        counts = np.bincount(term_ids, minlength=len(vocab))
+        indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+
+        return cls(
+            vocab=vocab,
+            idf=idf_array,
+            indptr=indptr,
+            postings_docs=docs[order],
+            postings_tfs=tfs[order],
+            doc_len=np.array(doc_len),
+            k1=k1,
+            b=b,
+            avgdl=avgdl
+        )
+
+    # ------------------------------------------------------------------
+    # Scoring
+    # ------------------------------------------------------------------
+    def _weights(self, tfs: np.ndarray, docs: np.ndarray) -> np.ndarray:
+        """Peso BM25 sin idf: tf * (k1 + 1) / (tf + norma_doc)"""
+        return tfs * (self.k1 + 1) / (tfs + self.doc_norm[docs])
+
+    def _postings(self, term_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        start, end = self.indptr[term_id], self.indptr[term_id + 1]
+        return self.postings_docs[start:end], self.postings_tfs[start:end]
+
+    def _term_ids(self, query: Sequence[str]) -> List[int]:
+        """Ids de los términos de la consulta presentes en el vocabulario (con repeticiones)"""
+        return [self.vocab[q] for q in query if q in self.vocab]
+
+    def get_scores(self, query: Sequence[str]) -> np.ndarray:
+        """Scores densos para todo el corpus (compatible con BM25Okapi.get_scores)"""
+        score = np.zeros(self.corpus_size)
+        for term_id in self._term_ids(query):
+            docs, tfs = self._postings(term_id)
+            score[docs] += self.idf[term_id] * self._weights(tfs, docs)
+        return score
+
+    def get_batch_scores(self, query: Sequence[str], doc_ids) -> List[float]:
+        """Scores para un subconjunto de documentos (compatible con BM25Okapi.get_batch_scores)"""
+        return self.score_documents(query, np.asarray(doc_ids, dtype=np.int64)).tolist()
+
+    def score_documents(self, query: Sequence[str], doc_ids: np.ndarray) -> np.ndarray:
+        """
+        Score exacto de un subconjunto de documentos.
+        Acumula término a término en el orden de la consulta, igual que BM25Okapi,
+        para que los valores sean idénticos bit a bit.
+        """
+        score = np.zeros(len(doc_ids))
+        if len(doc_ids) == 0:
+            return score
+        for term_id in self._term_ids(query):
+            docs, tfs = self._postings(term_id)
+            if len(docs) == 0:
+                continue
+            pos = np.searchsorted(docs, doc_ids)
+            pos_clipped = np.minimum(pos, len(docs) - 1)
+            hit = docs[pos_clipped] == doc_ids
+            contrib = np.zeros(len(doc_ids))
+            contrib[hit] = self.idf[term_id] * self._weights(tfs[pos_clipped[hit]], doc_ids[hit])
+            score += contrib
+        return score
+
+    def score_columns(self, queries: Sequence[Sequence[str]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Scores de varias consultas en un solo producto disperso matriz-vector.
+
+        Equivale a multiplicar la matriz documento-término (pesos BM25) por una matriz
+        de consultas con una columna por consulta: se concatenan los postings de todos
+        los términos de todas las columnas y se acumulan con un único bincount sobre la
+        clave (columna, documento). El orden de acumulación respeta el orden de los
+        tokens de cada consulta, así que los valores coinciden con get_scores.
+
+        Returns:
+            Tupla (columnas, docs, scores) con las entradas no nulas, ordenadas por
+            columna y luego por documento
+        """
+        cols, docs, contribs = [], [], []
+        for col, query in enumerate(queries):
+            for term_id in self._term_ids(query):
+                term_docs, tfs = self._postings(term_id)
+                cols.append(np.full(len(term_docs), col, dtype=np.int64))
+                docs.append(term_docs)
+                contribs.append(self.idf[term_id] * self._weights(tfs, term_docs))
+
+        if not cols:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0)
+
+        keys = np.concatenate(cols) * self.corpus_size + np.concatenate(docs)
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(contribs))
+        return unique_keys // self.corpus_size, unique_keys % self.corpus_size, scores
+
+    def top_k_union(self, queries: Sequence[Sequence[str]], k: int) -> np.ndarray:
+        """
+        Unión de los top-k (scores positivos) de cada consulta, en un solo paso vectorizado.
+        Dentro de cada columna los empates se resuelven por id ascendente, igual que top_k.
+        """
+        cols, docs, scores = self.score_columns(queries)
+        positive = scores > 0
+        cols, docs, scores = cols[positive], docs[positive], scores[positive]
+        if k <= 0 or len(docs) == 0:
+            return np.empty(0, dtype=np.int64)
+
+        # Agrupar por columna, score descendente y luego id ascendente
+        order = np.lexsort((docs, -scores, cols))
+        cols, docs = cols[order], docs[order]
+        # Posición de cada entrada dentro de su columna
+        rank = np.arange(len(cols)) - np.searchsorted(cols, cols, side='left')
+        return np.unique(docs[rank < k])
+
+    def top_k(self, query: Sequence[str], k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k documentos con score positivo usando poda MaxScore.
+
+        1. Ordena los términos por su cota superior (idf * peso máximo).
+        2. Procesa términos "esenciales" acumulando scores parciales sobre sus postings.
+        3. Cuando la suma de cotas de los términos restantes no alcanza el k-ésimo
+           score parcial, ningún documento nuevo puede entrar al top-k: los términos
+           restantes solo se buscan (búsqueda binaria) en los candidatos ya vistos,
+           descartando los que no pueden superar el umbral.
+        4. Recalcula los scores finales de los candidatos en el orden original de la
+           consulta (idénticos a get_scores).
+
+        Returns:
+            Tupla (indices, scores) ordenada por score descendente; empates por id ascendente
+        """
+        empty = (np.empty(0, dtype=np.int64), np.empty(0))
+        term_ids = self._term_ids(query)
+        if k <= 0 or not term_ids:
+            return empty
+
+        # Términos únicos con su multiplicidad (un término repetido suma varias veces)
+        unique_terms, counts = np.unique(term_ids, return_counts=True)
+        if np.any(self.idf[unique_terms] < 0):
+            # Sin garantía de monotonía: scoring exhaustivo
+            return select_top_k(self.get_scores(query), k)
+
+        upper = counts * self.idf[unique_terms] * self.max_weight[unique_terms]
+        order = np.argsort(-upper, kind='stable')
+        unique_terms, counts, upper = unique_terms[order], counts[order], upper[order]
+        # remaining[i] = suma de cotas de los términos i..fin
+        remaining = np.concatenate([np.cumsum(upper[::-1])[::-1], [0.0]])
+        slack = 1 - 1e-9  # margen frente a diferencias de redondeo en sumas parciales
+
+        # Fase esencial: acumulador denso sobre los postings de los términos de mayor cota
+        partial = np.zeros(self.corpus_size)
+        touched = np.zeros(self.corpus_size, dtype=bool)
+        theta = 0.0
+        i = 0
+        while i < len(unique_terms):
+            n_candidates = np.count_nonzero(touched) if i else 0
+            if n_candidates >= k and remaining[i] < theta * slack:
+                break
+            docs, tfs = self._postings(unique_terms[i])
+            partial[docs] += counts[i] * self.idf[unique_terms[i]] * self._weights(tfs, docs)
+            touched[docs] = True
+            i += 1
+            theta = max(theta, kth_largest(partial[touched], k))
+
+        candidates = np.flatnonzero(touched)
+        cand_partial = partial[candidates]
+
+        # Fase no esencial: solo candidatos ya vistos que aún pueden alcanzar el umbral
+        for j in range(i, len(unique_terms)):
+            keep = cand_partial + remaining[j] >= theta * slack
+            candidates, cand_partial = candidates[keep], cand_partial[keep]
+            docs, tfs = self._postings(unique_terms[j])
+            if len(docs) == 0 or len(candidates) == 0:
+                continue
+            pos = np.minimum(np.searchsorted(docs, candidates), len(docs) - 1)
+            hit = docs[pos] == candidates
+            cand_partial[hit] += counts[j] * self.idf[unique_terms[j]] * self._weights(tfs[pos[hit]], candidates[hit])
+            theta = max(theta, kth_largest(cand_partial, k))
+
+        return select_top_k(self.score_documents(query, candidates), k, ids=candidates)
+
+
+def ensure_inverted_index(bm25) -> InvertedBM25Index:
+    """Devuelve el índice invertido, convirtiendo un BM25Okapi si hace falta"""
+    if isinstance(bm25, InvertedBM25Index):
+        return bm25
+    return InvertedBM25Index.from_bm25okapi(bm25)
@@ -2,13 +2,15 @@
 Retriever BM25 puro (sin FAISS)
 Usa solo búsqueda léxica, útil cuando hay problemas con embeddings
 """
-import pickle
+import asyncio
 import re
-import numpy as np
-from typing import List
+from typing import Any, List, Optional
 from langchain_core.documents import Document
 from langchain_core.retrievers import BaseRetriever
-from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from bm25_store import load_bm25_data, find_bm25_index
+from bm25_engine import ensure_inverted_index
+from executors import cpu_executor
 
 
 def tokenize_clean(text: str) -> List[str]:
@@ -29,22 +31,22 @@ class BM25Retriever(BaseRetriever):
     """
     
     bm25_index: any
-    bm25_docs: List[str]
-    bm25_metadatas: List[dict]
+    bm25_docs: Any  # Secuencia de textos (lista o BlobSequence mapeada en memoria)
+    bm25_metadatas: Any
     k: int = 10
     
-    def __init__(self, bm25_path: str = "bm25_index.pkl", k: int = 10):
+    def __init__(self, bm25_path: Optional[str] = None, k: int = 10):
         """
         Args:
-            bm25_path: Ruta al índice BM25
+            bm25_path: Ruta al índice BM25 (directorio binario o pickle heredado);
+                por defecto bm25_index/ si existe, si no bm25_index.pkl
             k: Número de documentos a retornar
         """
-        # Cargar índice BM25
-        with open(bm25_path, 'rb') as f:
-            bm25_data = pickle.load(f)
+        # Cargar índice BM25 (mapeado en memoria si está en formato binario)
+        bm25_data = load_bm25_data(bm25_path or find_bm25_index())
         
         super().__init__(
-            bm25_index=bm25_data['bm25'],
+            bm25_index=ensure_inverted_index(bm25_data['bm25']),
             bm25_docs=bm25_data['docs'],
             bm25_metadatas=bm25_data['metadatas'],
             k=k
@@ -58,20 +60,23 @@ class BM25Retriever(BaseRetriever):
         # Tokenizar query con limpieza de puntuación
         query_tokens = tokenize_clean(query)
         
-        # Obtener scores BM25
-        bm25_scores = self.bm25_index.get_scores(query_tokens)
-        
-        # Obtener top-k indices
-        top_indices = np.argsort(bm25_scores)[::-1][:self.k]
+        # Top-k con índice invertido (solo scores positivos)
+        top_indices, _ = self.bm25_index.top_k(query_tokens, self.k)
         
         # Crear documentos
         docs = []
         for idx in top_indices:
-            if bm25_scores[idx] > 0:  # Solo scores positivos
-                doc = Document(
-                    page_content=self.bm25_docs[idx],
-                    metadata=self.bm25_metadatas[idx]
-                )
-                docs.append(doc)
+            doc = Document(
+                page_content=self.bm25_docs[idx],
+                metadata=self.bm25_metadatas[idx]
+            )
+            docs.append(doc)
         
         return docs
+    
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun = None
+    ) -> List[Document]:
+        """Versión asíncrona: el scoring corre en el pool acotado de CPU"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(cpu_executor(), self._get_relevant_documents, query)
@@ -0,0 +1,231 @@
+"""
+Formato binario en disco (sin pickle) para el índice BM25, mapeable en memoria
+
+Estructura del directorio (versión 1):
+    manifest.json        formato, versión, parámetros BM25 y tamaños
+    indptr.npy           CSR: inicio de los postings de cada término
+    postings_docs.npy    CSR: ids de documento
+    postings_tfs.npy     CSR: frecuencia del término
+    idf.npy              IDF por término
+    max_weight.npy       peso máximo por término (poda MaxScore)
+    doc_len.npy          longitud (en tokens) de cada documento
+    doc_norm.npy         norma de longitud precalculada por documento
+    vocab.bin            términos en UTF-8 separados por salto de línea (id = posición)
+    texts.npy            blob UTF-8 con el texto de todos los documentos
+    text_offsets.npy     offsets de cada texto dentro del blob
+    metadata.npy         blob UTF-8 con la metadata de cada documento (JSON)
+    metadata_offsets.npy offsets de cada metadata dentro del blob
+
+Los arreglos se abren con np.load(mmap_mode='r'): varios workers de Streamlit
+comparten las mismas páginas a través del page cache del sistema operativo y el
+arranque en frío solo cuesta leer el manifest y el vocabulario.
+"""
+import json
+import os
+import pickle
+import shutil
+import sys
+import numpy as np
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, List, Sequence
+
+from bm25_engine import InvertedBM25Index, ensure_inverted_index
+
+FORMAT_NAME = "gerard-bm25"
+FORMAT_VERSION = 1
+DEFAULT_INDEX_DIR = "bm25_index"
+
+_ARRAYS = [
+    'indptr', 'postings_docs', 'postings_tfs', 'idf', 'max_weight',
+    'doc_len', 'doc_norm', 'texts', 'text_offsets', 'metadata', 'metadata_offsets'
+]
+
+
+class BlobSequence(Sequence):
+    """
+    Secuencia de solo lectura respaldada por un blob de bytes y una tabla de offsets.
+    Cada elemento se decodifica al accederlo; nada se materializa por adelantado.
+    """
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray, decode: Callable[[bytes], object]):
+        self._blob = blob
+        self._offsets = offsets
+        self._decode = decode
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        i = int(i)
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self._decode(self._blob[self._offsets[i]:self._offsets[i + 1]].tobytes())
+
+
+def decode_text(raw: bytes) -> str:
+    return raw.decode('utf-8')
+
+
+def decode_metadata(raw: bytes) -> dict:
+    return json.loads(raw.decode('utf-8'))
+
+
+def encode_metadata(metadata: dict) -> bytes:
+    return json.dumps(metadata, ensure_ascii=False, default=str).encode('utf-8')
+
+
+def pack_blobs(items: List[bytes]):
+    """Concatena bytes en un blob uint8 y devuelve (blob, offsets)"""
+    offsets = np.zeros(len(items) + 1, dtype=np.int64)
+    np.cumsum([len(item) for item in items], out=offsets[1:])
+    blob = np.frombuffer(b"".join(items), dtype=np.uint8)
+    return blob, offsets
+
+
+def save_bm25_index(path: str, bm25, docs: Sequence[str], metadatas: Sequence[dict]) -> Path:
+    """
+    Escribe el índice en formato binario versionado.
+    Se escribe en un directorio temporal y se reemplaza el destino al final.
+    """
+    engine = ensure_inverted_index(bm25)
+    target = Path(path)
+    tmp = target.with_name(target.name + ".tmp")
+    if tmp.exists():
+        shutil.rmtree(tmp)
+    tmp.mkdir(parents=True)
+
+    texts, text_offsets = pack_blobs([d.encode('utf-8') for d in docs])
+    metadata, metadata_offsets = pack_blobs([encode_metadata(m) for m in metadatas])
+    arrays = {
+        'indptr': engine.indptr.astype(np.int64),
+        'postings_docs': engine.postings_docs.astype(np.int32),
+        'postings_tfs': engine.postings_tfs.astype(np.int32),
+        'idf': engine.idf.astype(np.float64),
+        'max_weight': engine.max_weight.astype(np.float64),
+        'doc_len': np.asarray(engine.doc_len, dtype=np.int64),
+        'doc_norm': engine.doc_norm.astype(np.float64),
+        'texts': texts,
+        'text_offsets': text_offsets,
+        'metadata': metadata,
+        'metadata_offsets': metadata_offsets,
+    }
+    for name, array in arrays.items():
+        np.save(tmp / f"{name}.npy", array)
+
+    terms = sorted(engine.vocab, key=engine.vocab.get)
+    (tmp / "vocab.bin").write_bytes("\n".join(terms).encode('utf-8'))
+
+    manifest = {
+        'format': FORMAT_NAME,
+        'version': FORMAT_VERSION,
+        'corpus_size': engine.corpus_size,
+        'vocab_size': len(terms),
+        'num_postings': int(len(engine.postings_docs)),
+        'k1': engine.k1,
+        'b': engine.b,
+        'avgdl': engine.avgdl,
+    }
+    (tmp / "manifest.json").write_text(json.dumps(manifest, indent=2), encoding='utf-8')
+
+    # Reemplazo del índice anterior
+    old = target.with_name(target.name + ".old")
+    if target.exists():
+        if old.exists():
+            shutil.rmtree(old)
+        target.rename(old)
+    tmp.rename(target)
+    if old.exists():
+        shutil.rmtree(old)
+    return target
+
+
+def read_manifest(path: str) -> dict:
+    """Lee y valida el manifest del índice"""
+    manifest = json.loads((Path(path) / "manifest.json").read_text(encoding='utf-8'))
+    if manifest.get('format') != FORMAT_NAME:
+        raise ValueError(f"{path} no es un índice BM25 de GERARD")
+    if manifest.get('version') != FORMAT_VERSION:
+        raise ValueError(
+            f"Versión de índice BM25 no soportada: {manifest.get('version')} (se esperaba {FORMAT_VERSION})"
+        )
+    return manifest
+
+
+@lru_cache(maxsize=None)
+def _open_cached(path: str, mtime: float) -> dict:
+    manifest = read_manifest(path)
+    base = Path(path)
+    arrays = {name: np.load(base / f"{name}.npy", mmap_mode='r') for name in _ARRAYS}
+    terms = (base / "vocab.bin").read_bytes().decode('utf-8')
+    vocab = {term: i for i, term in enumerate(terms.split("\n"))} if terms else {}
+
+    engine = InvertedBM25Index(
+        vocab=vocab,
+        idf=arrays['idf'],
+        indptr=arrays['indptr'],
+        postings_docs=arrays['postings_docs'],
+        postings_tfs=arrays['postings_tfs'],
+        doc_len=arrays['doc_len'],
+        k1=manifest['k1'],
+        b=manifest['b'],
+        avgdl=manifest['avgdl'],
+        doc_norm=arrays['doc_norm'],
+        max_weight=arrays['max_weight']
+    )
+    return {
+        'bm25': engine,
+        'docs': BlobSequence(arrays['texts'], arrays['text_offsets'], decode_text),
+        'metadatas': BlobSequence(arrays['metadata'], arrays['metadata_offsets'], decode_metadata),
+        'manifest': manifest
+    }
+
+
+def open_bm25_index(path: str = DEFAULT_INDEX_DIR) -> dict:
+    """
+    Abre el índice mapeado en memoria.
+    Se cachea por proceso (ruta + fecha del manifest): todas las instancias de
+    retriever comparten los mismos arreglos.
+
+    Returns:
+        dict con 'bm25' (InvertedBM25Index), 'docs', 'metadatas' y 'manifest'
+    """
+    path = os.path.abspath(path)
+    return _open_cached(path, os.path.getmtime(os.path.join(path, "manifest.json")))
+
+
+def load_bm25_data(path: str) -> dict:
+    """
+    Carga el índice BM25 desde el formato binario (directorio) o desde el pickle
+    heredado (bm25_index.pkl).
+    """
+    if os.path.isdir(path):
+        return open_bm25_index(path)
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def find_bm25_index(preferred: str = DEFAULT_INDEX_DIR, legacy: str = "bm25_index.pkl") -> str:
+    """Ruta del índice disponible: primero el formato binario, luego el pickle"""
+    if os.path.isdir(preferred):
+        return preferred
+    return legacy
+
+
+if __name__ == "__main__":
+    # Conversión del pickle heredado: python bm25_store.py [bm25_index.pkl] [bm25_index]
+    source = sys.argv[1] if len(sys.argv) > 1 else "bm25_index.pkl"
+    destination = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_INDEX_DIR
+
+    print(f"📥 Cargando {source}...")
+    with open(source, 'rb') as f:
+        data = pickle.load(f)
+
+    print("🔨 Convirtiendo a formato binario...")
+    target = save_bm25_index(destination, data['bm25'], data['docs'], data['metadatas'])
+    size_mb = sum(p.stat().st_size for p in target.iterdir()) / (1024 * 1024)
+    print(f"✅ Índice guardado en {target} ({size_mb:.2f} MB)")
@@ -0,0 +1,197 @@
+"""
+Deduplicación de chunks antes de indexar
+
+El corpus tiene muchas resubidas y transcripciones casi idénticas de la misma
+charla. Cada copia se embebía, ocupaba FAISS y BM25, y llenaba el top-k con
+resultados redundantes. ChunkDeduplicator se coloca entre el chunker y el
+indexado:
+    - duplicados exactos: mismo hash del texto normalizado (sin timestamps,
+      minúsculas, solo palabras), así que una resubida con tiempos corridos
+      también colapsa
+    - casi duplicados: MinHash sobre shingles de palabras con LSH por bandas;
+      los candidatos se confirman con la similitud Jaccard estimada
+
+Solo se indexa el primer chunk (canónico). Cada duplicado queda como alias en
+metadata['aliases'] del canónico, con su fuente y sus tiempos, para que las
+citas sigan apuntando a todas las copias.
+"""
+import hashlib
+import re
+import zlib
+from typing import Dict, Hashable, Iterable, Iterator, List, MutableMapping, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+# Prefijo de cada bloque del chunk: [HH:MM:SS --> HH:MM:SS]
+_TIMESTAMP_PREFIX = re.compile(r'\[\d{2}:\d{2}:\d{2} --> \d{2}:\d{2}:\d{2}\]')
+_WORD = re.compile(r'\w+')
+
+_ALIAS_FIELDS = ('source', 'start_time', 'end_time', 'start_seconds', 'end_seconds')
+
+
+def normalize_words(text: str) -> List[str]:
+    """Palabras del chunk sin timestamps, en minúsculas"""
+    return _WORD.findall(_TIMESTAMP_PREFIX.sub(' ', text).casefold())
+
+
+class ChunkDeduplicator:
+    """
+    Índice incremental de chunks canónicos (hash exacto + firmas MinHash).
+
+    Las claves son los ids de docstore de los canónicos; los alias se acumulan
+    en self.aliases y se copian a la metadata con apply_aliases (FAISS copia la
+    metadata al agregar, así que se aplican sobre el docstore antes de guardar).
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.85,
+        num_perm: int = 64,
+        bands: int = 16,
+        shingle_size: int = 5,
+        near_duplicates: bool = True,
+        seed: int = 0
+    ):
+        """
+        Args:
+            threshold: Jaccard estimada mínima para considerar casi duplicado
+            num_perm: Permutaciones de MinHash (largo de la firma)
+            bands: Bandas de LSH (num_perm debe ser múltiplo)
+            shingle_size: Palabras por shingle
+            near_duplicates: False = solo duplicados exactos
+            seed: Semilla de las permutaciones (fija: resultados reproducibles)
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm debe ser múltiplo de bands")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.near_duplicates = near_duplicates
+
+        # Hash universal multiply-shift: h(x) = (a*x + b) mod 2^64 >> 32
+        rng = np.random.default_rng(seed)
+        self._a = (rng.integers(1, 2 ** 63, num_perm, dtype=np.uint64) | np.uint64(1))[:, None]
+        self._b = rng.integers(0, 2 ** 63, num_perm, dtype=np.uint64)[:, None]
+
+        self._exact: Dict[bytes, Hashable] = {}
+        self._signatures: Dict[Hashable, np.ndarray] = {}
+        self._buckets: Dict[Tuple[int, bytes], List[Hashable]] = {}
+        self.aliases: Dict[Hashable, List[dict]] = {}
+        self.stats = {'input': 0, 'kept': 0, 'exact_duplicates': 0, 'near_duplicates': 0}
+
+    def signature(self, words: List[str]) -> Optional[np.ndarray]:
+        """Firma MinHash (uint32[num_perm]); None si el chunk es demasiado corto para compararlo"""
+        k = self.shingle_size
+        # Chunks muy cortos: solo duplicados exactos (un shingle más o menos cambia mucho la Jaccard)
+        if len(words) < 2 * k:
+            return None
+        shingles = {" ".join(words[i:i + k]) for i in range(len(words) - k + 1)}
+        hashes = np.fromiter((zlib.crc32(shingle.encode('utf-8')) for shingle in shingles),
+                             dtype=np.uint64, count=len(shingles))
+        return ((hashes[None, :] * self._a + self._b) >> np.uint64(32)).min(axis=1).astype(np.uint32)
+
+    def _find(self, words: List[str]) -> Tuple[Optional[Hashable], str, float, bytes, Optional[np.ndarray]]:
+        exact_key = hashlib.blake2b(" ".join(words).encode('utf-8'), digest_size=16).digest()
+        canonical = self._exact.get(exact_key)
+        if canonical is not None:
+            return canonical, 'exact', 1.0, exact_key, None
+
+        signature = self.signature(words) if self.near_duplicates else None
+        if signature is not None:
+            best, best_similarity = None, 0.0
+            for band in range(self.bands):
+                band_key = (band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+                for candidate in self._buckets.get(band_key, ()):
+                    similarity = float(np.mean(self._signatures[candidate] == signature))
+                    if similarity > best_similarity:
+                        best, best_similarity = candidate, similarity
+            if best is not None and best_similarity >= self.threshold:
+                return best, 'near', best_similarity, exact_key, signature
+        return None, '', 0.0, exact_key, signature
+
+    def _register(self, key: Hashable, exact_key: bytes, signature: Optional[np.ndarray]) -> None:
+        self._exact[exact_key] = key
+        if signature is not None:
+            self._signatures[key] = signature
+            for band in range(self.bands):
+                band_key = (band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+                self._buckets.setdefault(band_key, []).append(key)
+
+    def register(self, key: Hashable, text: str) -> None:
+        """Registra un canónico que ya está en el índice (sin deduplicarlo)"""
+        words = normalize_words(text)
+        exact_key = hashlib.blake2b(" ".join(words).encode('utf-8'), digest_size=16).digest()
+        if exact_key in self._exact:
+            return
+        self._register(key, exact_key, self.signature(words) if self.near_duplicates else None)
+
+    def add(self, key: Hashable, doc: Document) -> Optional[Hashable]:
+        """
+        Procesa un chunk nuevo.
+
+        Returns:
+            None si es canónico (hay que indexarlo con esa clave), o la clave del
+            canónico del que es duplicado (ya quedó anotado como alias)
+        """
+        self.stats['input'] += 1
+        canonical, match, similarity, exact_key, signature = self._find(normalize_words(doc.page_content))
+        if canonical is None:
+            self._register(key, exact_key, signature)
+            self.stats['kept'] += 1
+            return None
+
+        alias = {field: doc.metadata[field] for field in _ALIAS_FIELDS if field in doc.metadata}
+        alias['match'] = match
+        if match == 'near':
+            alias['similarity'] = round(similarity, 3)
+        self.aliases.setdefault(canonical, []).append(alias)
+        self.stats['exact_duplicates' if match == 'exact' else 'near_duplicates'] += 1
+        return canonical
+
+    def deduplicate(self, documents: Iterable[Tuple[Hashable, Document]]) -> Iterator[Tuple[Hashable, Document]]:
+        """Filtra un flujo de (clave, Document) dejando solo los canónicos"""
+        for key, doc in documents:
+            if self.add(key, doc) is None:
+                yield key, doc
+
+    def apply_aliases(self, docstore: MutableMapping[Hashable, Document]) -> int:
+        """Agrega los alias acumulados a la metadata de los canónicos. Devuelve cuántos se aplicaron"""
+        applied = 0
+        for key, aliases in self.aliases.items():
+            doc = docstore.get(key)
+            if doc is None:
+                continue
+            doc.metadata['aliases'] = list(doc.metadata.get('aliases', [])) + aliases
+            applied += len(aliases)
+        self.aliases = {}
+        return applied
+
+    def report(self) -> str:
+        duplicates = self.stats['exact_duplicates'] + self.stats['near_duplicates']
+        ratio = duplicates / self.stats['input'] * 100 if self.stats['input'] else 0.0
+        return (f"{self.stats['kept']:,}/{self.stats['input']:,} chunks únicos, {duplicates:,} duplicados "
+                f"({self.stats['exact_duplicates']:,} exactos, {self.stats['near_duplicates']:,} casi idénticos, "
+                f"{ratio:.1f}%)")
+
+
+def format_aliases(metadata: dict, limit: int = 5) -> str:
+    """Línea 'TAMBIÉN EN: fuente [inicio --> fin]; ...' para el contexto del LLM ('' sin alias)"""
+    aliases = metadata.get('aliases') or []
+    seen = set()
+    parts = []
+    for alias in aliases:
+        source = str(alias.get('source', '')).replace('\\', '/').split('/')[-1]
+        start = str(alias.get('start_time', '')).split(',')[0]
+        end = str(alias.get('end_time', '')).split(',')[0]
+        entry = f"{source} [{start} --> {end}]" if start and end else source
+        if entry in seen or source == metadata.get('source'):
+            continue
+        seen.add(entry)
+        parts.append(entry)
+    if not parts:
+        return ""
+    extra = f" (+{len(parts) - limit} más)" if len(parts) > limit else ""
+    return "TAMBIÉN EN: " + "; ".join(parts[:limit]) + extra
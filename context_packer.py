@@ -0,0 +1,156 @@
+"""
+Empaquetado del contexto para el LLM con presupuesto de tokens
+
+Los chunks SRT se solapan (~150 caracteres, es decir, los últimos bloques de
+subtítulos de un chunk se repiten al inicio del siguiente). Antes de enviar el
+contexto al LLM:
+    1. Se recorren los chunks en orden de ranking y de cada uno se toman solo los
+       bloques de subtítulos que aún no están en el contexto
+    2. Se agregan mientras quepan en el presupuesto de tokens
+    3. Los chunks contiguos del mismo archivo se fusionan en un solo fragmento
+       con un único rango de tiempo
+"""
+import math
+import re
+from typing import Dict, List, Sequence, Tuple
+from langchain_core.documents import Document
+
+# Cada bloque del chunk empieza con su timestamp: [HH:MM:SS --> HH:MM:SS] texto
+_BLOCK_SPLIT = re.compile(r'\n(?=\[\d{2}:\d{2}:\d{2} --> \d{2}:\d{2}:\d{2}\])')
+
+# Costo aproximado de la cabecera "VIDEO / AUDIO: título\n[inicio --> fin]\n" + separador
+HEADER_TOKENS = 30
+
+
+def estimate_tokens(text: str, chars_per_token: float = 4.0) -> int:
+    """Estimación de tokens por longitud (no hay tokenizador local para Gemini)"""
+    return int(math.ceil(len(text) / chars_per_token))
+
+
+def _split_blocks(text: str) -> List[str]:
+    return _BLOCK_SPLIT.split(text)
+
+
+def _end_key(metadata: dict) -> Tuple[float, float]:
+    return (metadata.get('end_index', -1), metadata.get('end_seconds', -1.0))
+
+
+def _is_contiguous(previous: dict, current: dict) -> bool:
+    """True si el chunk current empieza dentro o justo después del rango de previous"""
+    prev_end = previous.get('end_index')
+    cur_start = current.get('start_index')
+    if prev_end is not None and cur_start is not None:
+        return cur_start <= prev_end + 1
+    prev_end = previous.get('end_seconds')
+    cur_start = current.get('start_seconds')
+    if prev_end is not None and cur_start is not None:
+        return cur_start <= prev_end
+    return False
+
+
+def _merge(group: List[Tuple[int, Document, List[str]]]) -> Tuple[int, Document]:
+    """Fusiona chunks contiguos de un archivo (ordenados por tiempo) en un Document"""
+    best_rank = min(rank for rank, _, _ in group)
+    first = group[0][1].metadata
+    last = max((doc.metadata for _, doc, _ in group), key=_end_key)
+    blocks = [block for _, _, new_blocks in group for block in new_blocks]
+
+    metadata = dict(group[0][1].metadata)
+    if len(group) > 1:
+        metadata.update({
+            'end_time': last.get('end_time', metadata.get('end_time')),
+            'end_seconds': last.get('end_seconds', metadata.get('end_seconds')),
+            'end_index': last.get('end_index', metadata.get('end_index')),
+            'num_blocks': len(blocks),
+            'merged_chunks': len(group)
+        })
+        # Alias de duplicados (chunk_dedup) de todos los chunks fusionados
+        aliases = [alias for _, doc, _ in group for alias in doc.metadata.get('aliases', [])]
+        if aliases:
+            metadata['aliases'] = aliases
+        if 'start_seconds' in first and 'end_seconds' in metadata:
+            metadata['duration_seconds'] = metadata['end_seconds'] - first['start_seconds']
+        if first.get('start_time') and metadata.get('end_time'):
+            metadata['timestamp_range'] = f"{first['start_time']} → {metadata['end_time']}"
+    return best_rank, Document(page_content="\n".join(blocks), metadata=metadata)
+
+
+def pack_context(
+    docs: Sequence[Document],
+    max_tokens: int = 40_000,
+    chars_per_token: float = 4.0
+) -> Tuple[List[Document], Dict]:
+    """
+    Selecciona y fusiona los documentos que entran en el presupuesto.
+
+    Args:
+        docs: Documentos recuperados, en orden de ranking
+        max_tokens: Presupuesto de tokens del contexto
+        chars_per_token: Caracteres por token para la estimación
+
+    Returns:
+        Tupla de (documentos empaquetados, reporte). Los documentos se devuelven
+        en el orden del mejor ranking de sus chunks; el reporte incluye cuántos
+        chunks se descartaron por presupuesto y cuántos eran totalmente repetidos.
+    """
+    seen_blocks = set()
+    selected: List[Tuple[int, Document, List[str]]] = []
+    used_tokens = 0
+    report = {
+        'input_chunks': len(docs),
+        'kept_chunks': 0,
+        'duplicate_chunks': 0,
+        'dropped_chunks': 0,
+        'packed_documents': 0,
+        'estimated_tokens': 0,
+        'budget_tokens': max_tokens
+    }
+
+    for rank, doc in enumerate(docs):
+        source = doc.metadata.get('source', 'unknown')
+        new_blocks = []
+        for block in _split_blocks(doc.page_content):
+            key = (source, block)
+            if key not in seen_blocks:
+                new_blocks.append(block)
+
+        if not new_blocks:
+            # Todo su contenido ya está en el contexto (solapamiento o duplicado)
+            report['duplicate_chunks'] += 1
+            continue
+
+        cost = estimate_tokens("\n".join(new_blocks), chars_per_token) + HEADER_TOKENS
+        if used_tokens + cost > max_tokens:
+            # No cabe: se descarta, pero un chunk posterior más corto aún puede entrar
+            report['dropped_chunks'] += 1
+            continue
+
+        used_tokens += cost
+        seen_blocks.update((source, block) for block in new_blocks)
+        selected.append((rank, doc, new_blocks))
+
+    # Fusionar chunks contiguos del mismo archivo
+    by_source: Dict[str, List[Tuple[int, Document, List[str]]]] = {}
+    for item in selected:
+        by_source.setdefault(item[1].metadata.get('source', 'unknown'), []).append(item)
+
+    packed: List[Tuple[int, Document]] = []
+    for items in by_source.values():
+        items.sort(key=lambda item: (item[1].metadata.get('start_seconds', 0.0), item[0]))
+        group = [items[0]]
+        group_end = items[0][1].metadata
+        for item in items[1:]:
+            if _is_contiguous(group_end, item[1].metadata):
+                group.append(item)
+                group_end = max(group_end, item[1].metadata, key=_end_key)
+            else:
+                packed.append(_merge(group))
+                group = [item]
+                group_end = item[1].metadata
+        packed.append(_merge(group))
+
+    packed.sort(key=lambda item: item[0])
+    report['kept_chunks'] = len(selected)
+    report['packed_documents'] = len(packed)
+    report['estimated_tokens'] = used_tokens
+    return [doc for _, doc in packed], report
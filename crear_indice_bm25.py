@@ -3,11 +3,11 @@ Crear índice BM25 desde el índice FAISS existente
 para búsqueda léxica complementaria
 """
 import os
-import pickle
 import json
 from pathlib import Path
-from rank_bm25 import BM25Okapi
 from tqdm import tqdm
+from bm25_engine import InvertedBM25Index
+from bm25_store import save_bm25_index, DEFAULT_INDEX_DIR
 
 os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = 'credencial json/midyear-node-436821-t3-525a146e96a0.json'
 
@@ -69,22 +69,15 @@ print(f"✅ Tokenización completada\n")
 
 # 4. Crear índice BM25
 print("🔨 Construyendo índice BM25...")
-bm25 = BM25Okapi(tokenized_docs)
+bm25 = InvertedBM25Index.from_tokenized(tokenized_docs)
 print("✅ Índice BM25 creado\n")
 
-# 5. Guardar índice BM25 y metadata
+# 5. Guardar índice BM25 y metadata (formato binario mapeable en memoria, sin pickle)
 print("💾 Guardando índice BM25...")
 
-bm25_data = {
-    'bm25': bm25,
-    'docs': docs,
-    'metadatas': metadatas
-}
-
-with open('bm25_index.pkl', 'wb') as f:
-    pickle.dump(bm25_data, f)
+index_dir = save_bm25_index(DEFAULT_INDEX_DIR, bm25, docs, metadatas)
 
-print(f"✅ Índice guardado en bm25_index.pkl")
+print(f"✅ Índice guardado en {index_dir}/")
 
 # Guardar estadísticas
 stats = {
@@ -105,6 +98,6 @@ print("=" * 60)
 print(f"Total documentos: {stats['total_docs']:,}")
 print(f"Longitud promedio: {stats['avg_doc_length']:.1f} tokens")
 print(f"Total tokens: {stats['total_tokens']:,}")
-print(f"Tamaño archivo: {Path('bm25_index.pkl').stat().st_size / (1024*1024):.2f} MB")
+print(f"Tamaño índice: {sum(p.stat().st_size for p in index_dir.iterdir()) / (1024*1024):.2f} MB")
 print("=" * 60)
 print("\n✨ Índice BM25 listo para búsqueda híbrida")
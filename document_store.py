@@ -0,0 +1,153 @@
+"""
+Almacén único de documentos, de solo lectura y compartido por todo el proceso
+
+El corpus se guarda una sola vez, indexado por un id entero (posición en el
+docstore de FAISS, que es también la fila del índice BM25). FAISS, BM25 y el
+filtro por título se refieren a los documentos por id, y los objetos Document
+solo se construyen para los resultados finales.
+
+El id viaja en metadata['chunk_id'] de cada Document (lo escriben los
+constructores del índice y lo agrega get_document), así que la fusión de
+rankings compara enteros en lugar de textos.
+"""
+import os
+from collections.abc import Mapping, Sequence
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+from langchain_core.documents import Document
+
+CHUNK_ID_KEY = 'chunk_id'
+
+
+def assign_chunk_ids(docstore: Mapping) -> int:
+    """
+    Escribe en la metadata de cada Document del docstore de FAISS su id entero
+    (posición en el docstore). Se llama antes de guardar cada índice, después de
+    borrar o agregar chunks. Devuelve el número de documentos.
+    """
+    for chunk_id, doc in enumerate(docstore.values()):
+        doc.metadata[CHUNK_ID_KEY] = chunk_id
+    return len(docstore)
+
+
+def chunk_ids(docs: Sequence[Document]) -> np.ndarray:
+    """
+    Ids enteros de una lista de resultados (int64).
+
+    Los documentos de un índice sin 'chunk_id' (construido antes de que existiera)
+    reciben un id negativo derivado del texto completo: nunca coinciden con un id
+    real ni con otro chunk distinto.
+    """
+    ids = np.empty(len(docs), dtype=np.int64)
+    for i, doc in enumerate(docs):
+        chunk_id = doc.metadata.get(CHUNK_ID_KEY)
+        ids[i] = chunk_id if chunk_id is not None else -1 - (hash(doc.page_content) & 0x3FFFFFFFFFFFFFFF)
+    return ids
+
+
+class DocumentStore(Sequence):
+    """
+    Corpus de solo lectura: textos y metadata por id entero.
+
+    Se comporta como una secuencia de Document (construidos al acceder), así que
+    sirve donde antes se pasaba la lista completa de documentos.
+    """
+
+    def __init__(
+        self,
+        texts: Sequence,
+        metadatas: Sequence,
+        docstore_ids: Optional[List[str]] = None,
+        id_index: Optional[Mapping] = None
+    ):
+        """
+        Args:
+            texts: Textos por id (lista o BlobSequence mapeada en memoria)
+            metadatas: Metadata por id
+            docstore_ids: Id de docstore de FAISS de cada documento (para el mapeo inverso)
+            id_index: Mapeo inverso ya construido (id de docstore -> id entero), p. ej.
+                uno respaldado por disco; reemplaza a docstore_ids
+        """
+        if len(texts) != len(metadatas):
+            raise ValueError("texts y metadatas deben tener la misma longitud")
+        self.texts = texts
+        self.metadatas = metadatas
+        if id_index is None:
+            id_index = {docstore_id: i for i, docstore_id in enumerate(docstore_ids)} if docstore_ids else {}
+        self._id_by_docstore_id: Mapping = id_index
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def __getitem__(self, doc_id):
+        if isinstance(doc_id, slice):
+            return [self.get_document(i) for i in range(*doc_id.indices(len(self)))]
+        return self.get_document(doc_id)
+
+    def get_document(self, doc_id: int) -> Document:
+        """Construye el Document de un id"""
+        doc_id = int(doc_id)
+        metadata = dict(self.metadatas[doc_id])
+        metadata[CHUNK_ID_KEY] = doc_id
+        return Document(page_content=self.texts[doc_id], metadata=metadata)
+
+    def get_documents(self, doc_ids: Iterable[int]) -> List[Document]:
+        """Construye los Document de varios ids, en el orden recibido"""
+        return [self.get_document(i) for i in doc_ids]
+
+    def id_for_docstore_id(self, docstore_id: str) -> Optional[int]:
+        """Id entero correspondiente a un id de docstore de FAISS"""
+        return self._id_by_docstore_id.get(docstore_id)
+
+    @classmethod
+    def from_faiss(cls, faiss_vs, bm25_path: Optional[str] = None) -> "DocumentStore":
+        """
+        Crea el almacén a partir del vectorstore FAISS y le reemplaza el docstore
+        por una vista sobre el almacén, de modo que el corpus no quede duplicado.
+
+        Si existe el índice BM25 binario con el mismo número de documentos, sus
+        blobs mapeados en memoria se usan directamente como textos y metadata.
+        """
+        if isinstance(faiss_vs.docstore, StoreDocstore):
+            return faiss_vs.docstore.store
+
+        # Los ids enteros siguen el orden del docstore, igual que las filas del índice BM25
+        docstore_ids = list(faiss_vs.docstore._dict.keys())
+
+        texts = metadatas = None
+        if bm25_path and os.path.isdir(bm25_path):
+            from bm25_store import open_bm25_index
+            bm25_data = open_bm25_index(bm25_path)
+            if len(bm25_data['docs']) == len(docstore_ids):
+                texts, metadatas = bm25_data['docs'], bm25_data['metadatas']
+
+        if texts is None:
+            docs = list(faiss_vs.docstore._dict.values())
+            texts = [d.page_content for d in docs]
+            metadatas = [d.metadata for d in docs]
+
+        store = cls(texts, metadatas, docstore_ids)
+        faiss_vs.docstore = StoreDocstore(store)
+        return store
+
+
+class StoreDocstore:
+    """
+    Docstore de FAISS respaldado por DocumentStore (solo lectura).
+    FAISS lo consulta con su id de docstore y recibe Documents construidos al vuelo.
+    """
+
+    def __init__(self, store: DocumentStore):
+        self.store = store
+
+    def search(self, search: str):
+        doc_id = self.store.id_for_docstore_id(search)
+        if doc_id is None:
+            return f"ID {search} not found."
+        return self.store.get_document(doc_id)
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        raise NotImplementedError("El almacén de documentos es de solo lectura")
+
+    def delete(self, ids: List) -> None:
+        raise NotImplementedError("El almacén de documentos es de solo lectura")
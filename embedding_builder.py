@@ -0,0 +1,336 @@
+"""
+Embebido por lotes para construir el índice FAISS
+
+Construir faiss_index llama a la API de embeddings por cada chunk del corpus;
+con decenas de miles de chunks una caída a mitad de camino perdía horas de
+trabajo. EmbeddingBuilder:
+    - agrupa los textos en lotes de batch_size y envía hasta concurrency lotes
+      en paralelo
+    - respeta un límite de peticiones por minuto (token bucket compartido)
+    - reintenta con backoff exponencial (y jitter) los errores transitorios
+    - guarda cada lote terminado en un checkpoint SQLite indexado por el hash
+      del contenido, así que una ejecución interrumpida retoma donde quedó y
+      los textos repetidos se embeben una sola vez
+
+Uso:
+    python embedding_builder.py documentos_srt/ [--batch-size 100] [--concurrency 4] [--rpm 300]
+    python embedding_builder.py documentos_srt/ --fake-server http://127.0.0.1:8765  (ver fake_embedding_server.py)
+    python embedding_builder.py documentos_srt/ --no-dedup  (indexa también los chunks duplicados)
+"""
+import hashlib
+import random
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+DEFAULT_CHECKPOINT_PATH = "cache/embedding_checkpoint.sqlite3"
+
+
+class TokenBucket:
+    """Limitador token bucket: rate fichas por segundo, ráfagas de hasta capacity"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """Bloquea hasta disponer de tokens fichas. Devuelve los segundos esperados"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+                delay = (tokens - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class EmbeddingCheckpoint:
+    """Vectores ya calculados, indexados por sha256(modelo + texto), en SQLite"""
+
+    def __init__(self, path: str, model_name: str):
+        self.model_name = model_name
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS vectors (hash TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+        )
+        self._db.commit()
+
+    def content_hash(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode('utf-8')).hexdigest()
+
+    def get_many(self, hashes: Sequence[str]) -> Dict[str, np.ndarray]:
+        found = {}
+        for start in range(0, len(hashes), 500):
+            batch = list(hashes[start:start + 500])
+            placeholders = ",".join("?" * len(batch))
+            rows = self._db.execute(
+                f"SELECT hash, vector FROM vectors WHERE hash IN ({placeholders})", batch
+            ).fetchall()
+            for content_hash, blob in rows:
+                found[content_hash] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def put_many(self, items: Iterable[Tuple[str, Sequence[float]]]) -> None:
+        # Un commit por lote: lo que ya se pagó queda en disco aunque el proceso muera
+        self._db.executemany(
+            "INSERT OR REPLACE INTO vectors (hash, vector) VALUES (?, ?)",
+            [(content_hash, np.asarray(vector, dtype=np.float32).tobytes()) for content_hash, vector in items]
+        )
+        self._db.commit()
+
+    def __len__(self) -> int:
+        (count,) = self._db.execute("SELECT COUNT(*) FROM vectors").fetchone()
+        return count
+
+    def close(self) -> None:
+        self._db.close()
+
+
+class EmbeddingBuilder:
+    """
+    Embebe textos por lotes con concurrencia, límite de peticiones, reintentos
+    y checkpoint en disco.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model_name: str,
+        checkpoint_path: str = DEFAULT_CHECKPOINT_PATH,
+        batch_size: int = 100,
+        concurrency: int = 4,
+        requests_per_minute: Optional[float] = None,
+        max_retries: int = 6,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0
+    ):
+        """
+        Args:
+            embeddings: Objeto de embeddings real (Vertex AI, Google AI Studio...)
+            model_name: Nombre del modelo (parte del hash del checkpoint)
+            checkpoint_path: Archivo SQLite del checkpoint
+            batch_size: Textos por petición
+            concurrency: Peticiones simultáneas
+            requests_per_minute: Cuota de la API (None = sin límite)
+            max_retries: Reintentos por lote antes de abortar
+            base_delay / max_delay: Backoff exponencial (segundos)
+        """
+        self.embeddings = embeddings
+        self.checkpoint = EmbeddingCheckpoint(checkpoint_path, model_name)
+        self.batch_size = batch_size
+        self.concurrency = max(1, concurrency)
+        self.bucket = TokenBucket(requests_per_minute / 60.0) if requests_per_minute else None
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.stats = {'checkpoint_hits': 0, 'embedded': 0, 'requests': 0, 'retries': 0, 'throttled_seconds': 0.0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, key: str, value=1) -> None:
+        with self._stats_lock:
+            self.stats[key] += value
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        # Retry-After del servidor si el cliente lo expone; si no, exponencial con jitter
+        retry_after = getattr(error, 'retry_after', None)
+        if retry_after is not None:
+            return float(retry_after)
+        return min(self.max_delay, self.base_delay * (2 ** attempt)) * random.uniform(0.5, 1.0)
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        for attempt in range(self.max_retries + 1):
+            if self.bucket is not None:
+                self._count('throttled_seconds', self.bucket.acquire())
+            self._count('requests')
+            try:
+                vectors = self.embeddings.embed_documents(texts)
+                if len(vectors) != len(texts):
+                    raise RuntimeError(f"La API devolvió {len(vectors)} vectores para {len(texts)} textos")
+                return vectors
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self._backoff(attempt, e)
+                self._count('retries')
+                print(f"   ⚠️  Lote de {len(texts)} textos falló ({type(e).__name__}: {e}), reintento en {delay:.1f}s")
+                time.sleep(delay)
+
+    def embed_texts(self, texts: Sequence[str]) -> np.ndarray:
+        """
+        Vectores (float32, en el orden de texts) de todos los textos. Los que ya
+        están en el checkpoint no se vuelven a pedir a la API.
+        """
+        hashes = [self.checkpoint.content_hash(text) for text in texts]
+        found = self.checkpoint.get_many(list(dict.fromkeys(hashes)))
+        self._count('checkpoint_hits', len(found))
+
+        pending: Dict[str, str] = {}
+        for content_hash, text in zip(hashes, texts):
+            if content_hash not in found and content_hash not in pending:
+                pending[content_hash] = text
+
+        if pending:
+            items = list(pending.items())
+            batches = [items[i:i + self.batch_size] for i in range(0, len(items), self.batch_size)]
+            print(f"   🧮 {len(pending):,} textos por embeber en {len(batches)} lotes "
+                  f"({len(found):,} ya en el checkpoint)")
+            done = 0
+            error = None
+            with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="gerard-embed") as executor:
+                futures = {
+                    executor.submit(self._embed_batch, [text for _, text in batch]): batch
+                    for batch in batches
+                }
+                remaining = set(futures)
+                while remaining:
+                    finished, remaining = wait(remaining, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        if future.cancelled():
+                            continue
+                        if future.exception() is not None:
+                            # Abortar: no se envían más lotes, pero los que ya están en
+                            # vuelo se guardan. La próxima ejecución retoma desde aquí
+                            if error is None:
+                                error = future.exception()
+                                for other in remaining:
+                                    other.cancel()
+                            continue
+                        batch = futures[future]
+                        vectors = future.result()
+                        # Solo el hilo principal escribe en SQLite
+                        self.checkpoint.put_many(
+                            (content_hash, vector) for (content_hash, _), vector in zip(batch, vectors)
+                        )
+                        for (content_hash, _), vector in zip(batch, vectors):
+                            found[content_hash] = np.asarray(vector, dtype=np.float32)
+                        done += len(batch)
+                        self._count('embedded', len(batch))
+                        print(f"   📊 Embebidos {done:,}/{len(pending):,} textos")
+
+            if error is not None:
+                print(f"   ❌ Embebido interrumpido: {done:,}/{len(pending):,} textos guardados en el checkpoint")
+                raise error
+
+        if not hashes:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.vstack([found[content_hash] for content_hash in hashes])
+
+    def build_faiss(self, documents: Iterable[Document], group_size: int = 5000, deduplicator=None):
+        """
+        Vectorstore FAISS con los documentos dados, embebidos por grupos de
+        group_size (acepta un generador, p. ej. iter_srt_documents, sin
+        materializar el corpus).
+
+        Con deduplicator (chunk_dedup.ChunkDeduplicator) solo se embeben los
+        chunks canónicos; los duplicados quedan como metadata['aliases'].
+        """
+        from langchain_community.vectorstores import FAISS
+        from document_store import assign_chunk_ids
+        from srt_parser_timestamps import iter_batches
+
+        keyed = ((str(uuid.uuid4()), doc) for doc in documents)
+        if deduplicator is not None:
+            keyed = deduplicator.deduplicate(keyed)
+
+        faiss_vs = None
+        for group in iter_batches(keyed, group_size):
+            ids = [key for key, _ in group]
+            texts = [doc.page_content for _, doc in group]
+            vectors = self.embed_texts(texts)
+            text_embeddings = list(zip(texts, vectors.tolist()))
+            metadatas = [doc.metadata for _, doc in group]
+            if faiss_vs is None:
+                faiss_vs = FAISS.from_embeddings(text_embeddings, self.embeddings, metadatas=metadatas, ids=ids)
+            else:
+                faiss_vs.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+
+        if faiss_vs is not None:
+            # FAISS copia la metadata al agregar: alias e ids enteros se escriben en su docstore
+            if deduplicator is not None:
+                deduplicator.apply_aliases(faiss_vs.docstore._dict)
+            assign_chunk_ids(faiss_vs.docstore._dict)
+        return faiss_vs
+
+
+def _parse_args(args: List[str]) -> Tuple[Optional[str], Dict[str, str]]:
+    options = {}
+    positional = []
+    i = 0
+    while i < len(args):
+        if args[i].startswith("--"):
+            # Opción sin valor (p. ej. --no-dedup): queda con ""
+            has_value = i + 1 < len(args) and not args[i + 1].startswith("--")
+            options[args[i][2:]] = args[i + 1] if has_value else ""
+            i += 2 if has_value else 1
+        else:
+            positional.append(args[i])
+            i += 1
+    return (positional[0] if positional else None), options
+
+
+if __name__ == "__main__":
+    import os
+    from chunk_dedup import ChunkDeduplicator
+    from faiss_mmap import convert_docstore
+    from srt_parser_timestamps import iter_srt_documents
+
+    data_path, options = _parse_args(sys.argv[1:])
+    data_path = data_path or "documentos_srt/"
+    out_dir = options.get('out', "faiss_index")
+
+    if 'fake-server' in options:
+        from fake_embedding_server import FakeServerEmbeddings
+        embeddings = FakeServerEmbeddings(options['fake-server'])
+        model_name = "fake-embedding-server"
+    else:
+        os.environ.setdefault('GOOGLE_APPLICATION_CREDENTIALS', 'credencial json/midyear-node-436821-t3-525a146e96a0.json')
+        from langchain_google_vertexai import VertexAIEmbeddings
+        embeddings = VertexAIEmbeddings(
+            model_name="text-multilingual-embedding-002",
+            project="midyear-node-436821-t3"
+        )
+        model_name = "text-multilingual-embedding-002"
+
+    builder = EmbeddingBuilder(
+        embeddings,
+        model_name=model_name,
+        checkpoint_path=options.get('checkpoint', DEFAULT_CHECKPOINT_PATH),
+        batch_size=int(options.get('batch-size', 100)),
+        concurrency=int(options.get('concurrency', 4)),
+        requests_per_minute=float(options['rpm']) if 'rpm' in options else None
+    )
+
+    print(f"🔨 Construyendo {out_dir} desde {data_path}...")
+    start = time.perf_counter()
+    deduplicator = None if 'no-dedup' in options else ChunkDeduplicator()
+    faiss_vs = builder.build_faiss(iter_srt_documents(data_path), deduplicator=deduplicator)
+    if faiss_vs is None:
+        print("❌ No se encontraron chunks para indexar")
+        sys.exit(1)
+    faiss_vs.save_local(out_dir)
+    convert_docstore(out_dir)
+    print(f"\n✅ {faiss_vs.index.ntotal:,} vectores guardados en {out_dir} "
+          f"en {time.perf_counter() - start:.1f}s")
+    print(f"   • Del checkpoint: {builder.stats['checkpoint_hits']:,}")
+    print(f"   • Embebidos ahora: {builder.stats['embedded']:,} ({builder.stats['requests']} peticiones, "
+          f"{builder.stats['retries']} reintentos)")
+    if deduplicator is not None:
+        print(f"   • Deduplicación: {deduplicator.report()}")
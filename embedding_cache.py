@@ -0,0 +1,191 @@
+"""
+Caché persistente de embeddings
+Envuelve el objeto de embeddings (Vertex AI o Google AI Studio) para que una
+misma consulta nunca se envíe dos veces a la API: primero busca en memoria (LRU),
+luego en disco (SQLite, sobrevive reinicios) y solo entonces llama al modelo.
+"""
+import hashlib
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional
+from langchain_core.embeddings import Embeddings
+
+
+def normalize_text(text: str) -> str:
+    """Normaliza el texto para la clave del caché: unicode NFKC y espacios colapsados"""
+    return " ".join(unicodedata.normalize('NFKC', text).split())
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings con caché en dos capas, con tamaño acotado:
+        - memoria: LRU de max_memory_entries vectores
+        - disco: SQLite con hasta max_disk_entries vectores (se desalojan los menos usados)
+
+    La clave es sha256(modelo + tipo + texto normalizado), así que cambiar de modelo
+    nunca reutiliza vectores de otro.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model_name: str,
+        path: Optional[str] = "cache/embeddings.sqlite3",
+        max_memory_entries: int = 2048,
+        max_disk_entries: int = 100_000
+    ):
+        """
+        Args:
+            embeddings: Objeto de embeddings real
+            model_name: Nombre del modelo (parte de la clave)
+            path: Archivo SQLite del caché en disco (None = solo memoria)
+            max_memory_entries: Máximo de vectores en memoria
+            max_disk_entries: Máximo de vectores en disco
+        """
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'api_calls': 0}
+
+        self._db = None
+        if path:
+            try:
+                Path(path).parent.mkdir(parents=True, exist_ok=True)
+                self._db = sqlite3.connect(path, check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS embeddings ("
+                    "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+                )
+                self._db.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON embeddings(last_used)")
+                self._db.commit()
+            except sqlite3.Error as e:
+                print(f"[WARNING] Caché de embeddings en disco no disponible: {e}")
+                self._db = None
+
+    def _key(self, text: str, kind: str) -> str:
+        # kind distingue consulta/documento: algunos modelos usan task types distintos
+        raw = f"{self.model_name}\0{kind}\0{normalize_text(text)}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _remember(self, key: str, vector: List[float]) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _get_many(self, keys: List[str]) -> dict:
+        """Vectores ya conocidos (memoria o disco) para las claves dadas"""
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key]
+                    self.stats['memory_hits'] += 1
+
+            missing = [key for key in keys if key not in found]
+            if self._db is not None and missing:
+                now = time.time()
+                for start in range(0, len(missing), 500):
+                    batch = missing[start:start + 500]
+                    placeholders = ",".join("?" * len(batch))
+                    rows = self._db.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                    ).fetchall()
+                    for key, blob in rows:
+                        vector = array('d', blob).tolist()
+                        found[key] = vector
+                        self._remember(key, vector)
+                        self.stats['disk_hits'] += 1
+                    if rows:
+                        self._db.executemany(
+                            "UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, key) for key, _ in rows]
+                        )
+                self._db.commit()
+        return found
+
+    def _put_many(self, items: dict) -> None:
+        with self._lock:
+            for key, vector in items.items():
+                self._remember(key, vector)
+            if self._db is None or not items:
+                return
+            now = time.time()
+            self._db.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                [(key, array('d', vector).tobytes(), now) for key, vector in items.items()]
+            )
+            # Mantener acotado el archivo: desalojar los vectores menos usados
+            (count,) = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+            if count > self.max_disk_entries:
+                self._db.execute(
+                    "DELETE FROM embeddings WHERE key IN ("
+                    "SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                    (count - self.max_disk_entries,)
+                )
+            self._db.commit()
+
+    def _lookup_documents(self, texts: List[str]):
+        """Claves, vectores ya conocidos y textos pendientes (no vistos, sin repetidos)"""
+        keys = [self._key(text, 'document') for text in texts]
+        found = self._get_many(list(dict.fromkeys(keys)))
+        pending = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in pending:
+                pending[key] = text
+        return keys, found, pending
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, found, pending = self._lookup_documents(texts)
+
+        # Solo se envían a la API los textos no vistos (sin repetidos)
+        if pending:
+            self.stats['api_calls'] += 1
+            vectors = self.embeddings.embed_documents(list(pending.values()))
+            computed = dict(zip(pending.keys(), vectors))
+            self._put_many(computed)
+            found.update(computed)
+
+        return [found[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self._key(text, 'query')
+        found = self._get_many([key])
+        if key in found:
+            return found[key]
+        self.stats['api_calls'] += 1
+        vector = self.embeddings.embed_query(text)
+        self._put_many({key: vector})
+        return vector
+
+    # Versiones asíncronas: la consulta al caché es local (memoria/SQLite) y solo la
+    # llamada a la API usa el cliente async del modelo, sin ocupar un hilo por petición
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, found, pending = self._lookup_documents(texts)
+        if pending:
+            self.stats['api_calls'] += 1
+            vectors = await self.embeddings.aembed_documents(list(pending.values()))
+            computed = dict(zip(pending.keys(), vectors))
+            self._put_many(computed)
+            found.update(computed)
+
+        return [found[key] for key in keys]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        key = self._key(text, 'query')
+        found = self._get_many([key])
+        if key in found:
+            return found[key]
+        self.stats['api_calls'] += 1
+        vector = await self.embeddings.aembed_query(text)
+        self._put_many({key: vector})
+        return vector
@@ -0,0 +1,36 @@
+"""
+Pools de hilos compartidos por el proceso
+Acotan cuántos hilos usa la búsqueda sin importar cuántas sesiones de Streamlit
+haya activas:
+    - cpu: scoring BM25 y fusión (NumPy libera el GIL en las operaciones grandes)
+    - io: rama FAISS síncrona (embedding remoto + búsqueda)
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+
+CPU_WORKERS = max(2, os.cpu_count() or 2)
+IO_WORKERS = 8
+
+_EXECUTORS: Dict[str, ThreadPoolExecutor] = {}
+_LOCK = threading.Lock()
+
+
+def _executor(name: str, max_workers: int) -> ThreadPoolExecutor:
+    with _LOCK:
+        executor = _EXECUTORS.get(name)
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"gerard-{name}")
+            _EXECUTORS[name] = executor
+        return executor
+
+
+def cpu_executor() -> ThreadPoolExecutor:
+    """Pool acotado para trabajo de CPU (scoring léxico)"""
+    return _executor("cpu", CPU_WORKERS)
+
+
+def io_executor() -> ThreadPoolExecutor:
+    """Pool acotado para llamadas bloqueantes de red"""
+    return _executor("io", IO_WORKERS)
@@ -0,0 +1,237 @@
+"""
+Carga del índice FAISS mapeado en memoria con docstore perezoso
+
+FAISS.load_local lee index.faiss completo en RAM y deserializa todo index.pkl
+(docstore + mapeo de filas) en cada worker. Este cargador:
+    - abre index.faiss con IO_FLAG_MMAP_IFC (los vectores quedan en el page cache
+      del sistema operativo, compartidos entre procesos)
+    - reemplaza el pickle por un docstore binario indexado por offsets, del que
+      cada documento se decodifica solo cuando FAISS lo devuelve
+
+Estructura de <faiss_index>/docstore/ (versión 1):
+    manifest.json          formato, versión, número de documentos y huella del index.pkl
+    texts.npy              blob UTF-8 con el texto de cada documento
+    text_offsets.npy       offsets de cada texto
+    metadata.npy           blob UTF-8 con la metadata (JSON)
+    metadata_offsets.npy   offsets de cada metadata
+    docstore_ids.npy       id de docstore de cada documento (bytes de ancho fijo)
+    sorted_ids.npy         docstore_ids ordenados (búsqueda binaria del mapeo inverso)
+    sorted_positions.npy   documento de cada entrada de sorted_ids
+    row_to_doc.npy         documento de cada fila del índice FAISS
+
+Los documentos siguen el orden del docstore original, igual que las filas del
+índice BM25, así que los ids enteros coinciden con los de DocumentStore.
+
+Uso (conversión única, también se hace sola en el primer arranque):
+    python faiss_mmap.py [faiss_index]
+"""
+import json
+import os
+import pickle
+import shutil
+import sys
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from bm25_store import BlobSequence, decode_metadata, decode_text, encode_metadata, pack_blobs
+from document_store import DocumentStore, StoreDocstore
+
+FORMAT_NAME = "gerard-faiss-docstore"
+FORMAT_VERSION = 1
+DOCSTORE_DIR = "docstore"
+
+_ARRAYS = [
+    'texts', 'text_offsets', 'metadata', 'metadata_offsets',
+    'docstore_ids', 'sorted_ids', 'sorted_positions', 'row_to_doc'
+]
+
+
+class SortedIdIndex(Mapping):
+    """Mapeo inverso id de docstore -> id entero por búsqueda binaria sobre arreglos mapeados"""
+
+    def __init__(self, sorted_ids: np.ndarray, sorted_positions: np.ndarray):
+        self._sorted_ids = sorted_ids
+        self._sorted_positions = sorted_positions
+
+    def __getitem__(self, docstore_id: str) -> int:
+        key = np.array(docstore_id.encode('utf-8'), dtype=self._sorted_ids.dtype)
+        i = int(np.searchsorted(self._sorted_ids, key))
+        if i < len(self._sorted_ids) and self._sorted_ids[i] == key:
+            return int(self._sorted_positions[i])
+        raise KeyError(docstore_id)
+
+    def __len__(self) -> int:
+        return len(self._sorted_ids)
+
+    def __iter__(self):
+        return (raw.decode('utf-8') for raw in self._sorted_ids)
+
+
+class RowIdMap(Mapping):
+    """index_to_docstore_id de FAISS, resuelto bajo demanda desde arreglos mapeados"""
+
+    def __init__(self, row_to_doc: np.ndarray, docstore_ids: np.ndarray):
+        self._row_to_doc = row_to_doc
+        self._docstore_ids = docstore_ids
+
+    def __getitem__(self, row: int) -> str:
+        row = int(row)
+        if not 0 <= row < len(self._row_to_doc):
+            raise KeyError(row)
+        return self._docstore_ids[self._row_to_doc[row]].decode('utf-8')
+
+    def __len__(self) -> int:
+        return len(self._row_to_doc)
+
+    def __iter__(self):
+        return iter(range(len(self._row_to_doc)))
+
+
+def _source_fingerprint(pkl_path: Path) -> dict:
+    stat = pkl_path.stat()
+    return {'source_size': stat.st_size, 'source_mtime': stat.st_mtime}
+
+
+def convert_docstore(folder: str = "faiss_index") -> Path:
+    """
+    Convierte index.pkl (docstore pickle de LangChain) al formato binario.
+    Se escribe en un directorio temporal y se reemplaza el destino al final.
+    """
+    base = Path(folder)
+    pkl_path = base / "index.pkl"
+    with open(pkl_path, 'rb') as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+
+    docstore_ids = list(docstore._dict.keys())
+    position = {docstore_id: i for i, docstore_id in enumerate(docstore_ids)}
+    docs = list(docstore._dict.values())
+
+    texts, text_offsets = pack_blobs([d.page_content.encode('utf-8') for d in docs])
+    metadata, metadata_offsets = pack_blobs([encode_metadata(d.metadata) for d in docs])
+    ids = np.array([docstore_id.encode('utf-8') for docstore_id in docstore_ids])
+    order = np.argsort(ids, kind='stable')
+    rows = len(index_to_docstore_id)
+    row_to_doc = np.array([position[index_to_docstore_id[row]] for row in range(rows)], dtype=np.int64)
+
+    arrays = {
+        'texts': texts,
+        'text_offsets': text_offsets,
+        'metadata': metadata,
+        'metadata_offsets': metadata_offsets,
+        'docstore_ids': ids,
+        'sorted_ids': ids[order],
+        'sorted_positions': order.astype(np.int64),
+        'row_to_doc': row_to_doc,
+    }
+
+    target = base / DOCSTORE_DIR
+    tmp = base / (DOCSTORE_DIR + ".tmp")
+    if tmp.exists():
+        shutil.rmtree(tmp)
+    tmp.mkdir(parents=True)
+    for name, array in arrays.items():
+        np.save(tmp / f"{name}.npy", array)
+
+    manifest = {
+        'format': FORMAT_NAME,
+        'version': FORMAT_VERSION,
+        'num_documents': len(docs),
+        'num_rows': rows,
+        **_source_fingerprint(pkl_path)
+    }
+    (tmp / "manifest.json").write_text(json.dumps(manifest, indent=2), encoding='utf-8')
+
+    if target.exists():
+        shutil.rmtree(target)
+    tmp.rename(target)
+    return target
+
+
+def _docstore_is_current(folder: Path) -> bool:
+    manifest_path = folder / DOCSTORE_DIR / "manifest.json"
+    if not manifest_path.exists():
+        return False
+    manifest = json.loads(manifest_path.read_text(encoding='utf-8'))
+    if manifest.get('format') != FORMAT_NAME or manifest.get('version') != FORMAT_VERSION:
+        return False
+    pkl_path = folder / "index.pkl"
+    # Sin index.pkl (solo se distribuye el formato binario) el docstore es la fuente
+    return not pkl_path.exists() or all(
+        manifest.get(key) == value for key, value in _source_fingerprint(pkl_path).items()
+    )
+
+
+def open_docstore(folder: str = "faiss_index"):
+    """
+    Abre el docstore binario (convirtiéndolo desde index.pkl si falta o está desactualizado).
+
+    Returns:
+        Tupla (DocumentStore, index_to_docstore_id perezoso)
+    """
+    base = Path(folder)
+    if not _docstore_is_current(base):
+        print(f"[INFO] Convirtiendo {base / 'index.pkl'} a docstore binario (una sola vez)...")
+        convert_docstore(folder)
+
+    path = base / DOCSTORE_DIR
+    arrays = {name: np.load(path / f"{name}.npy", mmap_mode='r') for name in _ARRAYS}
+    store = DocumentStore(
+        BlobSequence(arrays['texts'], arrays['text_offsets'], decode_text),
+        BlobSequence(arrays['metadata'], arrays['metadata_offsets'], decode_metadata),
+        id_index=SortedIdIndex(arrays['sorted_ids'], arrays['sorted_positions'])
+    )
+    return store, RowIdMap(arrays['row_to_doc'], arrays['docstore_ids'])
+
+
+def read_index_mmap(path: str):
+    """Lee un índice FAISS mapeado en memoria (con la mejor opción que admita su tipo)"""
+    import faiss
+    ifc = getattr(faiss, 'IO_FLAG_MMAP_IFC', 0)
+    attempts = [
+        ifc | faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY,  # vectores planos + listas invertidas
+        ifc | faiss.IO_FLAG_READ_ONLY,                       # IVF cuyas listas no admiten mmap
+    ]
+    for flags in attempts:
+        try:
+            return faiss.read_index(path, flags)
+        except RuntimeError:
+            continue
+    print(f"[WARNING] {path} no admite mmap, se carga completo en memoria")
+    return faiss.read_index(path)
+
+
+def load_faiss_mmap(embeddings, folder: str = "faiss_index", docstore_folder: Optional[str] = None):
+    """
+    Vectorstore FAISS con índice mapeado en memoria y docstore perezoso.
+
+    Args:
+        embeddings: Objeto de embeddings
+        folder: Directorio con index.faiss
+        docstore_folder: Directorio con index.pkl / docstore/ (por defecto, folder).
+            Las variantes comprimidas comparten el docstore del índice original.
+    """
+    from langchain_community.vectorstores import FAISS
+
+    index = read_index_mmap(os.path.join(folder, "index.faiss"))
+    store, index_to_docstore_id = open_docstore(docstore_folder or folder)
+    if len(index_to_docstore_id) != index.ntotal:
+        raise ValueError(
+            f"El docstore ({len(index_to_docstore_id)} filas) no corresponde al índice FAISS ({index.ntotal} vectores)"
+        )
+    return FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=StoreDocstore(store),
+        index_to_docstore_id=index_to_docstore_id
+    )
+
+
+if __name__ == "__main__":
+    folder = sys.argv[1] if len(sys.argv) > 1 else "faiss_index"
+    print(f"📥 Convirtiendo docstore de {folder}/index.pkl...")
+    target = convert_docstore(folder)
+    size_mb = sum(p.stat().st_size for p in target.iterdir()) / (1024 * 1024)
+    print(f"✅ Docstore binario guardado en {target} ({size_mb:.2f} MB)")
@@ -0,0 +1,279 @@
+"""
+Variantes comprimidas del índice FAISS
+
+A partir del índice exacto (faiss_index/index.faiss, IndexFlat) construye
+variantes cuantizadas o aproximadas que ocupan menos RAM y buscan más rápido:
+
+    sq8       Cuantización escalar de 8 bits (4x menos memoria, recall ~exacto)
+    hnsw      Grafo HNSW sobre vectores completos (búsqueda mucho más rápida)
+    hnsw_sq8  Grafo HNSW sobre vectores SQ8 (rápida y compacta)
+    ivfpq     Listas invertidas + product quantization (la más compacta)
+
+Cada variante se guarda en faiss_variants/<nombre>/ con el mismo index.pkl
+(docstore) que el índice original, más un manifest.json con sus parámetros de
+búsqueda (nprobe / efSearch) y el recall@k medido contra el índice exacto.
+
+Uso:
+    python faiss_variants.py [sq8 hnsw hnsw_sq8 ivfpq] [--nprobe 32] [--ef-search 512]
+"""
+import json
+import math
+import os
+import shutil
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+FORMAT_NAME = "gerard-faiss-variant"
+FORMAT_VERSION = 1
+DEFAULT_BASE_DIR = "faiss_index"
+DEFAULT_VARIANTS_DIR = "faiss_variants"
+RECALL_KS = (10, 100, 300, 400)
+VARIANTS = ("sq8", "hnsw", "hnsw_sq8", "ivfpq")
+
+# Parámetros de búsqueda por defecto (efSearch debe ser >= k para devolver k resultados)
+DEFAULT_NPROBE = 32
+DEFAULT_EF_SEARCH = 512
+
+
+def _factory_string(variant: str, dim: int, ntotal: int) -> str:
+    """Descripción de index_factory de cada variante"""
+    if variant == "sq8":
+        return "SQ8"
+    if variant == "hnsw":
+        return "HNSW32,Flat"
+    if variant == "hnsw_sq8":
+        return "HNSW32_SQ8"
+    if variant == "ivfpq":
+        # ~4*sqrt(N) listas, con al menos 39 vectores de entrenamiento por lista
+        nlist = max(1, min(int(4 * math.sqrt(ntotal)), ntotal // 39))
+        # Subcuantizadores de 8 dimensiones (768 -> 96 bytes por vector)
+        m = next(m for m in (dim // 8, dim // 4, dim // 2, dim) if m > 0 and dim % m == 0)
+        return f"IVF{nlist},PQ{m}x8"
+    raise ValueError(f"Variante FAISS desconocida: {variant}")
+
+
+def apply_search_params(index, nprobe: Optional[int] = None, ef_search: Optional[int] = None) -> None:
+    """Ajusta nprobe (IVF) y efSearch (HNSW) si el índice los admite"""
+    import faiss
+    params = faiss.ParameterSpace()
+    for name, value in (("nprobe", nprobe), ("efSearch", ef_search)):
+        if value is None:
+            continue
+        try:
+            params.set_index_parameter(index, name, value)
+        except RuntimeError:
+            pass  # El índice no tiene ese parámetro (p. ej. nprobe en HNSW)
+
+
+def _all_vectors(index) -> np.ndarray:
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def _search_ids(index, queries: np.ndarray, k: int) -> np.ndarray:
+    _, ids = index.search(queries, k)
+    return ids
+
+
+def measure_recall(exact_index, index, queries: np.ndarray, ks: Sequence[int] = RECALL_KS) -> Dict[str, float]:
+    """recall@k de index frente al índice exacto para cada k (promedio sobre las consultas)"""
+    ks = sorted({min(k, exact_index.ntotal) for k in ks})
+    k_max = ks[-1]
+    truth = _search_ids(exact_index, queries, k_max)
+    found = _search_ids(index, queries, k_max)
+
+    recall = {}
+    for k in ks:
+        hits = [
+            len(np.intersect1d(truth[i, :k], found[i, :k][found[i, :k] >= 0], assume_unique=True))
+            for i in range(len(queries))
+        ]
+        recall[str(k)] = float(np.mean(hits) / k)
+    return recall
+
+
+def build_variant(exact_index, variant: str, vectors: Optional[np.ndarray] = None, train_size: int = 100_000, seed: int = 0):
+    """
+    Construye una variante a partir del índice exacto (mismo orden de vectores,
+    así que el docstore y index_to_docstore_id del original siguen siendo válidos).
+    """
+    import faiss
+    if vectors is None:
+        vectors = _all_vectors(exact_index)
+    description = _factory_string(variant, exact_index.d, exact_index.ntotal)
+    index = faiss.index_factory(exact_index.d, description, exact_index.metric_type)
+
+    if not index.is_trained:
+        rng = np.random.default_rng(seed)
+        sample = vectors
+        if len(vectors) > train_size:
+            sample = vectors[np.sort(rng.choice(len(vectors), train_size, replace=False))]
+        index.train(sample)
+    index.add(vectors)
+    return index, description
+
+
+def build_variants(
+    base_dir: str = DEFAULT_BASE_DIR,
+    out_dir: str = DEFAULT_VARIANTS_DIR,
+    variants: Sequence[str] = VARIANTS,
+    nprobe: int = DEFAULT_NPROBE,
+    ef_search: int = DEFAULT_EF_SEARCH,
+    n_queries: int = 200,
+    seed: int = 0
+) -> List[dict]:
+    """
+    Construye las variantes pedidas, mide su recall@k y las guarda con su manifest.
+
+    Las consultas de evaluación son vectores del propio corpus elegidos al azar
+    (la distribución de preguntas reales es parecida a la de los fragmentos).
+
+    Returns:
+        Lista de manifests generados
+    """
+    import faiss
+    base = Path(base_dir)
+    exact_index = faiss.read_index(str(base / "index.faiss"))
+    vectors = _all_vectors(exact_index)
+    rng = np.random.default_rng(seed)
+    queries = vectors[rng.choice(len(vectors), min(n_queries, len(vectors)), replace=False)]
+    flat_size = (base / "index.faiss").stat().st_size
+
+    manifests = []
+    for variant in variants:
+        print(f"🔨 Construyendo variante {variant}...")
+        build_start = time.perf_counter()
+        index, description = build_variant(exact_index, variant, vectors=vectors, seed=seed)
+        build_seconds = time.perf_counter() - build_start
+        apply_search_params(index, nprobe=nprobe, ef_search=ef_search)
+
+        recall = measure_recall(exact_index, index, queries)
+        search_start = time.perf_counter()
+        index.search(queries, min(300, index.ntotal))
+        search_ms = (time.perf_counter() - search_start) * 1000 / len(queries)
+
+        # Escribir en un directorio temporal y reemplazar al final (nunca queda a medias)
+        target = Path(out_dir) / variant
+        tmp = Path(out_dir) / f".{variant}.tmp"
+        if tmp.exists():
+            shutil.rmtree(tmp)
+        tmp.mkdir(parents=True)
+        faiss.write_index(index, str(tmp / "index.faiss"))
+        shutil.copy2(base / "index.pkl", tmp / "index.pkl")
+
+        manifest = {
+            'format': FORMAT_NAME,
+            'version': FORMAT_VERSION,
+            'variant': variant,
+            'factory': description,
+            'metric': int(exact_index.metric_type),
+            'dim': int(exact_index.d),
+            'ntotal': int(index.ntotal),
+            'search_params': {'nprobe': nprobe, 'efSearch': ef_search},
+            'recall': recall,
+            'recall_queries': len(queries),
+            'search_ms_per_query_k300': round(search_ms, 3),
+            'size_mb': round((tmp / "index.faiss").stat().st_size / (1024 * 1024), 2),
+            'flat_size_mb': round(flat_size / (1024 * 1024), 2),
+            'build_seconds': round(build_seconds, 1),
+            'created': datetime.now().isoformat(timespec='seconds')
+        }
+        with open(tmp / "manifest.json", 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+
+        if target.exists():
+            shutil.rmtree(target)
+        os.replace(tmp, target)
+        manifests.append(manifest)
+
+        recall_text = ", ".join(f"@{k}={v:.3f}" for k, v in recall.items())
+        print(f"✅ {variant}: {manifest['size_mb']} MB (exacto: {manifest['flat_size_mb']} MB), "
+              f"recall {recall_text}, {manifest['search_ms_per_query_k300']} ms/consulta")
+    return manifests
+
+
+def read_variant_manifest(path: str) -> Optional[dict]:
+    """Manifest de una variante, o None si no existe"""
+    manifest_path = Path(path) / "manifest.json"
+    if not manifest_path.exists():
+        return None
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get('format') != FORMAT_NAME or manifest.get('version') != FORMAT_VERSION:
+        raise ValueError(f"Formato de variante FAISS no soportado en {path}")
+    return manifest
+
+
+def load_faiss_variant(
+    embeddings,
+    variant: str = "flat",
+    base_dir: str = DEFAULT_BASE_DIR,
+    variants_dir: str = DEFAULT_VARIANTS_DIR,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+    mmap: bool = False
+):
+    """
+    Carga el vectorstore FAISS de la variante configurada.
+
+    'flat' (o una variante que no existe en disco) carga el índice exacto original.
+    nprobe / ef_search reemplazan los parámetros de búsqueda guardados en el manifest.
+    Con mmap=True el índice se mapea en memoria y el docstore (compartido por todas
+    las variantes) se lee bajo demanda (ver faiss_mmap.py).
+    """
+    from langchain_community.vectorstores import FAISS
+
+    folder = base_dir
+    manifest = None
+    if variant != "flat":
+        candidate = os.path.join(variants_dir, variant)
+        manifest = read_variant_manifest(candidate)
+        if manifest is None:
+            print(f"[WARNING] Variante FAISS '{variant}' no encontrada en {variants_dir}/, usando índice exacto")
+        else:
+            folder = candidate
+
+    if mmap:
+        from faiss_mmap import load_faiss_mmap
+        faiss_vs = load_faiss_mmap(embeddings, folder=folder, docstore_folder=base_dir)
+    else:
+        faiss_vs = FAISS.load_local(
+            folder_path=folder,
+            embeddings=embeddings,
+            allow_dangerous_deserialization=True
+        )
+
+    if manifest is not None:
+        params = manifest.get('search_params', {})
+        apply_search_params(
+            faiss_vs.index,
+            nprobe=nprobe if nprobe is not None else params.get('nprobe'),
+            ef_search=ef_search if ef_search is not None else params.get('efSearch')
+        )
+        recall = manifest.get('recall', {})
+        print(f"[INFO] Índice FAISS '{variant}' ({manifest['factory']}), recall@300={recall.get('300', 'N/A')}")
+    return faiss_vs
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    options = {'--nprobe': DEFAULT_NPROBE, '--ef-search': DEFAULT_EF_SEARCH}
+    names = []
+    i = 0
+    while i < len(args):
+        if args[i] in options:
+            options[args[i]] = int(args[i + 1])
+            i += 2
+        else:
+            names.append(args[i])
+            i += 1
+
+    build_variants(
+        variants=names or VARIANTS,
+        nprobe=options['--nprobe'],
+        ef_search=options['--ef-search']
+    )
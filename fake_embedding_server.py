@@ -0,0 +1,164 @@
+"""
+Servidor de embeddings falso para probar embedding_builder.py sin tocar la API
+
+Devuelve vectores deterministas (derivados del sha256 del texto) y puede simular
+los problemas de la API real: latencia, cuota por segundo (HTTP 429 con
+Retry-After) y errores transitorios (HTTP 503).
+
+Uso:
+    python fake_embedding_server.py [--port 8765] [--dim 768] [--rps 5] [--fail-rate 0.1] [--latency 0.2]
+    python embedding_builder.py documentos_srt/ --fake-server http://127.0.0.1:8765 --out /tmp/faiss_prueba
+"""
+import hashlib
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+
+import numpy as np
+import requests
+from langchain_core.embeddings import Embeddings
+
+
+def fake_vector(text: str, dim: int = 768) -> List[float]:
+    """Vector unitario determinista para un texto"""
+    seed = int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'little')
+    vector = np.random.default_rng(seed).standard_normal(dim)
+    return (vector / np.linalg.norm(vector)).astype(np.float32).tolist()
+
+
+class FakeEmbeddingServer:
+    """Servidor HTTP (POST /embed {"texts": [...]}) que corre en un hilo de fondo"""
+
+    def __init__(
+        self,
+        port: int = 0,
+        dim: int = 768,
+        requests_per_second: Optional[float] = None,
+        fail_rate: float = 0.0,
+        latency: float = 0.0,
+        seed: int = 0
+    ):
+        self.dim = dim
+        self.requests_per_second = requests_per_second
+        self.fail_rate = fail_rate
+        self.latency = latency
+        self.stats = {'requests': 0, 'texts': 0, 'rate_limited': 0, 'failed': 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._window_start = time.monotonic()
+        self._window_count = 0
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                payload = json.loads(self.rfile.read(length) or b'{}')
+                status, body, headers = server._handle(payload.get('texts', []))
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                data = json.dumps(body).encode('utf-8')
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handle(self, texts: List[str]):
+        with self._lock:
+            self.stats['requests'] += 1
+            now = time.monotonic()
+            if now - self._window_start >= 1.0:
+                self._window_start = now
+                self._window_count = 0
+            self._window_count += 1
+            if self.requests_per_second is not None and self._window_count > self.requests_per_second:
+                self.stats['rate_limited'] += 1
+                retry_after = max(0.0, 1.0 - (now - self._window_start))
+                return 429, {'error': 'quota exceeded'}, {'Retry-After': f"{retry_after:.3f}"}
+            if self._random.random() < self.fail_rate:
+                self.stats['failed'] += 1
+                return 503, {'error': 'unavailable'}, {}
+
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.stats['texts'] += len(texts)
+        return 200, {'embeddings': [fake_vector(text, self.dim) for text in texts]}, {}
+
+    def start(self) -> "FakeEmbeddingServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> "FakeEmbeddingServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+class EmbeddingServerError(RuntimeError):
+    """Error HTTP del servidor; retry_after (segundos) si vino en la respuesta"""
+
+    def __init__(self, status: int, retry_after: Optional[float] = None):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+        self.retry_after = retry_after
+
+
+class FakeServerEmbeddings(Embeddings):
+    """Cliente LangChain del servidor falso"""
+
+    def __init__(self, url: str, timeout: float = 30.0):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        self._session = requests.Session()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        response = self._session.post(f"{self.url}/embed", json={'texts': texts}, timeout=self.timeout)
+        if response.status_code != 200:
+            retry_after = response.headers.get('Retry-After')
+            raise EmbeddingServerError(response.status_code, float(retry_after) if retry_after else None)
+        return response.json()['embeddings']
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    options = {args[i][2:]: args[i + 1] for i in range(0, len(args) - 1, 2) if args[i].startswith("--")}
+    server = FakeEmbeddingServer(
+        port=int(options.get('port', 8765)),
+        dim=int(options.get('dim', 768)),
+        requests_per_second=float(options['rps']) if 'rps' in options else None,
+        fail_rate=float(options.get('fail-rate', 0.0)),
+        latency=float(options.get('latency', 0.0))
+    )
+    print(f"🧪 Servidor de embeddings falso en {server.url} (Ctrl+C para salir)")
+    server.start()
+    try:
+        while True:
+            time.sleep(5)
+            print(f"   {server.stats}")
+    except KeyboardInterrupt:
+        server.stop()
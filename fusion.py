@@ -0,0 +1,113 @@
+"""
+Fusión de rankings para la búsqueda híbrida (FAISS + BM25)
+
+Cada rama entrega sus candidatos como arreglos de ids enteros (metadata
+'chunk_id') en orden de ranking y, opcionalmente, sus scores. La fusión es un
+kernel NumPy: las contribuciones de todas las ramas se acumulan por id con
+np.bincount, sin diccionarios ni comparación de textos.
+
+Estrategias:
+    - rrf: Reciprocal Rank Fusion, peso / (rrf_k + rank); solo usa el orden
+    - combsum: suma de los scores normalizados de cada rama (sin pesos)
+    - combmnz: combsum multiplicado por el número de ramas que devolvieron el documento
+    - convex: combinación convexa alpha * s_faiss + (1 - alpha) * s_bm25 de los
+      scores normalizados
+
+Normalizaciones de scores (combsum, combmnz, convex):
+    - minmax: (s - min) / (max - min), en [0, 1]
+    - zscore: (s - media) / desviación
+    - rank: (n - rank) / n, ignora los scores (útil si las escalas no son comparables)
+"""
+from dataclasses import dataclass
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+FUSION_METHODS = ('rrf', 'combsum', 'combmnz', 'convex')
+NORMALIZATIONS = ('minmax', 'zscore', 'rank')
+
+
+@dataclass(frozen=True)
+class FusionConfig:
+    """
+    Estrategia y parámetros de fusión de un retriever (inmutable: sirve como
+    parte de la clave del registro de retrievers).
+    """
+    method: str = 'rrf'
+    rrf_k: int = 60
+    normalization: str = 'minmax'
+    name_query_alpha: float = 0.05  # Peso de FAISS para consultas con nombres propios (más peso a BM25)
+
+    def __post_init__(self):
+        if self.method not in FUSION_METHODS:
+            raise ValueError(f"Método de fusión desconocido: {self.method} (opciones: {', '.join(FUSION_METHODS)})")
+        if self.normalization not in NORMALIZATIONS:
+            raise ValueError(f"Normalización desconocida: {self.normalization} (opciones: {', '.join(NORMALIZATIONS)})")
+
+    @property
+    def uses_scores(self) -> bool:
+        """Si la estrategia necesita los scores de las ramas (RRF solo usa el orden)"""
+        return self.method != 'rrf' and self.normalization != 'rank'
+
+
+def rank_scores(n: int) -> np.ndarray:
+    """Scores derivados del ranking: (n - rank) / n"""
+    return (n - np.arange(n, dtype=np.float64)) / max(n, 1)
+
+
+def normalize_scores(scores: np.ndarray, normalization: str = 'minmax') -> np.ndarray:
+    """Normaliza los scores de una rama (mayor = más relevante)"""
+    scores = np.asarray(scores, dtype=np.float64)
+    if normalization == 'rank' or len(scores) == 0:
+        return rank_scores(len(scores))
+    if normalization == 'zscore':
+        std = scores.std()
+        return (scores - scores.mean()) / std if std > 0 else np.zeros_like(scores)
+    low, high = scores.min(), scores.max()
+    return (scores - low) / (high - low) if high > low else np.ones_like(scores)
+
+
+def fuse_ranked_lists(
+    ids: Sequence[np.ndarray],
+    weights: Sequence[float],
+    config: FusionConfig,
+    scores: Optional[Sequence[Optional[np.ndarray]]] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Fusiona varias listas rankeadas.
+
+    Args:
+        ids: Ids enteros de cada rama, en orden de ranking
+        weights: Peso de cada rama (rrf y convex; combsum y combmnz no usan pesos)
+        config: Estrategia de fusión
+        scores: Scores de cada rama alineados con ids (mayor = mejor); una rama
+            sin scores (None) usa scores derivados de su ranking
+
+    Returns:
+        Tupla (posiciones, scores fusionados) ordenada por score descendente. Las
+        posiciones indexan la concatenación de las ramas y apuntan a la primera
+        aparición de cada id; los empates se resuelven por orden de aparición.
+    """
+    if not sum(len(leg) for leg in ids):
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+
+    if config.method == 'rrf':
+        contributions = [np.full(len(leg), weight) / (np.arange(len(leg)) + config.rrf_k)
+                         for leg, weight in zip(ids, weights)]
+    else:
+        contributions = []
+        for i, leg in enumerate(ids):
+            leg_scores = scores[i] if scores is not None else None
+            if leg_scores is None or not config.uses_scores:
+                normalized = rank_scores(len(leg))
+            else:
+                normalized = normalize_scores(leg_scores[:len(leg)], config.normalization)
+            contributions.append(normalized * (weights[i] if config.method == 'convex' else 1.0))
+
+    _, first, inverse = np.unique(np.concatenate(ids), return_index=True, return_inverse=True)
+    fused = np.bincount(inverse, weights=np.concatenate(contributions), minlength=len(first))
+    if config.method == 'combmnz':
+        fused *= np.bincount(inverse, minlength=len(first))
+
+    order = np.lexsort((first, -fused))
+    return first[order], fused[order]
@@ -1,13 +1,23 @@
 """
 Retriever híbrido que combina búsqueda semántica (FAISS) y léxica (BM25)
 """
-import pickle
+import asyncio
+import os
 import re
+import time
 import numpy as np
-from typing import List
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 from langchain_core.documents import Document
 from langchain_core.retrievers import BaseRetriever
-from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from bm25_store import load_bm25_data, find_bm25_index
+from document_store import CHUNK_ID_KEY, DocumentStore, chunk_ids
+from fusion import FusionConfig, fuse_ranked_lists
+from query_intent import GUARDIAN_MASTERS, QueryIntent, analyze_query
+from bm25_engine import InvertedBM25Index, ensure_inverted_index
+from topk_utils import select_top_k
+from executors import cpu_executor, io_executor
 
 
 def tokenize_clean(text: str) -> List[str]:
@@ -27,174 +37,286 @@ class HybridRetriever(BaseRetriever):
     - Búsqueda semántica (FAISS con embeddings)
     - Búsqueda léxica (BM25)
     
-    Fusiona resultados usando Reciprocal Rank Fusion (RRF)
+    Fusiona resultados con la estrategia configurada (fusion.py; por defecto
+    Reciprocal Rank Fusion)
     """
     
     faiss_retriever: any
     bm25_index: any
-    bm25_docs: List[str]
-    bm25_metadatas: List[dict]
+    bm25_docs: Any  # Secuencia de textos (lista o BlobSequence mapeada en memoria)
+    bm25_metadatas: Any
     k: int = 10
     alpha: float = 0.7  # Peso para FAISS (0.7 = 70% semántica, 30% léxica)
+    fusion: Any = FusionConfig()  # Estrategia de fusión (FusionConfig)
+    parallel: bool = True  # Ejecutar FAISS en paralelo con BM25
+    faiss_timeout: Optional[float] = None  # Presupuesto (s) para FAISS; si lo excede se usa solo BM25
+    last_timings: Optional[Dict[str, Any]] = None  # Tiempos por rama de la última búsqueda
     
-    def __init__(self, faiss_retriever, bm25_path: str = "bm25_index.pkl", k: int = 10, alpha: float = 0.7):
+    def __init__(
+        self,
+        faiss_retriever,
+        bm25_path: Optional[str] = None,
+        k: int = 10,
+        alpha: float = 0.7,
+        bm25_data: Optional[dict] = None,
+        fusion: Optional[FusionConfig] = None
+    ):
         """
         Args:
             faiss_retriever: Retriever de FAISS
-            bm25_path: Ruta al índice BM25
+            bm25_path: Ruta al índice BM25 (directorio binario o pickle heredado);
+                por defecto bm25_index/ si existe, si no bm25_index.pkl
             k: Número de documentos a retornar
             alpha: Peso para resultados FAISS (0-1)
+            bm25_data: Índice ya cargado ({'bm25', 'docs', 'metadatas'}); si se omite se lee bm25_path
+            fusion: Estrategia de fusión (por defecto RRF con k=60)
         """
-        # Cargar índice BM25
-        with open(bm25_path, 'rb') as f:
-            bm25_data = pickle.load(f)
+        # Cargar índice BM25 (mapeado en memoria si está en formato binario)
+        if bm25_data is None:
+            bm25_data = load_bm25_data(bm25_path or find_bm25_index())
         
         super().__init__(
             faiss_retriever=faiss_retriever,
-            bm25_index=bm25_data['bm25'],
+            bm25_index=ensure_inverted_index(bm25_data['bm25']),
             bm25_docs=bm25_data['docs'],
             bm25_metadatas=bm25_data['metadatas'],
             k=k,
-            alpha=alpha
+            alpha=alpha,
+            fusion=fusion or FusionConfig()
         )
     
-    def _get_relevant_documents(
-        self, query: str, *, run_manager: CallbackManagerForRetrieverRun = None
-    ) -> List[Document]:
-        """Obtiene documentos combinando FAISS y BM25"""
-        
-        # Detectar términos que sugieren búsqueda exacta (nombres, apellidos, lugares)
-        # Palabras capitalizadas O palabras comunes de nombres propios
-        query_words = query.split()
-        has_proper_nouns = any(word[0].isupper() for word in query_words if len(word) > 2)
-        
-        # Lista completa de nombres de maestros y términos relacionados
-        proper_noun_keywords = [
-            'maria', 'magdalena', 'jesus', 'cristo', 'jose', 'juan', 'pedro', 'pablo',
-            'azoes', 'azen', 'aviatar', 'alaniso', 'alan', 'axel', 'adiestro', 'adiel', 'aladim',
-            'aliestro', 'trey', 'totero', 'ra',
-            'thor', 'arcangel', 'maestro', 'maestros', 'guardianes', 'guardian',
-            'nombre', 'nombres', 'quien', 'quienes'
-        ]
-        has_name_keywords = any(word.lower() in proper_noun_keywords for word in query_words)
-        
-        # Detectar preguntas sobre nombres/identidades
-        query_lower = query.lower()
-        asks_for_names = any(pattern in query_lower for pattern in [
-            'nombre', 'nombres', 'quien', 'quienes', 'guardianes', 'maestros'
-        ])
-        
-        use_bm25_only = has_proper_nouns or has_name_keywords or asks_for_names
-        
-        # 1. Búsqueda léxica (BM25) con tokenización mejorada
+    @classmethod
+    def build(
+        cls,
+        faiss_retriever,
+        bm25_path: Optional[str] = None,
+        documents: Optional[Sequence[Document]] = None,
+        k: int = 10,
+        alpha: float = 0.7,
+        fusion: Optional[FusionConfig] = None
+    ) -> "HybridRetriever":
+        """
+        Crea el retriever desde el índice en disco o, si no existe, indexando en memoria
+        los documentos recibidos (p. ej. el docstore de FAISS en Streamlit Cloud).
+        """
+        bm25_path = bm25_path or find_bm25_index()
+        if os.path.exists(bm25_path) or not documents:
+            return cls(faiss_retriever, bm25_path=bm25_path, k=k, alpha=alpha, fusion=fusion)
+        
+        if isinstance(documents, DocumentStore):
+            # Reutilizar textos y metadata del almacén compartido (sin copiar el corpus)
+            texts, metadatas = documents.texts, documents.metadatas
+        else:
+            texts = [d.page_content for d in documents]
+            metadatas = [d.metadata for d in documents]
+        
+        bm25_data = {
+            'bm25': InvertedBM25Index.from_tokenized([tokenize_clean(text) for text in texts]),
+            'docs': texts,
+            'metadatas': metadatas
+        }
+        return cls(faiss_retriever, k=k, alpha=alpha, bm25_data=bm25_data, fusion=fusion)
+    
+    def _bm25_leg(self, query: str, intent: QueryIntent) -> Tuple[List[Document], np.ndarray]:
+        """Rama léxica (BM25) con tokenización mejorada: retorna (documentos, scores)"""
         query_tokens = tokenize_clean(query)
-        bm25_scores = self.bm25_index.get_scores(query_tokens)
         
         # ESTRATEGIA ESPECIAL: Si pregunta por "guardianes" o "maestros", buscar TODOS los nombres
-        if asks_for_names and ('guardianes' in query_lower or 'maestros' in query_lower):
-            # Lista de los 9 maestros guardianes
-            maestros_guardianes = ['alaniso', 'axel', 'alan', 'azen', 'aviatar', 'aladim', 'adiel', 'azoes', 'aliestro']
-            
-            # Buscar documentos que mencionen cualquier maestro
-            all_maestro_indices = set()
-            for maestro in maestros_guardianes:
-                maestro_tokens = tokenize_clean(maestro)
-                maestro_scores = self.bm25_index.get_scores(maestro_tokens)
-                # Top 30 para cada maestro (capturar todos sus menciones)
-                maestro_indices = np.argsort(maestro_scores)[::-1][:30]
-                for idx in maestro_indices:
-                    if maestro_scores[idx] > 0:
-                        all_maestro_indices.add(idx)
+        if intent.asks_for_names and intent.asks_for_guardians:
+            # Buscar documentos que mencionen cualquiera de los 9 maestros: un solo scoring por lotes
+            # (una columna por maestro) y unión del top 30 de cada uno (capturar todas sus menciones)
+            all_maestro_indices = self.bm25_index.top_k_union(
+                [tokenize_clean(maestro) for maestro in GUARDIAN_MASTERS], 30
+            )
             
             # Combinar con búsqueda original
-            top_bm25_indices = np.argsort(bm25_scores)[::-1][:self.k * 2]
-            combined_indices = list(all_maestro_indices.union(set(top_bm25_indices)))
+            top_bm25_indices, _ = self.bm25_index.top_k(query_tokens, self.k * 2)
+            combined_indices = np.union1d(all_maestro_indices, top_bm25_indices)
             
-            # Ordenar por score original
-            combined_indices.sort(key=lambda idx: bm25_scores[idx], reverse=True)
-            top_bm25_indices = combined_indices[:self.k * 4]  # Más documentos para cubrir todos
+            # Ordenar por score original (solo scores positivos)
+            combined_scores = self.bm25_index.score_documents(query_tokens, combined_indices)
+            top_bm25_indices, top_bm25_scores = select_top_k(combined_scores, self.k * 4, ids=combined_indices)  # Más documentos para cubrir todos
         else:
             # Obtener top-k de BM25 (más documentos si busca nombres)
-            multiplier = 4 if use_bm25_only else 2
-            top_bm25_indices = np.argsort(bm25_scores)[::-1][:self.k * multiplier]
+            multiplier = 4 if intent.use_bm25_only else 2
+            top_bm25_indices, top_bm25_scores = self.bm25_index.top_k(query_tokens, self.k * multiplier)
         
         bm25_docs = []
         for idx in top_bm25_indices:
-            if bm25_scores[idx] > 0:
-                doc = Document(
-                    page_content=self.bm25_docs[idx],
-                    metadata=self.bm25_metadatas[idx]
-                )
-                bm25_docs.append(doc)
+            # La fila BM25 es el id entero del chunk (mismo orden que el docstore de FAISS)
+            metadata = dict(self.bm25_metadatas[idx])
+            metadata[CHUNK_ID_KEY] = int(idx)
+            doc = Document(
+                page_content=self.bm25_docs[idx],
+                metadata=metadata
+            )
+            bm25_docs.append(doc)
+        return bm25_docs, top_bm25_scores
+    
+    def _timed_bm25_leg(self, query: str, intent: QueryIntent):
+        """Rama léxica: retorna (documentos, scores, segundos)"""
+        leg_start = time.perf_counter()
+        docs, scores = self._bm25_leg(query, intent)
+        return docs, scores, time.perf_counter() - leg_start
+    
+    def _faiss_leg(self, query: str):
+        """Rama semántica: retorna (documentos, scores, segundos); scores None si la fusión no los usa"""
+        leg_start = time.perf_counter()
+        if not self.fusion.uses_scores:
+            docs = self.faiss_retriever.invoke(query)
+            return docs, None, time.perf_counter() - leg_start
+        pairs = self.faiss_retriever.vectorstore.similarity_search_with_relevance_scores(
+            query, k=self.faiss_retriever.search_kwargs.get('k', 4)
+        )
+        docs = [doc for doc, _ in pairs]
+        scores = np.array([score for _, score in pairs], dtype=np.float64)
+        return docs, scores, time.perf_counter() - leg_start
+    
+    async def _afaiss_leg(self, query: str):
+        """Rama semántica asíncrona (embedding con cliente async): retorna (documentos, scores, segundos)"""
+        leg_start = time.perf_counter()
+        if not self.fusion.uses_scores:
+            docs = await self.faiss_retriever.ainvoke(query)
+            return docs, None, time.perf_counter() - leg_start
+        pairs = await self.faiss_retriever.vectorstore.asimilarity_search_with_relevance_scores(
+            query, k=self.faiss_retriever.search_kwargs.get('k', 4)
+        )
+        docs = [doc for doc, _ in pairs]
+        scores = np.array([score for _, score in pairs], dtype=np.float64)
+        return docs, scores, time.perf_counter() - leg_start
+    
+    def _remaining_budget(self, start: float) -> Optional[float]:
+        if self.faiss_timeout is None:
+            return None
+        return max(0.0, self.faiss_timeout - (time.perf_counter() - start))
+    
+    def _fuse(
+        self,
+        faiss_docs: List[Document],
+        faiss_scores: Optional[np.ndarray],
+        bm25_docs: List[Document],
+        bm25_scores: Optional[np.ndarray],
+        intent: QueryIntent
+    ) -> List[Document]:
+        """Fusiona ambas ramas con la estrategia configurada (kernel NumPy sobre ids enteros)"""
+        # Alpha más bajo para nombres propios (más peso a BM25)
+        effective_alpha = self.fusion.name_query_alpha if intent.use_bm25_only else self.alpha
+        
+        faiss_docs = faiss_docs[:self.k * 2]
+        bm25_docs = bm25_docs[:self.k * 2]
+        positions, _ = fuse_ranked_lists(
+            [chunk_ids(faiss_docs), chunk_ids(bm25_docs)],
+            [effective_alpha, 1 - effective_alpha],
+            self.fusion,
+            scores=[faiss_scores, bm25_scores]
+        )
+        docs = faiss_docs + bm25_docs
+        return [docs[i] for i in positions[:self.k]]
+    
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun = None,
+        intent: Optional[QueryIntent] = None
+    ) -> List[Document]:
+        """
+        Obtiene documentos combinando FAISS y BM25.
+        intent: análisis ya hecho de la consulta (retriever.invoke(query, intent=...)); si falta se calcula
+        """
+        start = time.perf_counter()
+        timings = {'bm25': None, 'faiss': None, 'faiss_status': 'skipped', 'total': None}
+        self.last_timings = timings
+        intent = intent or analyze_query(query)
+        
+        # La rama FAISS (embedding remoto + búsqueda) arranca antes que BM25 para solapar
+        # la latencia de red con el scoring léxico. Con nombres propios normalmente basta
+        # BM25, así que FAISS solo se lanza después y si hace falta.
+        faiss_future = None
+        if self.parallel and not intent.use_bm25_only:
+            faiss_future = io_executor().submit(self._faiss_leg, query)
+        
+        # 1. Búsqueda léxica (BM25)
+        bm25_docs, bm25_scores, timings['bm25'] = self._timed_bm25_leg(query, intent)
         
         # Si detectamos nombres propios Y BM25 encontró resultados, usar SOLO BM25
-        if use_bm25_only and len(bm25_docs) >= self.k // 2:
+        if intent.use_bm25_only and len(bm25_docs) >= self.k // 2:
+            timings['total'] = time.perf_counter() - start
             return bm25_docs[:self.k]
         
         # 2. Búsqueda semántica (FAISS) - Solo si no hay nombres o BM25 no encontró suficiente
         try:
-            faiss_docs = self.faiss_retriever.invoke(query)
+            if faiss_future is None and not self.parallel:
+                # Modo secuencial (comportamiento original, sin presupuesto)
+                faiss_docs, faiss_scores, timings['faiss'] = self._faiss_leg(query)
+            else:
+                if faiss_future is None:
+                    faiss_future = io_executor().submit(self._faiss_leg, query)
+                faiss_docs, faiss_scores, timings['faiss'] = faiss_future.result(timeout=self._remaining_budget(start))
+            timings['faiss_status'] = 'ok'
+        except FutureTimeoutError:
+            # FAISS no llegó a tiempo: responder solo con BM25 (la llamada termina en segundo plano)
+            print(f"[WARNING] ⏱️ FAISS excedió el presupuesto de {self.faiss_timeout:.1f}s, usando solo BM25")
+            timings['faiss_status'] = 'timeout'
+            timings['total'] = time.perf_counter() - start
+            return bm25_docs[:self.k]
         except Exception as e:
             # Si FAISS falla, usar solo BM25
+            timings['faiss_status'] = 'error'
+            timings['total'] = time.perf_counter() - start
             return bm25_docs[:self.k]
         
-        # 3. Fusionar resultados usando Reciprocal Rank Fusion (RRF)
-        # Alpha más bajo para nombres propios (más peso a BM25)
-        effective_alpha = 0.05 if use_bm25_only else self.alpha
-        
-        merged_docs = self._reciprocal_rank_fusion(
-            faiss_docs[:self.k * 2],
-            bm25_docs[:self.k * 2],
-            effective_alpha
-        )
-        
-        return merged_docs[:self.k]
+        # 3. Fusionar resultados (RRF u otra estrategia configurada)
+        merged_docs = self._fuse(faiss_docs, faiss_scores, bm25_docs, bm25_scores, intent)
+        timings['total'] = time.perf_counter() - start
+        return merged_docs
     
-    def _reciprocal_rank_fusion(
-        self,
-        faiss_docs: List[Document],
-        bm25_docs: List[Document],
-        alpha: float
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun = None,
+        intent: Optional[QueryIntent] = None
     ) -> List[Document]:
         """
-        Fusiona resultados usando Reciprocal Rank Fusion
-        
-        Score = alpha * (1/(rank_faiss + 60)) + (1-alpha) * (1/(rank_bm25 + 60))
+        Versión asíncrona: el embedding de FAISS usa el cliente async (sin bloquear
+        un hilo durante la llamada de red) y el scoring BM25 va al pool acotado de CPU.
         """
-        # Crear diccionario de scores
-        doc_scores = {}
-        
-        # Scores de FAISS
-        for rank, doc in enumerate(faiss_docs):
-            key = doc.page_content[:100]  # Usar primeros 100 chars como key
-            doc_scores[key] = {
-                'doc': doc,
-                'faiss_rank': rank,
-                'bm25_rank': None,
-                'score': 0
-            }
-        
-        # Scores de BM25
-        for rank, doc in enumerate(bm25_docs):
-            key = doc.page_content[:100]
-            if key in doc_scores:
-                doc_scores[key]['bm25_rank'] = rank
-            else:
-                doc_scores[key] = {
-                    'doc': doc,
-                    'faiss_rank': None,
-                    'bm25_rank': rank,
-                    'score': 0
-                }
-        
-        # Calcular score combinado
-        k = 60  # Constante RRF
-        for key, data in doc_scores.items():
-            faiss_score = alpha / (data['faiss_rank'] + k) if data['faiss_rank'] is not None else 0
-            bm25_score = (1 - alpha) / (data['bm25_rank'] + k) if data['bm25_rank'] is not None else 0
-            data['score'] = faiss_score + bm25_score
-        
-        # Ordenar por score descendente
-        sorted_docs = sorted(doc_scores.values(), key=lambda x: x['score'], reverse=True)
-        
-        return [item['doc'] for item in sorted_docs]
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        timings = {'bm25': None, 'faiss': None, 'faiss_status': 'skipped', 'total': None}
+        self.last_timings = timings
+        intent = intent or analyze_query(query)
+        
+        faiss_task = None
+        if not intent.use_bm25_only:
+            faiss_task = asyncio.ensure_future(self._afaiss_leg(query))
+        
+        # 1. Búsqueda léxica (BM25) en el pool de CPU
+        bm25_docs, bm25_scores, timings['bm25'] = await loop.run_in_executor(
+            cpu_executor(), self._timed_bm25_leg, query, intent
+        )
+        
+        # Si detectamos nombres propios Y BM25 encontró resultados, usar SOLO BM25
+        if intent.use_bm25_only and len(bm25_docs) >= self.k // 2:
+            timings['total'] = time.perf_counter() - start
+            return bm25_docs[:self.k]
+        
+        # 2. Búsqueda semántica (FAISS) con presupuesto de latencia
+        if faiss_task is None:
+            faiss_task = asyncio.ensure_future(self._afaiss_leg(query))
+        try:
+            # shield: si se agota el presupuesto la llamada termina igual (y su embedding queda en caché)
+            faiss_docs, faiss_scores, timings['faiss'] = await asyncio.wait_for(
+                asyncio.shield(faiss_task), timeout=self._remaining_budget(start)
+            )
+            timings['faiss_status'] = 'ok'
+        except asyncio.TimeoutError:
+            print(f"[WARNING] ⏱️ FAISS excedió el presupuesto de {self.faiss_timeout:.1f}s, usando solo BM25")
+            timings['faiss_status'] = 'timeout'
+            timings['total'] = time.perf_counter() - start
+            return bm25_docs[:self.k]
+        except Exception as e:
+            # Si FAISS falla, usar solo BM25
+            timings['faiss_status'] = 'error'
+            timings['total'] = time.perf_counter() - start
+            return bm25_docs[:self.k]
+        
+        # 3. Fusionar resultados (RRF u otra estrategia configurada)
+        merged_docs = self._fuse(faiss_docs, faiss_scores, bm25_docs, bm25_scores, intent)
+        timings['total'] = time.perf_counter() - start
+        return merged_docs
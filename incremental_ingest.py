@@ -0,0 +1,411 @@
+"""
+Ingesta incremental de archivos .srt
+
+En lugar de reconstruir todo (parsear los ~3.400 archivos, re-embeber el corpus
+y regenerar BM25), compara el hash SHA-256 de cada .srt con el estado de la
+última ingesta y:
+    - parsea, trocea y embebe solo los archivos nuevos o modificados
+    - marca como tombstone (y elimina de FAISS y BM25) los chunks de archivos
+      borrados o modificados
+    - actualiza BM25 reutilizando sus postings (sin re-tokenizar el corpus)
+    - descarta los chunks duplicados de otros ya indexados (chunk_dedup.py) y
+      los registra como alias del canónico; si se elimina un canónico, los
+      archivos que solo estaban cubiertos por él como alias se re-ingieren
+    - escribe una generación nueva completa y la activa de forma atómica
+
+Estructura:
+    index_generations/
+        CURRENT                 nombre de la generación activa (se reemplaza con os.replace)
+        gen-00003/
+            faiss_index/        index.faiss + index.pkl + docstore/ binario
+            bm25_index/         índice BM25 binario
+            ingest_state.json   hash y chunks de cada archivo, tombstones
+
+Las generaciones anteriores se conservan (las últimas KEEP_GENERATIONS) para
+poder volver atrás editando CURRENT.
+
+Uso:
+    python incremental_ingest.py documentos_srt/            (muestra el plan)
+    python incremental_ingest.py documentos_srt/ --apply    (ejecuta la ingesta)
+    python incremental_ingest.py documentos_srt/ --apply --no-dedup   (sin deduplicar chunks)
+"""
+import hashlib
+import json
+import os
+import shutil
+import sys
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from srt_parser_timestamps import SRTParser, iter_batches
+
+GENERATIONS_DIR = "index_generations"
+CURRENT_FILE = "CURRENT"
+STATE_FILE = "ingest_state.json"
+KEEP_GENERATIONS = 3
+EMBED_BATCH_SIZE = 100
+
+
+def file_sha256(path: str) -> str:
+    """Hash SHA-256 del contenido del archivo"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def current_generation(root: str = GENERATIONS_DIR) -> Optional[Path]:
+    """Directorio de la generación activa, o None si todavía no hay generaciones"""
+    pointer = Path(root) / CURRENT_FILE
+    if not pointer.exists():
+        return None
+    generation = Path(root) / pointer.read_text(encoding='utf-8').strip()
+    return generation if generation.is_dir() else None
+
+
+def active_index_paths(root: str = GENERATIONS_DIR) -> Tuple[str, str]:
+    """
+    Rutas (FAISS, BM25) de los índices activos: los de la generación actual si
+    existe, si no los directorios clásicos (faiss_index/ y bm25_index/ o .pkl).
+    """
+    from bm25_store import find_bm25_index
+    generation = current_generation(root)
+    if generation is None:
+        return "faiss_index", find_bm25_index()
+    return str(generation / "faiss_index"), str(generation / "bm25_index")
+
+
+def _read_state(generation: Optional[Path]) -> Optional[dict]:
+    if generation is None or not (generation / STATE_FILE).exists():
+        return None
+    return json.loads((generation / STATE_FILE).read_text(encoding='utf-8'))
+
+
+def bootstrap_state(faiss_vs, srt_files: Dict[str, Path]) -> dict:
+    """
+    Estado inicial para un índice construido sin ingesta incremental.
+
+    Se asume que los archivos presentes en disco y en el índice (metadata 'source')
+    son los que se indexaron. Las fuentes del índice sin archivo en disco quedan
+    como no rastreadas: nunca se eliminan automáticamente.
+    """
+    ids_by_source: Dict[str, List[str]] = {}
+    for docstore_id, doc in faiss_vs.docstore._dict.items():
+        ids_by_source.setdefault(doc.metadata.get('source', ''), []).append(docstore_id)
+        # Archivos cuyos chunks quedaron como alias de otro también están indexados
+        for alias in doc.metadata.get('aliases', []):
+            ids_by_source.setdefault(alias.get('source', ''), [])
+
+    files = {}
+    for name, path in srt_files.items():
+        if name in ids_by_source:
+            files[name] = {'sha256': file_sha256(str(path)), 'chunks': ids_by_source[name]}
+    untracked = sorted(source for source in ids_by_source if source not in files)
+    print(f"[INFO] Estado inicial: {len(files)} archivos rastreados, {len(untracked)} fuentes no rastreadas")
+    return {'generation': 0, 'files': files, 'untracked_sources': untracked, 'tombstones': []}
+
+
+def plan_ingest(srt_files: Dict[str, Path], state: dict) -> Dict[str, List[str]]:
+    """Clasifica los archivos en nuevos, modificados, eliminados y sin cambios"""
+    plan = {'new': [], 'changed': [], 'removed': [], 'unchanged': []}
+    hashes = {}
+    for name, path in sorted(srt_files.items()):
+        known = state['files'].get(name)
+        if known is None:
+            plan['new'].append(name)
+            continue
+        hashes[name] = file_sha256(str(path))
+        plan['unchanged' if hashes[name] == known['sha256'] else 'changed'].append(name)
+    plan['removed'] = sorted(name for name in state['files'] if name not in srt_files)
+    return plan
+
+
+def alias_dependents(faiss_vs, state: dict, plan: Dict[str, List[str]]) -> List[str]:
+    """
+    Archivos sin cambios que hay que re-ingerir porque alguno de sus chunks era
+    un duplicado (alias) de un chunk que se va a eliminar.
+    """
+    docstore = faiss_vs.docstore._dict
+    leaving = set(plan['removed']) | set(plan['changed'])
+    pending = list(leaving)
+    dependents = []
+    while pending:
+        entry = state['files'].get(pending.pop())
+        if entry is None:
+            continue
+        for docstore_id in entry['chunks']:
+            doc = docstore.get(docstore_id)
+            for alias in (doc.metadata.get('aliases', []) if doc is not None else []):
+                source = alias.get('source')
+                if source in state['files'] and source not in leaving:
+                    leaving.add(source)
+                    dependents.append(source)
+                    pending.append(source)
+    return sorted(dependents)
+
+
+def _drop_aliases(docstore: Dict, sources: set) -> int:
+    """Quita de los chunks que quedan los alias que apuntan a archivos eliminados o re-ingeridos"""
+    dropped = 0
+    for doc in docstore.values():
+        aliases = doc.metadata.get('aliases')
+        if not aliases:
+            continue
+        kept = [alias for alias in aliases if alias.get('source') not in sources]
+        if len(kept) != len(aliases):
+            dropped += len(aliases) - len(kept)
+            if kept:
+                doc.metadata['aliases'] = kept
+            else:
+                del doc.metadata['aliases']
+    return dropped
+
+
+def _print_plan(plan: Dict[str, List[str]]) -> None:
+    print(f"   • Nuevos: {len(plan['new'])}")
+    print(f"   • Modificados: {len(plan['changed']) - len(plan.get('alias_dependents', []))}")
+    if plan.get('alias_dependents'):
+        print(f"   • Re-ingeridos por alias: {len(plan['alias_dependents'])}")
+    print(f"   • Eliminados: {len(plan['removed'])}")
+    print(f"   • Sin cambios: {len(plan['unchanged'])}")
+
+
+def _activate(root: Path, generation_name: str) -> None:
+    """Apunta CURRENT a la generación (reemplazo atómico del archivo)"""
+    tmp = root / (CURRENT_FILE + ".tmp")
+    tmp.write_text(generation_name, encoding='utf-8')
+    os.replace(tmp, root / CURRENT_FILE)
+
+
+def _prune(root: Path, keep: int) -> None:
+    generations = sorted(p for p in root.glob("gen-*") if p.is_dir())
+    for old in generations[:-keep]:
+        shutil.rmtree(old)
+
+
+def _iter_new_chunks(
+    names: List[str],
+    srt_files: Dict[str, Path],
+    state: Dict,
+    chunk_size: int,
+    chunk_overlap: int,
+    deduplicator=None
+) -> Iterator[Tuple[str, object]]:
+    """
+    Genera (id de docstore, Document) de los archivos indicados, uno a la vez,
+    registrando en state los ids de cada archivo a medida que se crean. Con
+    deduplicator los duplicados no se generan (quedan como alias).
+    """
+    for name in names:
+        path = srt_files[name]
+        ids = []
+        state['files'][name] = {'sha256': file_sha256(str(path)), 'chunks': ids}
+        chunks = SRTParser.iter_chunks_with_timestamps(
+            SRTParser.parse_srt_columns(str(path)),
+            source_filename=name,
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap
+        )
+        for doc in chunks:
+            docstore_id = str(uuid.uuid4())
+            if deduplicator is not None and deduplicator.add(docstore_id, doc) is not None:
+                continue
+            ids.append(docstore_id)
+            yield docstore_id, doc
+
+
+def run_ingest(
+    data_path: str,
+    embeddings,
+    root: str = GENERATIONS_DIR,
+    chunk_size: int = 800,
+    chunk_overlap: int = 150,
+    apply: bool = True,
+    batch_size: int = EMBED_BATCH_SIZE,
+    builder=None,
+    deduplicator=None
+) -> Optional[Path]:
+    """
+    Ingesta incremental del directorio de .srt.
+
+    Args:
+        data_path: Directorio con los archivos .srt
+        embeddings: Objeto de embeddings (el mismo modelo con el que se creó el índice)
+        root: Directorio de generaciones
+        chunk_size / chunk_overlap: Parámetros de chunking (deben coincidir con el índice)
+        apply: False = solo mostrar el plan
+        batch_size: Chunks por llamada de embedding (sin builder) o por grupo (con builder)
+        builder: EmbeddingBuilder opcional (embedding_builder.py): lotes concurrentes,
+            límite de peticiones, reintentos y checkpoint para retomar una ingesta cortada
+        deduplicator: ChunkDeduplicator opcional (chunk_dedup.py): los chunks nuevos
+            duplicados de otros ya indexados no se embeben y quedan como alias
+
+    Returns:
+        Directorio de la generación creada (None si no hubo cambios o apply=False)
+    """
+    from langchain_community.vectorstores import FAISS
+    from bm25_engine import InvertedBM25Index, ensure_inverted_index
+    from bm25_store import load_bm25_data, save_bm25_index
+    from document_store import assign_chunk_ids
+    from faiss_mmap import convert_docstore
+    from hybrid_retriever import tokenize_clean
+
+    root_path = Path(root)
+    srt_files = {path.name: path for path in Path(data_path).glob("*.srt")}
+    print(f"\n📂 Ingesta incremental desde: {data_path} ({len(srt_files)} archivos .srt)")
+
+    faiss_dir, bm25_dir = active_index_paths(root)
+    faiss_vs = FAISS.load_local(folder_path=faiss_dir, embeddings=embeddings, allow_dangerous_deserialization=True)
+    state = _read_state(current_generation(root))
+    bootstrapped = state is None
+    if bootstrapped:
+        state = bootstrap_state(faiss_vs, srt_files)
+
+    plan = plan_ingest(srt_files, state)
+    # Un chunk eliminado puede ser el único que cubría (como alias) a otro archivo
+    plan['alias_dependents'] = alias_dependents(faiss_vs, state, plan)
+    if plan['alias_dependents']:
+        plan['changed'] = sorted(plan['changed'] + plan['alias_dependents'])
+        plan['unchanged'] = [name for name in plan['unchanged'] if name not in plan['alias_dependents']]
+    _print_plan(plan)
+    if not (plan['new'] or plan['changed'] or plan['removed']) and not bootstrapped:
+        print("✅ El índice ya está al día")
+        return None
+    if not apply:
+        print("ℹ️  Ejecuta con --apply para crear la nueva generación")
+        return None
+    # Sin estado previo se escribe igual una generación base: registra los hashes
+    # actuales para que los cambios posteriores se detecten
+
+    # 1. Tombstones: chunks de archivos eliminados o modificados
+    generation_number = state['generation'] + 1
+    now = datetime.now().isoformat(timespec='seconds')
+    tombstoned_ids = []
+    for name in plan['removed'] + plan['changed']:
+        entry = state['files'].pop(name)
+        tombstoned_ids.extend(entry['chunks'])
+        state['tombstones'].append({
+            'file': name,
+            'sha256': entry['sha256'],
+            'chunks': len(entry['chunks']),
+            'removed_at': now,
+            'generation': generation_number,
+            'reason': ('removed' if name in plan['removed']
+                       else 'alias' if name in plan['alias_dependents'] else 'changed')
+        })
+
+    # Las filas BM25 siguen el orden del docstore: posiciones a borrar antes de tocar FAISS
+    docstore_ids = list(faiss_vs.docstore._dict.keys())
+    tombstoned = set(tombstoned_ids)
+    removed_rows = [row for row, docstore_id in enumerate(docstore_ids) if docstore_id in tombstoned]
+    if tombstoned_ids:
+        faiss_vs.delete(tombstoned_ids)
+        print(f"🪦 {len(tombstoned_ids)} chunks eliminados ({len(plan['removed'])} archivos borrados, "
+              f"{len(plan['changed'])} modificados)")
+    stale_aliases = _drop_aliases(faiss_vs.docstore._dict, set(plan['removed']) | set(plan['changed']))
+    if stale_aliases:
+        print(f"🪦 {stale_aliases} alias eliminados")
+
+    if deduplicator is not None:
+        # Los chunks que siguen en el índice son los canónicos contra los que se compara
+        for docstore_id, doc in faiss_vs.docstore._dict.items():
+            deduplicator.register(docstore_id, doc.page_content)
+
+    # 2. Parsear, trocear y embeber solo los archivos nuevos o modificados, en lotes
+    #    de batch_size chunks: en memoria solo vive el lote en curso (y sus tokens BM25)
+    new_chunks = _iter_new_chunks(plan['new'] + plan['changed'], srt_files, state, chunk_size, chunk_overlap,
+                                  deduplicator=deduplicator)
+    added_tokenized = []
+    for batch in iter_batches(new_chunks, batch_size):
+        if builder is None:
+            faiss_vs.add_documents([doc for _, doc in batch], ids=[docstore_id for docstore_id, _ in batch])
+        else:
+            texts = [doc.page_content for _, doc in batch]
+            faiss_vs.add_embeddings(
+                zip(texts, builder.embed_texts(texts).tolist()),
+                metadatas=[doc.metadata for _, doc in batch],
+                ids=[docstore_id for docstore_id, _ in batch]
+            )
+        added_tokenized.extend(tokenize_clean(doc.page_content) for _, doc in batch)
+        print(f"   📊 Embebidos {len(added_tokenized)} chunks")
+    if deduplicator is not None:
+        # FAISS copia la metadata al agregar: los alias se aplican sobre su docstore
+        deduplicator.apply_aliases(faiss_vs.docstore._dict)
+        if deduplicator.stats['input']:
+            print(f"🧬 Deduplicación: {deduplicator.report()}")
+
+    # Ids enteros de los chunks (posición en el docstore = fila BM25) para esta generación
+    assign_chunk_ids(faiss_vs.docstore._dict)
+
+    # 3. BM25: reutilizar postings existentes (mismo orden que el docstore)
+    texts = [doc.page_content for doc in faiss_vs.docstore._dict.values()]
+    metadatas = [doc.metadata for doc in faiss_vs.docstore._dict.values()]
+    bm25 = None
+    if os.path.exists(bm25_dir):
+        bm25 = ensure_inverted_index(load_bm25_data(bm25_dir)['bm25'])
+        if bm25.corpus_size != len(docstore_ids):
+            print("[WARNING] El índice BM25 no corresponde al docstore de FAISS, se reconstruye completo")
+            bm25 = None
+    if bm25 is None:
+        bm25 = InvertedBM25Index.from_tokenized([tokenize_clean(text) for text in texts])
+    else:
+        bm25 = bm25.updated(removed_rows, added_tokenized)
+
+    # 4. Escribir la generación completa en un directorio temporal y activarla
+    generation_name = f"gen-{generation_number:05d}"
+    tmp = root_path / f".{generation_name}.tmp"
+    if tmp.exists():
+        shutil.rmtree(tmp)
+    tmp.mkdir(parents=True)
+    faiss_vs.save_local(str(tmp / "faiss_index"))
+    convert_docstore(str(tmp / "faiss_index"))
+    save_bm25_index(str(tmp / "bm25_index"), bm25, texts, metadatas)
+
+    state.update({
+        'generation': generation_number,
+        'created': now,
+        'data_path': str(data_path),
+        'chunk_size': chunk_size,
+        'chunk_overlap': chunk_overlap,
+        'total_chunks': len(texts)
+    })
+    (tmp / STATE_FILE).write_text(json.dumps(state, indent=2, ensure_ascii=False), encoding='utf-8')
+
+    target = root_path / generation_name
+    if target.exists():
+        shutil.rmtree(target)
+    tmp.rename(target)
+    _activate(root_path, generation_name)
+    _prune(root_path, KEEP_GENERATIONS)
+
+    print(f"\n✅ Generación {generation_name} activa: {len(texts):,} chunks "
+          f"(+{len(added_tokenized)} nuevos, -{len(tombstoned_ids)} eliminados)")
+    print("ℹ️  Reinicia la app para cargar la nueva generación")
+    return target
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    data_path = args[0] if args else "documentos_srt/"
+
+    os.environ.setdefault('GOOGLE_APPLICATION_CREDENTIALS', 'credencial json/midyear-node-436821-t3-525a146e96a0.json')
+    from langchain_google_vertexai import VertexAIEmbeddings
+    from chunk_dedup import ChunkDeduplicator
+    from embedding_builder import EmbeddingBuilder
+    from embedding_cache import CachedEmbeddings
+
+    # Mismo modelo con el que se creó el índice FAISS
+    embeddings = VertexAIEmbeddings(
+        model_name="text-multilingual-embedding-002",
+        project="midyear-node-436821-t3"
+    )
+    # Los documentos pasan por el builder (checkpoint por contenido); las consultas por el caché
+    builder = EmbeddingBuilder(embeddings, model_name="text-multilingual-embedding-002")
+    embeddings = CachedEmbeddings(embeddings, model_name="text-multilingual-embedding-002")
+
+    deduplicator = None if "--no-dedup" in sys.argv else ChunkDeduplicator()
+    run_ingest(data_path, embeddings, apply="--apply" in sys.argv, batch_size=1000, builder=builder,
+               deduplicator=deduplicator)
@@ -0,0 +1,216 @@
+"""
+Análisis de la consulta en una sola pasada
+
+Antes cada consulta recorría varias listas de palabras clave por separado
+(nombres propios en HybridRetriever, conjunciones, palabras de complejidad y de
+listado en get_optimal_k). analyze_query tokeniza una vez y reconoce todos los
+vocabularios con estructuras precompiladas:
+    - un conjunto de palabras completas (nombres de maestros y términos afines)
+    - una sola regex combinada con todas las frases, que se aplica una vez sobre
+      la consulta en minúsculas y reporta todas las coincidencias, incluidas las
+      que se solapan ('dame todos' y 'todos los' en "dame todos los nombres")
+
+El resultado es un QueryIntent inmutable que consumen la búsqueda híbrida y la
+selección de k.
+"""
+import re
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# Palabras completas (separadas por espacios) que indican búsqueda de nombres
+NAME_KEYWORDS = frozenset([
+    'maria', 'magdalena', 'jesus', 'cristo', 'jose', 'juan', 'pedro', 'pablo',
+    'azoes', 'azen', 'aviatar', 'alaniso', 'alan', 'axel', 'adiestro', 'adiel', 'aladim',
+    'aliestro', 'trey', 'totero', 'ra',
+    'thor', 'arcangel', 'maestro', 'maestros', 'guardianes', 'guardian',
+    'nombre', 'nombres', 'quien', 'quienes'
+])
+
+# Los 9 maestros guardianes (la rama BM25 busca todas sus menciones)
+GUARDIAN_MASTERS = ('alaniso', 'axel', 'alan', 'azen', 'aviatar', 'aladim', 'adiel', 'azoes', 'aliestro')
+
+# Frases buscadas como subcadenas de la consulta en minúsculas, por categoría
+PHRASE_VOCABULARIES: Dict[str, Tuple[str, ...]] = {
+    'names_question': ('nombre', 'nombres', 'quien', 'quienes', 'guardianes', 'maestros'),
+    'guardians': ('guardianes', 'maestros'),
+    'conjunction': (
+        ' y ', ' o ', ' además', ' también', ' asimismo', ' igualmente',
+        ' por otro lado', ' en relación', ' respecto a'
+    ),
+    'complex': (
+        'compara', 'contrasta', 'analiza', 'profundiza', 'explica detalladamente',
+        'todos los', 'todas las', 'exhaustivamente', 'completamente',
+        'en profundidad', 'detallado', 'extenso', 'amplio'
+    ),
+    'listing': (
+        'lista', 'enumera', 'cuáles son', 'qué son', 'menciona todos',
+        'dame todos', 'dame todas', 'todos los nombres', 'todas las'
+    ),
+}
+
+def _trie_pattern(phrases: Iterable[str]) -> str:
+    """
+    Regex equivalente a la alternancia de las frases, factorizada como trie
+    (prefijos comunes una sola vez): en cada posición se prueba un solo camino
+    y los cuantificadores codiciosos devuelven la frase más larga.
+    """
+    trie: Dict = {}
+    for phrase in phrases:
+        node = trie
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node: Dict) -> str:
+        children = [re.escape(char) + build(node[char]) for char in sorted(node) if char]
+        if not children:
+            return ''
+        body = children[0] if len(children) == 1 else '(?:' + '|'.join(children) + ')'
+        return '(?:' + body + ')?' if '' in node else body
+
+    return build(trie)
+
+
+class PhraseMatcher:
+    """
+    Reconoce las frases de varios vocabularios con una sola regex precompilada.
+
+    La regex es una búsqueda anticipada (?=(trie de frases)): findall la evalúa en
+    cada posición del texto (en C) y captura la frase más larga que empieza ahí.
+    Cualquier otra frase que empiece en la misma posición es prefijo de esa, así
+    que cada frase lleva precalculadas sus frases-prefijo con sus categorías
+    (p. ej. 'todos los nombres' reporta también 'todos los').
+    """
+
+    def __init__(self, vocabularies: Dict[str, Iterable[str]]):
+        categories: Dict[str, set] = {}
+        for category, phrases in vocabularies.items():
+            for phrase in phrases:
+                categories.setdefault(phrase, set()).add(category)
+        self._pattern = re.compile("(?=(" + _trie_pattern(categories) + "))")
+        # Frase -> [(frase-prefijo, categoría), ...] de más corta a más larga
+        self._expansions: Dict[str, List[Tuple[str, str]]] = {
+            phrase: [(prefix, category)
+                     for prefix in sorted(categories, key=len) if phrase.startswith(prefix)
+                     for category in sorted(categories[prefix])]
+            for phrase in categories
+        }
+
+    def match(self, text: str) -> Dict[str, List[str]]:
+        """Categoría -> frases encontradas en text (en orden de aparición, con solapamientos)"""
+        found: Dict[str, List[str]] = {}
+        expansions = self._expansions
+        for longest in self._pattern.findall(text):
+            for phrase, category in expansions[longest]:
+                found.setdefault(category, []).append(phrase)
+        return found
+
+
+_MATCHER = PhraseMatcher(PHRASE_VOCABULARIES)
+
+
+@dataclass(frozen=True)
+class QueryIntent:
+    """Intención de la consulta (resultado de analyze_query)"""
+    query: str
+    query_lower: str
+    word_count: int
+    names: Tuple[str, ...]            # Palabras de NAME_KEYWORDS presentes
+    proper_nouns: Tuple[str, ...]     # Palabras capitalizadas de más de 2 letras
+    asks_for_names: bool
+    asks_for_guardians: bool          # Pregunta por "guardianes" o "maestros"
+    multiple_questions: bool
+    has_conjunctions: bool
+    has_complex_keywords: bool
+    has_multiple_subjects: bool
+    asks_for_listing: bool
+    complexity_score: int
+    matches: Dict[str, List[str]] = field(default_factory=dict, compare=False)
+    title: Optional[Dict[str, Any]] = field(default=None, compare=False)  # Resultado del detector de títulos
+
+    @property
+    def use_bm25_only(self) -> bool:
+        """Nombres propios o preguntas por nombres: la búsqueda léxica suele bastar"""
+        return bool(self.proper_nouns or self.names or self.asks_for_names)
+
+    @property
+    def has_title(self) -> bool:
+        return bool(self.title and self.title.get('has_title'))
+
+    @property
+    def indicators(self) -> Dict[str, Any]:
+        """Indicadores de complejidad (mismas claves que usaba get_optimal_k)"""
+        return {
+            'word_count': self.word_count,
+            'multiple_questions': self.multiple_questions,
+            'has_conjunctions': self.has_conjunctions,
+            'has_complex_keywords': self.has_complex_keywords,
+            'has_multiple_subjects': self.has_multiple_subjects,
+            'asks_for_listing': self.asks_for_listing
+        }
+
+
+def _complexity_score(word_count: int, flags: Dict[str, bool]) -> int:
+    """Puntaje de complejidad: longitud de la pregunta + indicadores"""
+    score = 0
+    if word_count > 40:
+        score += 3
+    elif word_count > 25:
+        score += 2
+    elif word_count > 15:
+        score += 1
+    if flags['multiple_questions']:
+        score += 2
+    if flags['has_conjunctions']:
+        score += 1
+    if flags['has_complex_keywords']:
+        score += 2
+    if flags['has_multiple_subjects']:
+        score += 1
+    if flags['asks_for_listing']:
+        score += 2
+    return score
+
+
+def analyze_query(
+    query: str,
+    title_detector: Optional[Callable[[str], Dict[str, Any]]] = None
+) -> QueryIntent:
+    """
+    Analiza la consulta una sola vez.
+
+    Args:
+        query: Pregunta del usuario
+        title_detector: Detector opcional de títulos (p. ej. detect_title_in_query);
+            su resultado queda en intent.title
+
+    Returns:
+        QueryIntent con nombres, indicios de título, indicadores y puntaje de complejidad
+    """
+    words = query.split()
+    query_lower = query.lower()
+    matches = _MATCHER.match(query_lower)
+
+    names = tuple(word.lower() for word in words if word.lower() in NAME_KEYWORDS)
+    proper_nouns = tuple(word for word in words if len(word) > 2 and word[0].isupper())
+
+    flags = {
+        'multiple_questions': query.count('?') > 1,
+        'has_conjunctions': 'conjunction' in matches,
+        'has_complex_keywords': 'complex' in matches,
+        'has_multiple_subjects': query.count(',') >= 2,
+        'asks_for_listing': 'listing' in matches
+    }
+    return QueryIntent(
+        query=query,
+        query_lower=query_lower,
+        word_count=len(words),
+        names=names,
+        proper_nouns=proper_nouns,
+        asks_for_names='names_question' in matches,
+        asks_for_guardians='guardians' in matches,
+        complexity_score=_complexity_score(len(words), flags),
+        matches=matches,
+        title=title_detector(query) if title_detector is not None else None,
+        **flags
+    )
@@ -0,0 +1,108 @@
+"""
+Registro de retrievers a nivel de proceso
+Construye el HybridRetriever una sola vez por versión de índice y configuración,
+lo comparte entre sesiones e hilos y entrega vistas livianas con el k pedido.
+"""
+import os
+import threading
+from typing import Dict, Optional, Sequence, Tuple
+from langchain_core.documents import Document
+
+from bm25_store import find_bm25_index
+from fusion import FusionConfig
+from hybrid_retriever import HybridRetriever
+
+
+def index_version(faiss_vs, bm25_path: Optional[str] = None) -> str:
+    """
+    Identificador de la versión de los índices cargados.
+    Cambia si se recarga FAISS o si se reescribe el índice BM25 en disco.
+    """
+    ntotal = getattr(getattr(faiss_vs, 'index', None), 'ntotal', 0)
+    parts = [f"faiss:{id(faiss_vs)}:{ntotal}"]
+
+    path = bm25_path or find_bm25_index()
+    if os.path.isdir(path):
+        path = os.path.join(path, "manifest.json")
+    if os.path.exists(path):
+        parts.append(f"bm25:{os.path.getmtime(path)}")
+    return "|".join(parts)
+
+
+class RetrieverRegistry:
+    """
+    Caché de retrievers híbridos compartida por todo el proceso (thread-safe).
+
+    - El índice BM25 (motor + textos) se carga o construye una vez por versión.
+    - Cada configuración (alpha, modo exhaustivo, k de FAISS, fusión) tiene un retriever base.
+    - get_hybrid devuelve una copia superficial con el k (y modo de ejecución) solicitado:
+      no copia índices.
+    """
+
+    def __init__(self, bm25_path: Optional[str] = None):
+        self.bm25_path = bm25_path
+        self._lock = threading.Lock()
+        self._version: Optional[str] = None
+        self._bm25_data: Optional[dict] = None
+        self._retrievers: Dict[Tuple, HybridRetriever] = {}
+
+    def get_hybrid(
+        self,
+        faiss_vs,
+        documents: Optional[Sequence[Document]] = None,
+        k: int = 10,
+        alpha: float = 0.7,
+        exhaustive: bool = False,
+        faiss_k: Optional[int] = None,
+        parallel: bool = True,
+        faiss_timeout: Optional[float] = None,
+        fusion: Optional[FusionConfig] = None
+    ) -> HybridRetriever:
+        """
+        Args:
+            faiss_vs: Vectorstore FAISS
+            documents: Documentos para indexar en memoria si no hay índice BM25 en disco
+            k: Número de documentos a retornar en esta llamada
+            alpha: Peso para resultados FAISS (0-1)
+            exhaustive: Modo de búsqueda exhaustiva (quirúrgica)
+            faiss_k: Documentos a pedir a FAISS (por defecto, k)
+            parallel: Ejecutar FAISS en paralelo con BM25
+            faiss_timeout: Presupuesto de latencia de FAISS en segundos (None = sin límite)
+            fusion: Estrategia de fusión (por defecto RRF con k=60)
+        """
+        faiss_k = faiss_k or k
+        fusion = fusion or FusionConfig()
+        version = index_version(faiss_vs, self.bm25_path)
+        key = (alpha, exhaustive, faiss_k, fusion)
+
+        with self._lock:
+            if version != self._version:
+                # Índice nuevo: descartar todo lo construido sobre la versión anterior
+                self._version = version
+                self._bm25_data = None
+                self._retrievers = {}
+
+            base = self._retrievers.get(key)
+            if base is None:
+                faiss_retriever = faiss_vs.as_retriever(search_kwargs={"k": faiss_k})
+                if self._bm25_data is None:
+                    base = HybridRetriever.build(
+                        faiss_retriever=faiss_retriever,
+                        bm25_path=self.bm25_path,
+                        documents=documents,
+                        k=k,
+                        alpha=alpha,
+                        fusion=fusion
+                    )
+                    self._bm25_data = {
+                        'bm25': base.bm25_index,
+                        'docs': base.bm25_docs,
+                        'metadatas': base.bm25_metadatas
+                    }
+                else:
+                    base = HybridRetriever(faiss_retriever, k=k, alpha=alpha, bm25_data=self._bm25_data, fusion=fusion)
+                self._retrievers[key] = base
+                print(f"[INFO] Retriever híbrido construido (alpha={alpha}, exhaustivo={exhaustive}, faiss_k={faiss_k}, "
+                      f"fusión={fusion.method})")
+
+        return base.model_copy(update={'k': k, 'parallel': parallel, 'faiss_timeout': faiss_timeout})
@@ -3,13 +3,63 @@ Parser optimizado para archivos .srt con preservación de timestamps.
 Extrae bloques de subtítulos con sus tiempos exactos.
 """
 
+import codecs
 import re
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Tuple
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 from dataclasses import dataclass
+
+import numpy as np
 from langchain_core.documents import Document
 
 
+# Separador de bloques: línea vacía (o solo con espacios)
+_RECORD_SEPARATOR = re.compile(r'\n[ \t]*\n')
+
+# Línea de tiempos "HH:MM:SS,mmm --> HH:MM:SS,mmm" (acepta '.' en los milisegundos,
+# espacios de más y coordenadas de posición al final)
+_TIMING_LINE = re.compile(
+    r'[ \t]*(\d{2}:\d{2}:\d{2})[,.](\d{3})[ \t]*-->[ \t]*(\d{2}:\d{2}:\d{2})[,.](\d{3})'
+)
+
+# Cachés HH:MM:SS <-> segundos enteros (los mismos valores se repiten entre archivos).
+# _CLOCK_STRINGS es la tabla de timestamps internados que comparten todos los bloques
+_HMS_SECONDS: Dict[str, int] = {}
+_CLOCK_STRINGS: Dict[int, str] = {}
+_HMS_CACHE_LIMIT = 400_000
+
+# BOMs reconocidos (UTF-32 antes que UTF-16: comparten prefijo en little-endian)
+_BOMS = [
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+
+
+def _hms_seconds(hms: str) -> int:
+    seconds = _HMS_SECONDS.get(hms)
+    if seconds is None:
+        seconds = int(hms[0:2]) * 3600 + int(hms[3:5]) * 60 + int(hms[6:8])
+        if len(_HMS_SECONDS) < _HMS_CACHE_LIMIT:
+            _HMS_SECONDS[hms] = seconds
+    return seconds
+
+
+def _clock_string(seconds: int) -> str:
+    """Segundos enteros -> "HH:MM:SS" (internado)"""
+    clock = _CLOCK_STRINGS.get(seconds)
+    if clock is None:
+        clock = f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+        if len(_CLOCK_STRINGS) < _HMS_CACHE_LIMIT:
+            _CLOCK_STRINGS[seconds] = clock
+    return clock
+
+
 @dataclass
 class SubtitleBlock:
     """Bloque individual de subtítulo con metadata completa"""
@@ -21,6 +71,177 @@ class SubtitleBlock:
     end_seconds: float
 
 
+def _iter_srt_records(content: str) -> Iterator[Tuple[int, str, str, str, str, str]]:
+    """
+    Parser de una sola pasada sobre el texto ya decodificado.
+    
+    Recorre los registros separados por líneas vacías con una máquina de
+    estados mínima: un registro que empieza por "índice + línea de tiempos"
+    abre un bloque nuevo; cualquier otro registro es texto del bloque en
+    curso (subtítulos con líneas vacías internas). Es la misma regla que
+    aplicaba el regex anterior, sin su backtracking, y además tolera
+    espacios al final de las líneas, '.' en los milisegundos y archivos sin
+    salto de línea final.
+    
+    Genera tuplas (índice, HH:MM:SS inicial, ms inicial, HH:MM:SS final, ms final, texto).
+    """
+    # Bloque en curso: se emite cuando aparece el siguiente índice o al final
+    index = None
+    parts = []
+    
+    for record in _RECORD_SEPARATOR.split(content):
+        header = record if record[:1].isdigit() else record.lstrip()
+        first_end = header.find('\n')
+        first = (header[:first_end] if first_end >= 0 else header).rstrip()
+        
+        if not first.isdigit():
+            # Texto que sigue a una línea vacía dentro del mismo subtítulo
+            if index is not None:
+                parts.append(record)
+            continue
+        
+        # Nuevo registro con índice: cierra el bloque en curso
+        if index is not None:
+            text = parts[0].strip() if len(parts) == 1 else "\n\n".join(parts).strip()
+            yield index, start_hms, start_ms, end_hms, end_ms, text
+            index = None
+        
+        if first_end < 0:
+            continue
+        timing_end = header.find('\n', first_end + 1)
+        timing = _TIMING_LINE.match(header, first_end + 1, timing_end if timing_end >= 0 else len(header))
+        if timing is None:
+            continue  # índice sin línea de tiempos: registro inválido
+        
+        start_hms, start_ms, end_hms, end_ms = timing.groups()
+        index = int(first)
+        parts = [header[timing_end + 1:] if timing_end >= 0 else '']
+    
+    if index is not None:
+        yield index, start_hms, start_ms, end_hms, end_ms, "\n\n".join(parts).strip()
+
+
+class SubtitleBlockArray(Sequence):
+    """
+    Bloques de subtítulos de un archivo en columnas.
+    
+    En vez de un SubtitleBlock (4 strings + 2 floats, ~400 bytes) por línea de
+    subtítulo, ~20 bytes por bloque más el texto:
+        indices                    int32, índice SRT de cada bloque
+        start_clock / end_clock    int32, segundos enteros ("HH:MM:SS" se obtiene
+                                   de la tabla de timestamps internados)
+        start_ms / end_ms          int16, milisegundos
+        text / text_offsets        un único str con todos los textos y sus offsets
+    
+    Indexar devuelve un SubtitleBlock (compatibilidad con el código existente),
+    pero el chunker trabaja directamente sobre las columnas.
+    """
+    
+    __slots__ = ('indices', 'start_clock', 'end_clock', 'start_ms', 'end_ms', 'text', 'text_offsets')
+    
+    def __init__(
+        self,
+        indices: np.ndarray,
+        start_clock: np.ndarray,
+        end_clock: np.ndarray,
+        start_ms: np.ndarray,
+        end_ms: np.ndarray,
+        text: str,
+        text_offsets: np.ndarray
+    ):
+        self.indices = indices
+        self.start_clock = start_clock
+        self.end_clock = end_clock
+        self.start_ms = start_ms
+        self.end_ms = end_ms
+        self.text = text
+        self.text_offsets = text_offsets
+    
+    @classmethod
+    def from_records(cls, records: Iterable[Tuple[int, str, str, str, str, str]]) -> "SubtitleBlockArray":
+        """Construye las columnas a partir de las tuplas de _iter_srt_records"""
+        indices, start_clock, end_clock, start_ms_list, end_ms_list = [], [], [], [], []
+        texts, lengths = [], []
+        hms_cache = _HMS_SECONDS
+        
+        for index, start_hms, start_ms, end_hms, end_ms, text in records:
+            # Segundos desde los grupos del match, sin volver a partir los strings
+            start_clock.append(hms_cache.get(start_hms) or _hms_seconds(start_hms))
+            end_clock.append(hms_cache.get(end_hms) or _hms_seconds(end_hms))
+            start_ms_list.append(int(start_ms))
+            end_ms_list.append(int(end_ms))
+            indices.append(index)
+            texts.append(text)
+            lengths.append(len(text))
+        
+        text_offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=text_offsets[1:])
+        return cls(
+            indices=np.array(indices, dtype=np.int32),
+            start_clock=np.array(start_clock, dtype=np.int32),
+            end_clock=np.array(end_clock, dtype=np.int32),
+            start_ms=np.array(start_ms_list, dtype=np.int16),
+            end_ms=np.array(end_ms_list, dtype=np.int16),
+            text="".join(texts),
+            text_offsets=text_offsets
+        )
+    
+    @classmethod
+    def from_blocks(cls, blocks: Iterable[SubtitleBlock]) -> "SubtitleBlockArray":
+        """Convierte SubtitleBlock (start_time/end_time en formato HH:MM:SS,mmm) a columnas"""
+        return cls.from_records(
+            (block.index, block.start_time[:8], block.start_time[9:12],
+             block.end_time[:8], block.end_time[9:12], block.text)
+            for block in blocks
+        )
+    
+    def __len__(self) -> int:
+        return len(self.indices)
+    
+    def __getitem__(self, i: int) -> SubtitleBlock:
+        if isinstance(i, slice):
+            raise TypeError("SubtitleBlockArray no admite slices")
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return SubtitleBlock(
+            index=int(self.indices[i]),
+            start_time=self.start_time(i),
+            end_time=self.end_time(i),
+            text=self.text_at(i),
+            start_seconds=self.seconds_at(i),
+            end_seconds=self.seconds_at(i, end=True)
+        )
+    
+    @property
+    def start_seconds(self) -> np.ndarray:
+        return self.start_clock + self.start_ms / 1000
+    
+    @property
+    def end_seconds(self) -> np.ndarray:
+        return self.end_clock + self.end_ms / 1000
+    
+    def text_at(self, i: int) -> str:
+        return self.text[self.text_offsets[i]:self.text_offsets[i + 1]]
+    
+    def text_lengths(self) -> np.ndarray:
+        """Longitud en caracteres del texto de cada bloque"""
+        return np.diff(self.text_offsets)
+    
+    def seconds_at(self, i: int, end: bool = False) -> float:
+        """Segundos (con la misma aritmética que SRTParser.timestamp_to_seconds)"""
+        if end:
+            return int(self.end_clock[i]) + int(self.end_ms[i]) / 1000
+        return int(self.start_clock[i]) + int(self.start_ms[i]) / 1000
+    
+    def start_time(self, i: int) -> str:
+        return f"{_clock_string(int(self.start_clock[i]))},{int(self.start_ms[i]):03d}"
+    
+    def end_time(self, i: int) -> str:
+        return f"{_clock_string(int(self.end_clock[i]))},{int(self.end_ms[i]):03d}"
+
+
 class SRTParser:
     """Parser especializado para archivos .srt"""
     
@@ -48,133 +269,256 @@ class SRTParser:
         Returns:
             Lista de SubtitleBlock con toda la metadata
         """
-        blocks = []
-        
-        try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                content = f.read()
-        except UnicodeDecodeError:
-            # Fallback a latin-1 si UTF-8 falla
-            with open(filepath, 'r', encoding='latin-1') as f:
-                content = f.read()
-        
-        # Regex para parsear bloques de subtítulos
-        pattern = r'(\d+)\n(\d{2}:\d{2}:\d{2},\d{3}) --> (\d{2}:\d{2}:\d{2},\d{3})\n((?:.*\n)*?)(?=\n\d+\n|\Z)'
+        return list(SRTParser.iter_srt_blocks(filepath))
+    
+    @staticmethod
+    def iter_srt_blocks(filepath: str) -> Iterator[SubtitleBlock]:
+        """
+        Versión perezosa de parse_srt_file: genera los bloques a medida que
+        se encuentran, sin construir la lista completa del archivo.
+        """
+        with open(filepath, 'rb') as f:
+            raw = f.read()
+        return SRTParser.iter_srt_text_blocks(SRTParser.decode_srt_bytes(raw))
+    
+    @staticmethod
+    def decode_srt_bytes(raw: bytes) -> str:
+        """
+        Decodifica el contenido de un .srt: BOM (UTF-8/16/32) si lo hay, si no
+        UTF-8 con fallback a latin-1. Normaliza los saltos de línea CRLF/CR a LF.
+        """
+        content = None
+        for bom, encoding in _BOMS:
+            if raw.startswith(bom):
+                try:
+                    content = raw.decode(encoding)
+                except UnicodeDecodeError:
+                    pass  # BOM espurio: se trata como un archivo sin BOM
+                break
         
-        matches = re.finditer(pattern, content)
+        if content is None:
+            try:
+                content = raw.decode('utf-8')
+            except UnicodeDecodeError:
+                # Fallback a latin-1 si UTF-8 falla
+                content = raw.decode('latin-1')
         
-        for match in matches:
-            index = int(match.group(1))
-            start_time = match.group(2)
-            end_time = match.group(3)
-            text = match.group(4).strip()
-            
-            block = SubtitleBlock(
+        if '\r' in content:
+            content = content.replace('\r\n', '\n').replace('\r', '\n')
+        return content
+    
+    @staticmethod
+    def iter_srt_text_blocks(content: str) -> Iterator[SubtitleBlock]:
+        """Bloques del texto ya decodificado (ver _iter_srt_records)"""
+        hms_cache = _HMS_SECONDS
+        for index, start_hms, start_ms, end_hms, end_ms, text in _iter_srt_records(content):
+            yield SubtitleBlock(
                 index=index,
-                start_time=start_time,
-                end_time=end_time,
+                start_time=start_hms + ',' + start_ms,
+                end_time=end_hms + ',' + end_ms,
                 text=text,
-                start_seconds=SRTParser.timestamp_to_seconds(start_time),
-                end_seconds=SRTParser.timestamp_to_seconds(end_time)
+                start_seconds=(hms_cache.get(start_hms) or _hms_seconds(start_hms)) + int(start_ms) / 1000,
+                end_seconds=(hms_cache.get(end_hms) or _hms_seconds(end_hms)) + int(end_ms) / 1000
             )
-            blocks.append(block)
-        
-        return blocks
+    
+    @staticmethod
+    def parse_srt_columns(filepath: str) -> SubtitleBlockArray:
+        """
+        Parsea un archivo .srt directo a columnas (sin un objeto por bloque).
+        Es la forma que usa la ingesta: mucha menos memoria y presión sobre el GC.
+        """
+        with open(filepath, 'rb') as f:
+            raw = f.read()
+        return SRTParser.parse_srt_text_columns(SRTParser.decode_srt_bytes(raw))
+    
+    @staticmethod
+    def parse_srt_text_columns(content: str) -> SubtitleBlockArray:
+        """Columnas de bloques del texto ya decodificado"""
+        return SubtitleBlockArray.from_records(_iter_srt_records(content))
     
     @staticmethod
     def create_chunks_with_timestamps(
-        blocks: List[SubtitleBlock],
+        blocks: Union[SubtitleBlockArray, List[SubtitleBlock]],
         source_filename: str,
         chunk_size: int = 800,
-        chunk_overlap: int = 150
+        chunk_overlap: int = 150,
+        length_function: Optional[Callable[[str], int]] = None
     ) -> List[Document]:
         """
         Crea chunks de texto preservando timestamps y metadata.
         
         Args:
-            blocks: Lista de SubtitleBlock parseados
+            blocks: SubtitleBlockArray (o lista de SubtitleBlock) parseados
             source_filename: Nombre del archivo fuente
-            chunk_size: Tamaño objetivo del chunk en caracteres
-            chunk_overlap: Overlap entre chunks
+            chunk_size: Tamaño objetivo del chunk (en caracteres, o en las
+                unidades de length_function)
+            chunk_overlap: Overlap entre chunks (mismas unidades)
+            length_function: Longitud del texto de un bloque, p. ej. en tokens
+                (context_packer.estimate_tokens). None = caracteres
             
         Returns:
             Lista de Document de LangChain con metadata enriquecida
         """
-        documents = []
-        current_text = ""
-        current_blocks = []
+        return list(SRTParser.iter_chunks_with_timestamps(
+            blocks, source_filename, chunk_size=chunk_size, chunk_overlap=chunk_overlap,
+            length_function=length_function
+        ))
+    
+    @staticmethod
+    def chunk_windows(
+        lengths: np.ndarray,
+        chunk_size: int = 800,
+        chunk_overlap: int = 150,
+        separator_length: int = 1
+    ) -> Iterator[Tuple[int, int]]:
+        """
+        Ventanas [start, end) de bloques de cada chunk, con sumas prefijas.
         
-        for block in blocks:
-            # Si agregar este bloque excede el tamaño
-            if len(current_text) + len(block.text) > chunk_size and current_blocks:
-                # Crear documento con el chunk actual
-                doc = SRTParser._create_document(
-                    current_blocks, 
-                    source_filename
-                )
-                documents.append(doc)
-                
-                # Calcular overlap: mantener últimos bloques que sumen ~overlap chars
-                overlap_text = ""
-                overlap_blocks = []
-                for b in reversed(current_blocks):
-                    if len(overlap_text) + len(b.text) <= chunk_overlap:
-                        overlap_blocks.insert(0, b)
-                        overlap_text = b.text + " " + overlap_text
-                    else:
-                        break
-                
-                current_blocks = overlap_blocks
-                current_text = overlap_text
+        Reglas (las del chunker original, que acumulaba " " + texto por bloque):
+            - un bloque cierra el chunk en curso si con él se supera chunk_size
+              (un bloque que solo ya lo supera forma su propio chunk)
+            - el siguiente chunk arranca con los últimos bloques del anterior
+              cuya longitud acumulada (con separadores) no supera chunk_overlap
+        
+        prefix[k] es la longitud de los k primeros bloques con su separador, así
+        que la longitud de la ventana [start, i) es prefix[i] - prefix[start] y
+        ambas reglas se resuelven con búsqueda binaria (prefix no decrece):
+            - cierre: primer i con prefix[i + 1] > prefix[start] + chunk_size + separador
+            - overlap: primer b con prefix[b] >= prefix[i] - chunk_overlap - separador
+        """
+        n = len(lengths)
+        if n == 0:
+            return
+        prefix = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.asarray(lengths, dtype=np.int64) + separator_length, out=prefix[1:])
+        
+        start = 0
+        first_candidate = 1  # El bloque que cerró un chunk no vuelve a evaluarse
+        while True:
+            limit = prefix[start] + chunk_size + separator_length
+            end = max(int(np.searchsorted(prefix, limit, side='right')) - 1, first_candidate)
+            if end >= n:
+                yield start, n
+                return
+            yield start, end
             
-            # Agregar bloque actual
-            current_blocks.append(block)
-            current_text += " " + block.text
+            overlap_start = int(np.searchsorted(prefix, prefix[end] - chunk_overlap - separator_length, side='left'))
+            start = max(overlap_start, start)
+            first_candidate = end + 1
+    
+    @staticmethod
+    def iter_chunks_with_timestamps(
+        blocks: Union[SubtitleBlockArray, Iterable[SubtitleBlock]],
+        source_filename: str,
+        chunk_size: int = 800,
+        chunk_overlap: int = 150,
+        length_function: Optional[Callable[[str], int]] = None
+    ) -> Iterator[Document]:
+        """
+        Versión perezosa de create_chunks_with_timestamps: genera cada chunk en
+        cuanto se completa. Trabaja sobre las columnas de SubtitleBlockArray;
+        cualquier otro iterable de SubtitleBlock se convierte primero.
         
-        # No olvidar el último chunk
-        if current_blocks:
-            doc = SRTParser._create_document(current_blocks, source_filename)
-            documents.append(doc)
+        Con length_function los separadores entre bloques no cuentan (un espacio
+        no suma tokens); en caracteres cada bloque suma su texto + 1.
+        """
+        if not isinstance(blocks, SubtitleBlockArray):
+            blocks = SubtitleBlockArray.from_blocks(blocks)
+        
+        if length_function is None:
+            lengths = blocks.text_lengths()
+            separator_length = 1
+        else:
+            lengths = np.array([length_function(blocks.text_at(i)) for i in range(len(blocks))], dtype=np.int64)
+            separator_length = 0
         
-        return documents
+        for start, end in SRTParser.chunk_windows(lengths, chunk_size, chunk_overlap, separator_length):
+            yield SRTParser._create_document(blocks, start, end, source_filename)
     
     @staticmethod
-    def _create_document(blocks: List[SubtitleBlock], source_filename: str) -> Document:
-        """Crea un Document de LangChain con metadata completa y timestamps embebidos en el texto"""
+    def _create_document(blocks: SubtitleBlockArray, start: int, end: int, source_filename: str) -> Document:
+        """
+        Crea un Document de LangChain con metadata completa y timestamps embebidos en el texto
+        a partir de los bloques [start, end)
+        """
         # Concatenar texto CON timestamps de cada bloque individual (sin milisegundos)
-        text_parts = []
-        for block in blocks:
+        text = blocks.text
+        offsets = blocks.text_offsets[start:end + 1].tolist()
+        text_parts = [
             # Formato: [HH:MM:SS --> HH:MM:SS] texto (sin milisegundos)
-            start_clean = SRTParser.strip_milliseconds(block.start_time)
-            end_clean = SRTParser.strip_milliseconds(block.end_time)
-            timestamp_prefix = f"[{start_clean} --> {end_clean}]"
-            text_parts.append(f"{timestamp_prefix} {block.text}")
-        
-        # Unir todos los bloques con saltos de línea para mantener claridad
-        text = "\n".join(text_parts)
+            f"[{_clock_string(start_clock)} --> {_clock_string(end_clock)}] {text[offsets[k]:offsets[k + 1]]}"
+            for k, (start_clock, end_clock) in enumerate(zip(
+                blocks.start_clock[start:end].tolist(), blocks.end_clock[start:end].tolist()
+            ))
+        ]
         
         # Metadata enriquecida
+        start_time = blocks.start_time(start)
+        end_time = blocks.end_time(end - 1)
+        start_seconds = blocks.seconds_at(start)
+        end_seconds = blocks.seconds_at(end - 1, end=True)
         metadata = {
             'source': source_filename,
-            'start_time': blocks[0].start_time,
-            'end_time': blocks[-1].end_time,
-            'start_seconds': blocks[0].start_seconds,
-            'end_seconds': blocks[-1].end_seconds,
-            'duration_seconds': blocks[-1].end_seconds - blocks[0].start_seconds,
-            'start_index': blocks[0].index,
-            'end_index': blocks[-1].index,
-            'num_blocks': len(blocks),
+            'start_time': start_time,
+            'end_time': end_time,
+            'start_seconds': start_seconds,
+            'end_seconds': end_seconds,
+            'duration_seconds': end_seconds - start_seconds,
+            'start_index': int(blocks.indices[start]),
+            'end_index': int(blocks.indices[end - 1]),
+            'num_blocks': end - start,
             # Para respuestas precisas del agente
-            'timestamp_range': f"{blocks[0].start_time} → {blocks[-1].end_time}"
+            'timestamp_range': f"{start_time} → {end_time}"
         }
         
-        return Document(page_content=text, metadata=metadata)
+        # Unir todos los bloques con saltos de línea para mantener claridad
+        return Document(page_content="\n".join(text_parts), metadata=metadata)
+
+
+def _load_srt_file(
+    filepath: str,
+    chunk_size: int,
+    chunk_overlap: int,
+    length_function: Optional[Callable[[str], int]] = None
+) -> Dict:
+    """
+    Parsea y trocea un archivo. Se ejecuta en el proceso principal o en un worker,
+    por eso captura sus propios errores y devuelve un resultado serializable.
+    """
+    name = Path(filepath).name
+    try:
+        blocks = SRTParser.parse_srt_columns(filepath)
+        if not blocks:
+            return {'name': name, 'chunks': None, 'blocks': 0, 'error': None}
+
+        chunks = SRTParser.create_chunks_with_timestamps(
+            blocks=blocks,
+            source_filename=name,
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            length_function=length_function
+        )
+        return {'name': name, 'chunks': chunks, 'blocks': len(blocks), 'error': None}
+    except Exception as e:
+        return {'name': name, 'chunks': None, 'blocks': 0, 'error': str(e)}
+
+
+def _load_srt_batch(
+    filepaths: List[str],
+    chunk_size: int,
+    chunk_overlap: int,
+    length_function: Optional[Callable[[str], int]] = None
+) -> List[Dict]:
+    return [_load_srt_file(filepath, chunk_size, chunk_overlap, length_function) for filepath in filepaths]
 
 
 def load_srt_documents_optimized(
     data_path: str,
     chunk_size: int = 800,
-    chunk_overlap: int = 150
+    chunk_overlap: int = 150,
+    workers: Optional[int] = None,
+    files_per_task: int = 32,
+    length_function: Optional[Callable[[str], int]] = None
 ) -> Tuple[List[Document], Dict]:
     """
     Carga todos los .srt de un directorio con chunking optimizado.
@@ -183,56 +527,45 @@ def load_srt_documents_optimized(
         data_path: Ruta al directorio con archivos .srt
         chunk_size: Tamaño de chunks en caracteres
         chunk_overlap: Overlap entre chunks
+        workers: Procesos para parsear en paralelo (None o 1 = secuencial)
+        files_per_task: Archivos por tarea enviada a cada proceso
+        length_function: Medida de chunk_size/chunk_overlap (None = caracteres; con
+            workers > 1 debe ser una función de módulo, p. ej. context_packer.estimate_tokens)
         
     Returns:
-        Tupla de (documentos, estadísticas)
+        Tupla de (documentos, estadísticas). Con workers > 1 el resultado es
+        idéntico al secuencial (mismo orden de archivos y de chunks).
     """
     print(f"\n📂 Cargando archivos .srt desde: {data_path}")
     print(f"⚙️  Configuración: chunk_size={chunk_size}, overlap={chunk_overlap}")
     
     all_documents = []
-    stats = {
-        'total_files': 0,
-        'total_chunks': 0,
-        'total_blocks': 0,
-        'failed_files': []
-    }
+    stats = _new_stats()
     
     data_dir = Path(data_path)
-    srt_files = list(data_dir.glob("*.srt"))
+    srt_files = [str(filepath) for filepath in data_dir.glob("*.srt")]
     
     print(f"✅ Encontrados {len(srt_files)} archivos .srt\n")
     
-    for i, filepath in enumerate(srt_files, 1):
-        try:
-            # Parsear archivo
-            blocks = SRTParser.parse_srt_file(str(filepath))
-            
-            if not blocks:
-                print(f"   ⚠️  {filepath.name}: Sin bloques válidos")
-                continue
-            
-            # Crear chunks con timestamps
-            chunks = SRTParser.create_chunks_with_timestamps(
-                blocks=blocks,
-                source_filename=filepath.name,
-                chunk_size=chunk_size,
-                chunk_overlap=chunk_overlap
+    if workers and workers > 1 and len(srt_files) > files_per_task:
+        # Lotes de archivos por tarea: map conserva el orden de envío, así que la
+        # salida es determinista aunque los procesos terminen en cualquier orden
+        print(f"⚡ Parseando con {workers} procesos ({files_per_task} archivos por tarea)")
+        batches = [srt_files[i:i + files_per_task] for i in range(0, len(srt_files), files_per_task)]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = (
+                result
+                for batch_results in executor.map(
+                    _load_srt_batch, batches,
+                    [chunk_size] * len(batches), [chunk_overlap] * len(batches),
+                    [length_function] * len(batches)
+                )
+                for result in batch_results
             )
-            
-            all_documents.extend(chunks)
-            
-            stats['total_files'] += 1
-            stats['total_chunks'] += len(chunks)
-            stats['total_blocks'] += len(blocks)
-            
-            # Progreso cada 100 archivos
-            if i % 100 == 0:
-                print(f"   📊 Progreso: {i}/{len(srt_files)} archivos procesados")
-            
-        except Exception as e:
-            print(f"   ❌ Error en {filepath.name}: {e}")
-            stats['failed_files'].append(filepath.name)
+            all_documents.extend(_iter_documents(results, len(srt_files), stats))
+    else:
+        results = (_load_srt_file(filepath, chunk_size, chunk_overlap, length_function) for filepath in srt_files)
+        all_documents.extend(_iter_documents(results, len(srt_files), stats))
     
     print(f"\n✅ Carga completada:")
     print(f"   • Archivos procesados: {stats['total_files']}")
@@ -245,6 +578,74 @@ def load_srt_documents_optimized(
     return all_documents, stats
 
 
+def iter_srt_documents(
+    data_path: str,
+    chunk_size: int = 800,
+    chunk_overlap: int = 150,
+    stats: Optional[Dict] = None,
+    length_function: Optional[Callable[[str], int]] = None
+) -> Iterator[Document]:
+    """
+    Versión en streaming de load_srt_documents_optimized: genera los chunks
+    archivo por archivo, en el mismo orden, sin acumular el corpus completo.
+    En memoria solo vive el archivo en curso.
+    
+    Args:
+        data_path: Ruta al directorio con archivos .srt
+        chunk_size: Tamaño de chunks en caracteres
+        chunk_overlap: Overlap entre chunks
+        stats: Diccionario de estadísticas a actualizar (mismo formato que
+            load_srt_documents_optimized); se completa a medida que se consume
+        length_function: Medida de chunk_size/chunk_overlap (None = caracteres)
+    """
+    if stats is None:
+        stats = _new_stats()
+    srt_files = [str(filepath) for filepath in Path(data_path).glob("*.srt")]
+    results = (_load_srt_file(filepath, chunk_size, chunk_overlap, length_function) for filepath in srt_files)
+    yield from _iter_documents(results, len(srt_files), stats)
+
+
+def iter_batches(items: Iterable, batch_size: int) -> Iterator[List]:
+    """Agrupa un iterable en listas de batch_size elementos (la última puede ser menor)"""
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def _new_stats() -> Dict:
+    return {
+        'total_files': 0,
+        'total_chunks': 0,
+        'total_blocks': 0,
+        'failed_files': []
+    }
+
+
+def _iter_documents(results: Iterable[Dict], total: int, stats: Dict) -> Iterator[Document]:
+    """Genera los chunks de los resultados por archivo (en orden) y actualiza las estadísticas"""
+    for i, result in enumerate(results, 1):
+        if result['error'] is not None:
+            print(f"   ❌ Error en {result['name']}: {result['error']}")
+            stats['failed_files'].append(result['name'])
+            continue
+        if result['chunks'] is None:
+            print(f"   ⚠️  {result['name']}: Sin bloques válidos")
+            continue
+        
+        yield from result['chunks']
+        
+        stats['total_files'] += 1
+        stats['total_chunks'] += len(result['chunks'])
+        stats['total_blocks'] += result['blocks']
+        
+        # Progreso cada 100 archivos
+        if i % 100 == 0:
+            print(f"   📊 Progreso: {i}/{total} archivos procesados")
+
+
 # Ejemplo de uso
 if __name__ == "__main__":
     # Parsear un archivo individual
@@ -0,0 +1,97 @@
+"""
+Renderizado incremental de respuestas en streaming
+Acumula los tokens que llegan del LLM y produce el HTML a mostrar en cada
+momento: las líneas completas pasan por la función de coloreado una sola vez
+(se guardan ya coloreadas) y la línea en curso se muestra tal cual.
+"""
+import time
+from typing import Callable, Iterable, Iterator, List, Optional
+
+
+class IncrementalColorizer:
+    """
+    Aplica una función de coloreado (colorize_citations) solo sobre líneas completas.
+
+    Una cita entre comillas puede abarcar varias líneas, así que un bloque de
+    líneas se colorea y se fija solo cuando sus comillas están balanceadas;
+    mientras tanto se recolorea en cada actualización.
+    """
+
+    def __init__(self, colorize: Callable[[str], str]):
+        self.colorize = colorize
+        self._parts: List[str] = []
+        self._committed_html: List[str] = []
+        self._pending = ""  # líneas completas aún no fijadas (comillas abiertas)
+        self._tail = ""     # línea en curso (sin salto de línea final)
+
+    @property
+    def text(self) -> str:
+        """Texto completo recibido hasta ahora, sin modificar"""
+        return "".join(self._parts)
+
+    def feed(self, chunk: str) -> None:
+        """Agrega un fragmento de texto recibido del LLM"""
+        if not chunk:
+            return
+        self._parts.append(chunk)
+        buffer = self._tail + chunk
+        cut = buffer.rfind("\n")
+        if cut < 0:
+            self._tail = buffer
+            return
+        self._pending += buffer[:cut + 1]
+        self._tail = buffer[cut + 1:]
+        if self._pending.count('"') % 2 == 0:
+            self._committed_html.append(self.colorize(self._pending))
+            self._pending = ""
+
+    def render(self) -> str:
+        """HTML actual: líneas fijadas + líneas pendientes coloreadas + línea en curso"""
+        html = "".join(self._committed_html)
+        if self._pending:
+            html += self.colorize(self._pending)
+        return html + self._tail
+
+
+def stream_response(
+    chunks: Iterable[str],
+    colorize: Callable[[str], str],
+    render: Callable[[str], None],
+    on_first_token: Optional[Callable[[], None]] = None,
+    min_interval: float = 0.1
+) -> str:
+    """
+    Consume un stream de texto, mostrando el avance con render() como máximo
+    cada min_interval segundos (y siempre al terminar).
+
+    Args:
+        chunks: Fragmentos de texto (por ejemplo, chain.stream(...))
+        colorize: Función de coloreado para líneas completas
+        render: Recibe el HTML parcial a mostrar
+        on_first_token: Se llama una vez al recibir el primer fragmento
+        min_interval: Intervalo mínimo entre actualizaciones de la UI
+
+    Returns:
+        El texto completo, idéntico al que devolvería chain.invoke
+    """
+    colorizer = IncrementalColorizer(colorize)
+    last_render = 0.0
+    first = True
+    for chunk in _non_empty(chunks):
+        if first:
+            first = False
+            if on_first_token is not None:
+                on_first_token()
+        colorizer.feed(chunk)
+        now = time.monotonic()
+        if now - last_render >= min_interval:
+            render(colorizer.render())
+            last_render = now
+    render(colorizer.render())
+    return colorizer.text
+
+
+def _non_empty(chunks: Iterable[str]) -> Iterator[str]:
+    for chunk in chunks:
+        if chunk:
+            yield chunk
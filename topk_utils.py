@@ -0,0 +1,54 @@
+"""
+Selección top-k vectorizada compartida por todos los retrievers
+Usa argpartition (O(N)) y ordena solo el tramo superior en lugar de un
+np.argsort completo (O(N log N)) sobre todo el arreglo de scores.
+"""
+import numpy as np
+from typing import Optional, Tuple
+
+
+def select_top_k(
+    scores: np.ndarray,
+    k: int,
+    ids: Optional[np.ndarray] = None,
+    positive_only: bool = True
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Selecciona los k mejores scores.
+
+    Args:
+        scores: Arreglo de scores
+        k: Número de resultados a retornar
+        ids: Ids asociados a cada score (por defecto, la posición en el arreglo)
+        positive_only: Si True, descarta scores <= 0 con una máscara vectorizada
+
+    Returns:
+        Tupla (ids, scores) ordenada por score descendente; los empates se
+        resuelven por id ascendente para que el resultado sea determinista
+    """
+    scores = np.asarray(scores)
+    ids = np.arange(len(scores)) if ids is None else np.asarray(ids)
+
+    if positive_only:
+        mask = scores > 0
+        ids, scores = ids[mask], scores[mask]
+
+    if k <= 0 or len(scores) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=scores.dtype)
+
+    if k < len(scores):
+        # Umbral del k-ésimo mejor; se incluyen todos los empatados con él
+        # para que el desempate por id no dependa del orden de argpartition
+        kth_value = scores[np.argpartition(-scores, k - 1)[k - 1]]
+        candidates = np.flatnonzero(scores >= kth_value)
+        ids, scores = ids[candidates], scores[candidates]
+
+    order = np.lexsort((ids, -scores))[:k]
+    return ids[order].astype(np.int64), scores[order]
+
+
+def kth_largest(values: np.ndarray, k: int) -> float:
+    """Valor del k-ésimo mayor elemento (0.0 si hay menos de k)"""
+    if k <= 0 or len(values) < k:
+        return 0.0
+    return float(np.partition(values, len(values) - k)[len(values) - k])